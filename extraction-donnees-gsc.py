@@ -1,13 +1,12 @@
 import streamlit as st
-import pandas as pd
 import datetime
 import os
 import pickle
+import re
+import shutil
+import tempfile
 import time
-import io
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
+import uuid
 import base64
 
 # Configuration de la page Streamlit
@@ -114,6 +113,14 @@ st.markdown("""
 # Titre de l'application
 st.markdown('<div class="main-header">Extracteur de données Google Search Console</div>', unsafe_allow_html=True)
 
+# Seuls les modules légers du premier écran sont importés ici : pandas, le moteur d'extraction,
+# pyarrow et DuckDB sont importés par les fonctions des écrans qui s'en servent
+from gsc_extracteur.analyse import lister_exports
+from gsc_extracteur.arriere_plan import EN_ATTENTE, TERMINEE, obtenir_file_taches
+from gsc_extracteur.auth import construire_service, lister_proprietes, rafraichisseur_pour
+from gsc_extracteur.cache import obtenir_cache
+from gsc_extracteur.telemetrie import obtenir_telemetrie
+
 # Fonction d'authentification à l'API Google Search Console
 def authenticate_gsc():
     SCOPES = ['https://www.googleapis.com/auth/webmasters']
@@ -146,6 +153,7 @@ def authenticate_gsc():
                 
         if not creds or not creds.valid:
             if creds and creds.expired and creds.refresh_token:
+                from google.auth.transport.requests import Request
                 creds.refresh(Request())
             else:
                 if not os.path.exists('credentials.json'):
@@ -153,6 +161,8 @@ def authenticate_gsc():
                     st.info("Veuillez configurer les secrets Streamlit ou fournir le fichier credentials.json.")
                     st.stop()
                     
+                # Importé seulement pour le flux OAuth interactif, rarement nécessaire
+                from google_auth_oauthlib.flow import InstalledAppFlow
                 flow = InstalledAppFlow.from_client_secrets_file(
                     'credentials.json', SCOPES)
                 creds = flow.run_local_server(port=8080)
@@ -166,18 +176,63 @@ def authenticate_gsc():
         st.info("Veuillez configurer les secrets Streamlit ou utiliser l'application localement.")
         st.stop()
     
-    service = build('searchconsole', 'v1', credentials=creds)
+    service = construire_service(creds)
     return service
 
 # Fonction pour récupérer les propriétés disponibles
 def get_properties(service):
-    site_list = service.sites().list().execute()
-    properties = []
-    
-    if 'siteEntry' in site_list:
-        for site in site_list['siteEntry']:
-            properties.append(site['siteUrl'])
-    
+    return lister_proprietes(service)
+
+DUREE_CACHE_PROPRIETES = 600  # Secondes pendant lesquelles la liste des propriétés est réutilisée
+DELAI_ACTUALISATION = 2  # Secondes entre deux actualisations du suivi des extractions en arrière-plan
+
+LIBELLES_STATUTS = {
+    'en_attente': "en attente",
+    'en_cours': "en cours",
+    'terminee': "terminée",
+    'echec': "en échec",
+    'annulee': "annulée",
+}
+
+# Fonction pour obtenir le service authentifié de la session
+def get_session_service():
+    """
+    Streamlit réexécute le script à chaque interaction : le service (identifiants,
+    document de découverte, connexion HTTP) est construit une seule fois par session
+    et le jeton est rafraîchi en arrière-plan avant son expiration. Les sessions d'un
+    même compte partagent ses identifiants et un seul thread de rafraîchissement.
+    """
+    if 'gsc_service' not in st.session_state:
+        service = authenticate_gsc()
+        rafraichisseur = rafraichisseur_pour(service._http.credentials)
+        if rafraichisseur.creds is not service._http.credentials:
+            service = construire_service(rafraichisseur.creds)
+        st.session_state.gsc_service = service
+    return st.session_state.gsc_service
+
+# Fonction pour obtenir l'identifiant de la session, propriétaire de ses extractions en arrière-plan
+def identifiant_session():
+    """
+    L'identifiant est conservé dans l'adresse de la page (paramètre `session`) :
+    recharger la page retrouve les extractions en arrière-plan de la session, et
+    seule une personne qui reçoit cette adresse voit et télécharge ces extractions.
+    """
+    if 'id_session' not in st.session_state:
+        identifiant = st.query_params.get('session')
+        if not identifiant or not re.fullmatch(r'[0-9a-f]{32}', identifiant):
+            identifiant = uuid.uuid4().hex
+        st.session_state.id_session = identifiant
+    if st.query_params.get('session') != st.session_state.id_session:
+        st.query_params['session'] = st.session_state.id_session
+    return st.session_state.id_session
+
+# Fonction pour obtenir la liste des propriétés de la session
+def get_session_properties(service):
+    """La liste des propriétés est réutilisée pendant DUREE_CACHE_PROPRIETES secondes."""
+    horodatage, properties = st.session_state.get('gsc_proprietes', (0, None))
+    if properties is None or time.time() - horodatage > DUREE_CACHE_PROPRIETES:
+        properties = get_properties(service)
+        st.session_state.gsc_proprietes = (time.time(), properties)
     return properties
 
 # Fonction pour gérer les erreurs d'accès
@@ -194,238 +249,503 @@ def handle_access_error(error_message):
         return True
     return False
 
-# Fonction pour extraire les données par page avec contournement de la limite
-def get_page_data(service, site_url, start_date, end_date):
+# Fonction pour formater une durée en secondes
+def formater_duree(secondes):
+    if secondes is None:
+        return "estimation en cours"
+    minutes, secondes = divmod(int(secondes), 60)
+    heures, minutes = divmod(minutes, 60)
+    if heures:
+        return f"{heures} h {minutes:02d} min"
+    if minutes:
+        return f"{minutes} min {secondes:02d} s"
+    return f"{secondes} s"
+
+# Fonction pour afficher les mesures de télémétrie (appels à l'API, débit, mémoire)
+def afficher_telemetrie(conteneur, suivi=None):
+    mesures = obtenir_telemetrie().instantane()
+    with conteneur.container():
+        col1, col2, col3, col4, col5 = st.columns(5)
+        col1.metric("Requêtes (échecs)", f"{mesures['requetes']['succes']} ({mesures['requetes']['echec']})")
+        latence = mesures['latence']
+        col2.metric("Latence p50 / p95",
+                    f"≤ {latence['p50']} s / ≤ {latence['p95']} s" if latence['p50'] is not None else "-")
+        debit = suivi.lignes_par_seconde if suivi else mesures['lignes_par_seconde']
+        col3.metric("Lignes/s", f"{debit:,.0f}".replace(",", " "))
+        col4.metric("Nouvelles tentatives", mesures['nouvelles_tentatives'],
+                    delta=f"{mesures['attente_reprises']:.1f} s d'attente", delta_color="off")
+        pic = mesures['pic_memoire']
+        col5.metric("Pic mémoire", f"{pic / 1024 ** 2:.0f} Mo" if pic else "-",
+                    delta=f"cache : {mesures['cache']['trouvees']} réponses", delta_color="off")
+
+# Fonction pour conserver un DataFrame extrait dans la session, pour l'exploration et l'analyse locale
+def memoriser_pour_analyse(nom, df):
+    from gsc_extracteur.repertoires import CumulsRepertoires
+    
+    st.session_state.setdefault('jeux_analyse', {})[nom] = df
+    # Cumuls par répertoire calculés dès l'extraction, pour les résultats par page
+    if 'page' in df.columns and {'clicks', 'impressions', 'position'} <= set(df.columns):
+        st.session_state.setdefault('cumuls_repertoires', {})[nom] = CumulsRepertoires(df)
+
+# Fonction pour lancer le moteur d'extraction avec suivi de la progression dans l'interface
+def extraire_avec_progression(service, site_url, start_date, end_date, dimensions, libelle, granularite='day', cache=None,
+                              ecrivain=None, reprise=False, options=None, comparaison=None):
     """
-    Extrait les données de pages avec pagination pour dépasser la limite de 25000 URLs.
-    Récupère toutes les données disponibles sans limite maximale.
+    Exécute le moteur d'extraction parallèle et affiche l'avancement tranche par tranche.
+    Chaque message d'erreur n'est affiché qu'une seule fois.
+    Si un écrivain est fourni, les pages sont écrites en flux et la fonction renvoie
+    le nombre de lignes écrites au lieu d'un DataFrame.
+    Avec `reprise`, chaque page est sauvegardée sur disque : relancer la même extraction
+    après une interruption ne redemande que les pages manquantes.
+    `options` contient les filtres, le type de recherche et l'état des données
+    (extraction personnalisée, sans points de reprise).
+    Avec `comparaison` ('precedente' ou 'annee_precedente'), la période de référence est
+    extraite en même temps et la fonction renvoie la comparaison des deux périodes.
     """
-    all_results = []
-    start_row = 0
-    total_fetched = 0
-    row_limit = 25000  # Valeur maximale fixe pour optimiser l'extraction
+    import pandas as pd
+    
+    from gsc_extracteur.comparaison import extraire_comparaison
+    from gsc_extracteur.limiteur import limiteurs_pour
+    from gsc_extracteur.moteur import extraire_donnees, extraire_en_flux
+    from gsc_extracteur.reprise import extraire_reprenable, identifiant_travail, lister_travaux
+    from gsc_extracteur.telemetrie import SuiviExtraction
     
+    options = options or {}
     progress_text = st.empty()
     progress_bar = st.progress(0)
+    panneau_telemetrie = st.empty()
+    apercu = st.empty()
+    suivi = SuiviExtraction()
+    erreurs_affichees = set()
     
-    more_data = True
-    while more_data:
-        progress_text.info(f"Extraction des données par pages... ({total_fetched} lignes récupérées)")
-        
-        request = {
-            'startDate': start_date,
-            'endDate': end_date,
-            'dimensions': ['page'],
-            'rowLimit': row_limit,
-            'startRow': start_row
-        }
-        
-        try:
-            response = service.searchanalytics().query(siteUrl=site_url, body=request).execute()
-            
-            if 'rows' not in response or not response['rows']:
-                more_data = False
-                break  # Pas plus de données à récupérer
-            
-            batch_size = len(response['rows'])
-            for row in response['rows']:
-                all_results.append({
-                    'page': row['keys'][0],
-                    'clicks': row['clicks'],
-                    'impressions': row['impressions'],
-                    'ctr': row['ctr'],
-                    'position': row['position']
-                })
-            
-            # Mise à jour pour la prochaine itération
-            start_row += batch_size
-            total_fetched += batch_size
-            
-            # Si nous avons reçu moins de lignes que demandées, nous avons fini
-            if batch_size < row_limit:
-                more_data = False
-                
-            # Mise à jour de la barre de progression (estimation basée sur le fait que nous recevons moins de données)
-            progress_completion = 1.0 if not more_data else min(0.9, batch_size / row_limit)
-            progress_bar.progress(progress_completion)
-                
-            # Pause pour éviter de dépasser les quotas d'API
-            time.sleep(0.5)
-            
-        except Exception as e:
-            error_message = str(e)
-            if not handle_access_error(error_message):
-                st.error(f"Erreur lors de l'extraction des données par pages : {e}")
-            more_data = False
+    def on_progress(terminees, total, lignes):
+        suivi.mettre_a_jour(terminees, total, lignes)
+        # Signaler si l'API nous impose de ralentir
+        limitation = ""
+        for limiteur in limiteurs_pour(service, site_url):
+            etat = limiteur.etat()
+            if etat['limite']:
+                limitation = f" — débit réduit à {etat['debit_par_minute']} requêtes/min ({etat['limitations']} limitations de l'API)"
+        progress_text.info(f"Extraction des données {libelle}... ({lignes} lignes récupérées, {terminees}/{total} tranches, "
+                           f"temps restant : {formater_duree(suivi.restant)}){limitation}")
+        progress_bar.progress(terminees / total if total else 1.0)
+        afficher_telemetrie(panneau_telemetrie, suivi)
+    
+    def on_error(e):
+        error_message = str(e)
+        if error_message in erreurs_affichees:
+            return
+        erreurs_affichees.add(error_message)
+        if not handle_access_error(error_message):
+            st.error(f"Erreur lors de l'extraction des données {libelle} : {e}")
+    
+    # Premières lignes affichées dès la première tranche reçue, sans attendre la fin de l'extraction
+    def on_apercu(df):
+        with apercu.container():
+            st.caption(f"Aperçu des premières lignes reçues ({libelle}), l'extraction continue...")
+            st.dataframe(df)
+    
+    if comparaison:
+        resultat = extraire_comparaison(service, site_url, start_date, end_date, dimensions, comparaison,
+                                        granularite=granularite, cache=cache, on_progress=on_progress, on_error=on_error,
+                                        **options)
+    elif reprise and ecrivain is None and not options:
+        identifiant = identifiant_travail(site_url, start_date, end_date, dimensions, granularite)
+        if any(travail['identifiant'] == identifiant for travail in lister_travaux()):
+            st.info(f"Reprise de l'extraction {libelle} interrompue précédemment : seules les pages manquantes seront demandées.")
+        resultat, travail = extraire_reprenable(service, site_url, start_date, end_date, dimensions,
+                                                granularite=granularite, cache=cache,
+                                                on_progress=on_progress, on_error=on_error, on_apercu=on_apercu)
+        if erreurs_affichees:
+            st.warning(f"Extraction {libelle} incomplète : relancez la même extraction pour la reprendre là où elle s'est arrêtée.")
+    elif ecrivain is not None:
+        resultat = extraire_en_flux(service, site_url, start_date, end_date, dimensions, ecrivain,
+                                    granularite=granularite, cache=cache, on_progress=on_progress, on_error=on_error,
+                                    **options)
+    else:
+        resultat = extraire_donnees(service, site_url, start_date, end_date, dimensions,
+                                    granularite=granularite, cache=cache, on_progress=on_progress, on_error=on_error,
+                                    on_apercu=on_apercu, **options)
     
     progress_text.empty()
     progress_bar.empty()
-    return pd.DataFrame(all_results)
+    panneau_telemetrie.empty()
+    apercu.empty()
+    if isinstance(resultat, pd.DataFrame) and not resultat.empty:
+        memoriser_pour_analyse(f"{'comparaison' if comparaison else 'données'} {libelle}", resultat)
+    return resultat
 
-# Fonction pour extraire les données par mot-clé avec contournement de la limite
-def get_query_data(service, site_url, start_date, end_date):
+# Fonction pour exporter en flux les types de données sélectionnés
+def exporter_en_flux(service, site_url, start_date, end_date, types_selectionnes, format_flux, granularite='day', cache=None,
+                     options=None, partitionner_par_date=False):
     """
-    Extrait les données de mots-clés avec pagination pour dépasser la limite de 25000.
-    Récupère toutes les données disponibles sans limite maximale.
+    Écrit chaque type de données dans un fichier sur disque au fur et à mesure de
+    l'extraction, puis propose le téléchargement direct du fichier. Un export
+    Parquet partitionné par date est un dossier, téléchargé en archive zip.
     """
-    all_results = []
-    start_row = 0
-    total_fetched = 0
-    row_limit = 25000  # Valeur maximale fixe pour optimiser l'extraction
-    
-    progress_text = st.empty()
-    progress_bar = st.progress(0)
+    from gsc_extracteur.export import chemin_export, ouvrir_ecrivain
     
-    more_data = True
-    while more_data:
-        progress_text.info(f"Extraction des données par mots-clés... ({total_fetched} lignes récupérées)")
-        
-        request = {
-            'startDate': start_date,
-            'endDate': end_date,
-            'dimensions': ['query'],
-            'rowLimit': row_limit,
-            'startRow': start_row
-        }
+    date_str = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    for dimensions, libelle, nom in types_selectionnes:
+        chemin = chemin_export(f"{nom}_{date_str}", format_flux)
+        with ouvrir_ecrivain(chemin, partitionner_par_date) as ecrivain:
+            lignes = extraire_avec_progression(service, site_url, start_date, end_date, dimensions, libelle,
+                                               granularite, cache, ecrivain=ecrivain, options=options)
         
-        try:
-            response = service.searchanalytics().query(siteUrl=site_url, body=request).execute()
-            
-            if 'rows' not in response or not response['rows']:
-                more_data = False
-                break  # Pas plus de données à récupérer
-            
-            batch_size = len(response['rows'])
-            for row in response['rows']:
-                all_results.append({
-                    'mot-clé': row['keys'][0],
-                    'clicks': row['clicks'],
-                    'impressions': row['impressions'],
-                    'ctr': row['ctr'],
-                    'position': row['position']
-                })
-            
-            # Mise à jour pour la prochaine itération
-            start_row += batch_size
-            total_fetched += batch_size
-            
-            # Si nous avons reçu moins de lignes que demandées, nous avons fini
-            if batch_size < row_limit:
-                more_data = False
-                
-            # Mise à jour de la barre de progression (estimation basée sur le fait que nous recevons moins de données)
-            progress_completion = 1.0 if not more_data else min(0.9, batch_size / row_limit)
-            progress_bar.progress(progress_completion)
-                
-            # Pause pour éviter de dépasser les quotas d'API
-            time.sleep(0.5)
-            
-        except Exception as e:
-            error_message = str(e)
-            if not handle_access_error(error_message):
-                st.error(f"Erreur lors de l'extraction des données par mots-clés : {e}")
-            more_data = False
-    
-    progress_text.empty()
-    progress_bar.empty()
-    return pd.DataFrame(all_results)
+        if lignes:
+            st.success(f"Extraction des données {libelle} réussie: {lignes} lignes écrites dans {chemin}.")
+            if os.path.isdir(chemin):
+                chemin = shutil.make_archive(chemin, 'zip', chemin)
+            with open(chemin, 'rb') as fichier:
+                st.download_button(f"Télécharger les données {libelle}", fichier,
+                                   file_name=os.path.basename(chemin), key=chemin)
+        else:
+            st.warning(f"Aucune donnée {libelle} n'a été trouvée.")
 
-# Fonction pour extraire les données par page et mot-clé avec contournement de la limite
-def get_page_query_data(service, site_url, start_date, end_date):
+# Fonction pour soumettre les extractions sélectionnées à la file d'arrière-plan
+def soumettre_en_arriere_plan(service, site_url, start_date, end_date, types_selectionnes, granularite='day', cache=None,
+                              options=None, comparaison=None):
     """
-    Extrait les données de pages et mots-clés avec pagination pour dépasser la limite de 25000.
-    Récupère toutes les données disponibles sans limite maximale.
+    Chaque type de données devient une tâche de la file partagée par le serveur,
+    attribuée à la session : les résultats sont retrouvés dans son suivi des
+    extractions en arrière-plan.
     """
-    all_results = []
-    start_row = 0
-    total_fetched = 0
-    row_limit = 25000  # Valeur maximale fixe pour optimiser l'extraction
+    from gsc_extracteur.comparaison import extraire_comparaison
+    from gsc_extracteur.moteur import extraire_donnees
     
-    progress_text = st.empty()
-    progress_bar = st.progress(0)
+    options = options or {}
+    file_taches = obtenir_file_taches()
+    proprietaire = identifiant_session()
+    for dimensions, libelle, nom in types_selectionnes:
+        if not dimensions or (comparaison and 'date' in dimensions):
+            st.warning(f"Extraction {libelle} ignorée : sélectionnez au moins une dimension (hors date pour une comparaison).")
+            continue
+        parametres = {'site': site_url, 'debut': start_date, 'fin': end_date, 'dimensions': dimensions,
+                      'nom': nom, 'comparaison': comparaison}
+        if comparaison:
+            file_taches.soumettre(f"comparaison {libelle}", extraire_comparaison, service, site_url, start_date, end_date,
+                                  dimensions, comparaison, parametres=parametres, proprietaire=proprietaire,
+                                  granularite=granularite, cache=cache, **options)
+        else:
+            file_taches.soumettre(f"données {libelle}", extraire_donnees, service, site_url, start_date, end_date,
+                                  dimensions, parametres=parametres, proprietaire=proprietaire, granularite=granularite,
+                                  cache=cache, **options)
+        st.success(f"Extraction {libelle} ajoutée à la file d'arrière-plan.")
+
+# Fonction pour afficher l'état des extractions en arrière-plan et leurs résultats
+def afficher_taches():
+    """Seules les extractions soumises par la session sont listées, annulables et téléchargeables."""
+    file_taches = obtenir_file_taches()
+    proprietaire = identifiant_session()
+    taches = file_taches.lister(proprietaire)
+    if not taches:
+        return
+    import pandas as pd
     
-    more_data = True
-    while more_data:
-        progress_text.info(f"Extraction des données par pages et mots-clés... ({total_fetched} lignes récupérées)")
-        
-        request = {
-            'startDate': start_date,
-            'endDate': end_date,
-            'dimensions': ['page', 'query'],
-            'rowLimit': row_limit,
-            'startRow': start_row
-        }
+    st.markdown('<div class="sub-header">Extractions en arrière-plan</div>', unsafe_allow_html=True)
+    st.checkbox("Actualiser automatiquement", value=True, key="actualisation_auto")
+    for tache in taches:
+        etat = tache.vers_dict()
+        parametres = etat['parametres']
+        col_etat, col_action = st.columns([5, 1])
+        with col_etat:
+            st.progress(tache.avancement,
+                        text=f"{etat['libelle']} — {parametres.get('site')} du {parametres.get('debut')} au "
+                             f"{parametres.get('fin')} : {LIBELLES_STATUTS[etat['statut']]}, {etat['lignes']} lignes, "
+                             f"{etat['terminees']}/{etat['total']} tranches, durée : {formater_duree(etat['duree'])}")
+            if etat['erreurs']:
+                st.warning(f"{len(etat['erreurs'])} erreur(s), dont : {etat['erreurs'][0]}")
+            if etat['exception']:
+                if not handle_access_error(etat['exception']):
+                    st.error(f"Échec de l'extraction {etat['libelle']} : {etat['exception']}")
+        with col_action:
+            if etat['statut'] == EN_ATTENTE:
+                st.button("Annuler", key=f"annuler_{etat['identifiant']}", on_click=file_taches.annuler,
+                          args=(etat['identifiant'], proprietaire))
+            elif not tache.active:
+                st.button("Retirer", key=f"retirer_{etat['identifiant']}", on_click=file_taches.oublier,
+                          args=(etat['identifiant'], proprietaire))
         
-        try:
-            response = service.searchanalytics().query(siteUrl=site_url, body=request).execute()
-            
-            if 'rows' not in response or not response['rows']:
-                more_data = False
-                break  # Pas plus de données à récupérer
-            
-            batch_size = len(response['rows'])
-            for row in response['rows']:
-                all_results.append({
-                    'page': row['keys'][0],
-                    'mot-clé': row['keys'][1],
-                    'clicks': row['clicks'],
-                    'impressions': row['impressions'],
-                    'ctr': row['ctr'],
-                    'position': row['position']
-                })
-            
-            # Mise à jour pour la prochaine itération
-            start_row += batch_size
-            total_fetched += batch_size
-            
-            # Si nous avons reçu moins de lignes que demandées, nous avons fini
-            if batch_size < row_limit:
-                more_data = False
-                
-            # Mise à jour de la barre de progression (estimation basée sur le fait que nous recevons moins de données)
-            progress_completion = 1.0 if not more_data else min(0.9, batch_size / row_limit)
-            progress_bar.progress(progress_completion)
-                
-            # Pause pour éviter de dépasser les quotas d'API
-            time.sleep(0.5)
-            
-        except Exception as e:
-            error_message = str(e)
-            if not handle_access_error(error_message):
-                st.error(f"Erreur lors de l'extraction des données par pages et mots-clés : {e}")
-            more_data = False
-    
-    progress_text.empty()
-    progress_bar.empty()
-    return pd.DataFrame(all_results)
+        if etat['statut'] == TERMINEE and isinstance(tache.resultat, pd.DataFrame) and not tache.resultat.empty:
+            nom = parametres.get('nom', etat['identifiant'])
+            if parametres.get('comparaison'):
+                nom = f"{nom}_comparaison"
+            # Le résultat (et ses cumuls par répertoire) n'est enregistré qu'une fois par session,
+            # et non à chaque actualisation du suivi
+            memorisees = st.session_state.setdefault('taches_memorisees', set())
+            if etat['identifiant'] not in memorisees:
+                memoriser_pour_analyse(etat['libelle'], tache.resultat)
+                memorisees.add(etat['identifiant'])
+            # Le lien n'est construit qu'une fois par session, et non à chaque actualisation du suivi
+            liens = st.session_state.setdefault('liens_taches', {})
+            if etat['identifiant'] not in liens:
+                liens[etat['identifiant']] = get_download_link(tache.resultat, f"{nom}.csv", etat['libelle'])
+            st.markdown(liens[etat['identifiant']], unsafe_allow_html=True)
+
+# Fonction pour extraire les données par page avec contournement de la limite
+def get_page_data(service, site_url, start_date, end_date, granularite='day', cache=None, reprise=False):
+    """
+    Extrait les données de pages, tranche de dates par tranche de dates, en parallèle.
+    Chaque tranche est paginée pour dépasser la limite de 25000 URLs.
+    """
+    return extraire_avec_progression(service, site_url, start_date, end_date, ['page'], "par pages", granularite, cache,
+                                     reprise=reprise)
+
+# Fonction pour extraire les données par mot-clé avec contournement de la limite
+def get_query_data(service, site_url, start_date, end_date, granularite='day', cache=None, reprise=False):
+    """
+    Extrait les données de mots-clés, tranche de dates par tranche de dates, en parallèle.
+    Chaque tranche est paginée pour dépasser la limite de 25000 lignes.
+    """
+    return extraire_avec_progression(service, site_url, start_date, end_date, ['query'], "par mots-clés", granularite, cache,
+                                     reprise=reprise)
+
+# Fonction pour extraire les données par page et mot-clé avec contournement de la limite
+def get_page_query_data(service, site_url, start_date, end_date, granularite='day', cache=None, reprise=False):
+    """
+    Extrait les données de pages et mots-clés, tranche de dates par tranche de dates, en parallèle.
+    Chaque tranche est paginée pour dépasser la limite de 25000 lignes.
+    """
+    return extraire_avec_progression(service, site_url, start_date, end_date, ['page', 'query'],
+                                     "par pages et mots-clés", granularite, cache, reprise=reprise)
+
+# Fonction pour extraire des dimensions quelconques avec filtres et type de recherche
+def get_custom_data(service, site_url, start_date, end_date, dimensions, options, granularite='day', cache=None):
+    """
+    Extrait les dimensions choisies, tranche de dates par tranche de dates, en parallèle.
+    Les tranches tronquées par l'API sont redécoupées par jour, appareil puis pays.
+    """
+    return extraire_avec_progression(service, site_url, start_date, end_date, dimensions, "personnalisées",
+                                     granularite, cache, options=options)
 
 # Fonction pour générer un lien de téléchargement pour CSV
 def get_download_link(df, filename, text):
-    csv = df.to_csv(index=False)
-    b64 = base64.b64encode(csv.encode()).decode()
+    debut = time.perf_counter()
+    csv = df.to_csv(index=False).encode()
+    obtenir_telemetrie().enregistrer_export('csv', len(csv), time.perf_counter() - debut)
+    b64 = base64.b64encode(csv).decode()
     href = f'<a href="data:file/csv;base64,{b64}" download="{filename}" class="download-link">Télécharger {text}</a>'
     return href
 
-# Fonction pour générer un lien de téléchargement pour Excel avec plusieurs onglets
-def get_excel_download_link(dataframes, sheet_names, filename, text):
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-        for df, sheet_name in zip(dataframes, sheet_names):
-            df.to_excel(writer, sheet_name=sheet_name, index=False)
+# Fonction pour proposer le téléchargement d'un fichier Excel avec plusieurs onglets
+def afficher_telechargement_excel(dataframes, sheet_names, filename, text):
+    """
+    Le classeur est écrit dans un fichier temporaire (voir `ecrire_excel`) plutôt qu'en
+    mémoire ; les onglets de plus de 1 048 575 lignes sont répartis sur plusieurs onglets.
+    """
+    from gsc_extracteur.export import ecrire_excel
     
-    excel_data = output.getvalue()
-    b64 = base64.b64encode(excel_data).decode()
-    href = f'<a href="data:application/vnd.openxmlformats-officedocument.spreadsheetml.sheet;base64,{b64}" download="{filename}" class="download-link" style="background-color: #2e7d32;">Télécharger {text}</a>'
-    return href
+    descripteur, chemin = tempfile.mkstemp(suffix=".xlsx")
+    os.close(descripteur)
+    try:
+        ecrire_excel(list(zip(sheet_names, dataframes)), chemin)
+        with open(chemin, 'rb') as fichier:
+            st.download_button(f"Télécharger {text}", fichier, file_name=filename,
+                               mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+    finally:
+        os.remove(chemin)
+
+# Fonction pour afficher l'écart entre les vues dérivées et les totaux de l'API
+def afficher_ecarts_balayage_unique(service, site_url, start_date, end_date, pages_queries_df, cache=None):
+    """
+    Les vues pages et mots-clés calculées à partir des données pages et mots-clés
+    n'incluent pas les requêtes anonymisées : on affiche la part manquante.
+    """
+    from gsc_extracteur.derivees import comparer_totaux, totaux_site
+    
+    try:
+        ecarts = comparer_totaux(pages_queries_df, totaux_site(service, site_url, start_date, end_date, cache))
+    except Exception as e:
+        st.warning(f"Impossible de récupérer les totaux du site pour comparaison : {e}")
+        return
+    
+    st.markdown('<div class="sub-header">Écart avec les totaux de l\'API (requêtes anonymisées)</div>', unsafe_allow_html=True)
+    st.caption("Totaux de l'API agrégés par page, comme les données pages et mots-clés.")
+    col1, col2 = st.columns(2)
+    with col1:
+        st.metric("Clics (données dérivées / API)", f"{ecarts['clicks']['derive']} / {ecarts['clicks']['api']}",
+                  f"{-ecarts['clicks']['ecart_pct']:.1f} %", delta_color="off")
+    with col2:
+        st.metric("Impressions (données dérivées / API)", f"{ecarts['impressions']['derive']} / {ecarts['impressions']['api']}",
+                  f"{-ecarts['impressions']['ecart_pct']:.1f} %", delta_color="off")
+
+# Fonction pour proposer le téléchargement aux formats Parquet et Arrow
+def afficher_telechargements_colonnaires(df, nom_fichier, text):
+    """Fichiers compressés (zstd) aux colonnes de pages et mots-clés encodées par dictionnaire."""
+    from gsc_extracteur.export import exporter_octets
+    
+    col_parquet, col_arrow = st.columns(2)
+    with col_parquet:
+        st.download_button(f"Télécharger {text} (Parquet)", exporter_octets(df, 'parquet'),
+                           file_name=f"{nom_fichier}.parquet", key=f"{nom_fichier}_parquet")
+    with col_arrow:
+        st.download_button(f"Télécharger {text} (Arrow/Feather)", exporter_octets(df, 'arrow'),
+                           file_name=f"{nom_fichier}.arrow", key=f"{nom_fichier}_arrow")
+
+# Fonction pour parcourir un résultat page par page, trié et filtré côté serveur
+def afficher_grille(jeux):
+    """
+    Seules les lignes de la page affichée sont envoyées au navigateur, quelle que
+    soit la taille du résultat. Sans pyarrow, seules les premières lignes sont affichées.
+    """
+    from gsc_extracteur.grille import TAILLE_PAGE, JeuPagine
+    
+    nom = st.selectbox("Résultat", list(jeux), key="grille_jeu")
+    df = jeux[nom]
+    grilles = st.session_state.setdefault('grilles', {})
+    if nom not in grilles or grilles[nom][0] is not df:
+        try:
+            grilles[nom] = (df, JeuPagine(df))
+        except ImportError as e:
+            st.info(str(e))
+            st.dataframe(df.head(TAILLE_PAGE))
+            return
+    jeu = grilles[nom][1]
+    
+    col_tri, col_ordre, col_colonne, col_texte = st.columns(4)
+    with col_tri:
+        colonnes = jeu.colonnes
+        tri = st.selectbox("Trier par", colonnes, index=colonnes.index('clicks') if 'clicks' in colonnes else 0,
+                           key="grille_tri")
+    with col_ordre:
+        croissant = st.radio("Ordre", ["Décroissant", "Croissant"], horizontal=True, key="grille_ordre") == "Croissant"
+    with col_colonne:
+        colonne_filtre = st.selectbox("Filtrer sur", ["(aucun filtre)"] + jeu.colonnes_texte, key="grille_colonne")
+    with col_texte:
+        texte = st.text_input("Contient", key="grille_texte")
+    if colonne_filtre == "(aucun filtre)" or not texte:
+        colonne_filtre, texte = None, None
+    
+    total = jeu.compter(colonne_filtre, texte)
+    nb_pages = max(1, -(-total // TAILLE_PAGE))
+    numero = st.number_input(f"Page (sur {nb_pages})", min_value=1, max_value=nb_pages, value=1, key="grille_page")
+    st.dataframe(jeu.page(numero - 1, TAILLE_PAGE, tri, croissant, colonne_filtre, texte))
+    debut = (numero - 1) * TAILLE_PAGE
+    st.caption(f"Lignes {min(debut + 1, total)} à {min(debut + TAILLE_PAGE, total)} sur {total}")
+
+# Fonction pour estimer le découpage automatique et son coût avant l'extraction
+def afficher_plan(service, site_url, start_date, end_date, types_selectionnes, cache=None, options=None):
+    """
+    Une requête de sondage (plus une ou deux pour une propriété jamais extraite)
+    par type de données ; le plan affiché est celui que suivra l'extraction.
+    """
+    from gsc_extracteur.moteur import options_requete
+    from gsc_extracteur.planificateur import planifier
+    
+    for dimensions, libelle, nom in types_selectionnes:
+        options_type = options_requete(**options) if options and nom == "custom_data" else None
+        try:
+            plan = planifier(service, site_url, start_date, end_date, dimensions, options_type, cache)
+        except Exception as e:
+            st.error(f"Impossible d'estimer le découpage des données {libelle} : {e}")
+            continue
+        st.markdown(f"**Données {libelle}**")
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Tranches", len(plan))
+        col2.metric("Requêtes estimées", plan.requetes_estimees,
+                    delta=plan.requetes_estimees - plan.requetes_par_jour, delta_color="inverse",
+                    help="Écart avec un découpage fixe par jour")
+        col3.metric("Requêtes de sondage", plan.sondages)
+        st.dataframe(plan.vers_dataframe())
+
+# Fonction pour afficher les métriques par répertoire ou par section du site
+def afficher_repertoires(cumuls):
+    """
+    Les cumuls sont précalculés à l'extraction (voir `memoriser_pour_analyse`) :
+    changer de profondeur ou de sections ne relit pas les lignes du résultat.
+    """
+    from gsc_extracteur.repertoires import PROFONDEUR_MAX
+    
+    nom = st.selectbox("Résultat", list(cumuls), key="repertoires_jeu")
+    cumul = cumuls[nom]
+    
+    col_profondeur, col_sections = st.columns([1, 3])
+    with col_profondeur:
+        profondeur = st.number_input("Profondeur", min_value=0, max_value=PROFONDEUR_MAX, value=1,
+                                     key="repertoires_profondeur")
+    with col_sections:
+        texte = st.text_area("Sections (une par ligne : nom = expression régulière)",
+                             placeholder="blog = /blog/\nproduits = /produits/", key="repertoires_sections")
+    
+    motifs = {}
+    for ligne in texte.splitlines():
+        section, _, motif = ligne.partition('=')
+        if section.strip() and motif.strip():
+            motifs[section.strip()] = motif.strip()
+    
+    if motifs:
+        try:
+            st.dataframe(cumul.sections(motifs))
+        except re.error as e:
+            st.error(f"Expression régulière invalide : {e}")
+    else:
+        st.dataframe(cumul.repertoires(profondeur))
+
+# Fonction pour analyser localement les données extraites (DuckDB)
+def afficher_analyse():
+    """
+    Jeux de données : DataFrames extraits pendant la session et exports Parquet/CSV
+    du dossier d'exports, lus directement sur disque. DuckDB n'est chargé qu'une fois
+    l'analyse activée.
+    """
+    jeux = dict(st.session_state.get('jeux_analyse', {}))
+    jeux.update(lister_exports())
+    if not jeux:
+        st.info("Aucune donnée extraite ou exportée à analyser pour le moment.")
+        return
+    if not st.checkbox(f"Analyser les {len(jeux)} jeux de données disponibles", value=False, key="analyse_active"):
+        return
+    from gsc_extracteur.analyse import METRIQUES_ANALYSE, MoteurAnalyse
+    
+    try:
+        if 'moteur_analyse' not in st.session_state:
+            st.session_state.moteur_analyse = MoteurAnalyse()
+        moteur = st.session_state.moteur_analyse
+    except ImportError as e:
+        st.info(str(e))
+        return
+    
+    nom = st.selectbox("Jeu de données", list(jeux), key="analyse_jeu")
+    if moteur.jeux.get(nom) is not jeux[nom]:
+        moteur.enregistrer(nom, jeux[nom])
+    if not set(METRIQUES_ANALYSE) <= set(moteur.colonnes(nom)):
+        st.info(f"{nom} ne contient pas les colonnes {', '.join(METRIQUES_ANALYSE)}.")
+        return
+    dimensions = moteur.dimensions(nom)
+    
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        dimension = st.selectbox("Dimension", [d for d in dimensions if d != 'date'] or dimensions, key="analyse_dimension")
+    with col2:
+        metrique = st.selectbox("Métrique", METRIQUES_ANALYSE, key="analyse_metrique")
+    with col3:
+        n = st.number_input("Nombre de lignes", min_value=1, max_value=10000, value=50, key="analyse_n")
+    with col4:
+        contient = st.text_input("Contient", key="analyse_contient")
+    
+    st.dataframe(moteur.top(nom, [dimension], metrique, n, contient or None))
+    
+    # Comparaison de deux périodes, si les données sont ventilées par date
+    debut, fin = moteur.periode(nom) if 'date' in dimensions else (None, None)
+    if debut is not None and debut < fin:
+        milieu = debut + (fin - debut) / 2
+        col_a, col_b = st.columns(2)
+        with col_a:
+            periode_a = st.date_input("Période A", (debut, milieu), min_value=debut, max_value=fin, key="analyse_periode_a")
+        with col_b:
+            periode_b = st.date_input("Période B", (milieu + datetime.timedelta(days=1), fin), min_value=debut,
+                                      max_value=fin, key="analyse_periode_b")
+        if len(periode_a) == 2 and len(periode_b) == 2:
+            st.dataframe(moteur.comparer_periodes(nom, dimension, periode_a, periode_b, n, contient or None))
 
 # Fonction principale
 def main():
     # Tentative d'authentification
     try:
-        service = authenticate_gsc()
+        service = get_session_service()
         
         # Récupération des propriétés
-        properties = get_properties(service)
+        properties = get_session_properties(service)
         
         if not properties:
             st.warning("Aucune propriété n'a été trouvée pour ce compte Google.")
@@ -475,7 +795,100 @@ def main():
             ["Extraire les données par pages", 
              "Extraire les données par mots-clés", 
              "Extraire les données par pages et mots-clés",
-             "Extraire les trois types de données"]
+             "Extraire les trois types de données",
+             "Extraction personnalisée (dimensions, filtres, type de recherche)"]
+        )
+        
+        # Extraction personnalisée : dimensions quelconques, filtres, type de recherche et état des données
+        extract_custom = extraction_type.startswith("Extraction personnalisée")
+        options_personnalisees = {}
+        if extract_custom:
+            from gsc_extracteur.moteur import TYPES_RECHERCHE, filtre
+            
+            dimensions_personnalisees = st.multiselect(
+                "Dimensions",
+                ["page", "query", "date", "country", "device", "searchAppearance"],
+                default=["page"]
+            )
+            type_recherche = st.selectbox("Type de recherche", TYPES_RECHERCHE)
+            col_dimension, col_operateur, col_expression = st.columns(3)
+            with col_dimension:
+                dimension_filtre = st.selectbox("Filtrer sur", ["(aucun filtre)", "page", "query", "country", "device"])
+            with col_operateur:
+                operateur_filtre = st.selectbox(
+                    "Opérateur",
+                    ["contains", "equals", "notContains", "notEquals", "includingRegex", "excludingRegex"]
+                )
+            with col_expression:
+                expression_filtre = st.text_input("Valeur")
+            donnees_recentes = st.checkbox("Inclure les données récentes non finalisées", value=False)
+            
+            if dimension_filtre != "(aucun filtre)" and expression_filtre:
+                options_personnalisees['filtres'] = [filtre(dimension_filtre, expression_filtre, operateur_filtre)]
+            options_personnalisees['type_recherche'] = type_recherche
+            if donnees_recentes:
+                options_personnalisees['etat_donnees'] = 'all'
+        
+        # Comparaison avec une période de référence, extraite en même temps que la période choisie
+        comparaison = None
+        if extraction_type != "Extraire les trois types de données" and st.checkbox(
+            "Comparer avec une période de référence", value=False
+        ):
+            comparaison = st.radio(
+                "Période de référence :",
+                ["precedente", "annee_precedente"],
+                format_func=lambda p: {"precedente": "Période précédente (même durée)",
+                                       "annee_precedente": "Mêmes dates l'année précédente"}[p],
+                horizontal=True
+            )
+            from gsc_extracteur.comparaison import periode_reference
+            
+            debut_reference, fin_reference = periode_reference(start_date, end_date, comparaison)
+            st.caption(f"Période de référence : du {debut_reference} au {fin_reference}")
+        
+        # Découpage de la période en tranches extraites en parallèle
+        decoupage = st.radio(
+            "Découpage de la période :",
+            ["Par jour (plus de lignes récupérées)", "Par semaine (moins de requêtes)",
+             "Automatique (selon le volume de données de la propriété)"],
+            horizontal=True
+        )
+        granularite = 'day' if decoupage.startswith("Par jour") else 'week' if decoupage.startswith("Par semaine") else 'auto'
+        if granularite == 'auto':
+            st.caption("Tranches d'un mois, d'une semaine ou d'un jour (voire d'un jour par appareil) selon le volume "
+                       "estimé de chaque période : peu de requêtes pour une petite propriété, aucune ligne perdue pour une grande.")
+        
+        # Les jours déjà extraits ne sont pas redemandés à l'API (données finalisées après 3 jours)
+        utiliser_cache = st.checkbox("Réutiliser les données déjà extraites (cache local)", value=True)
+        cache = obtenir_cache() if utiliser_cache else None
+        
+        # Points de reprise : une extraction interrompue reprend là où elle s'était arrêtée
+        reprise = st.checkbox("Sauvegarder la progression pour pouvoir reprendre une extraction interrompue", value=True)
+        
+        # Export en flux : les lignes sont écrites sur disque au fur et à mesure, sans être gardées en mémoire
+        export_flux = not comparaison and st.checkbox("Exporter directement dans un fichier (gros volumes, une ligne par jour)", value=False)
+        if export_flux:
+            format_flux = st.selectbox(
+                "Format du fichier",
+                ["csv.gz", "csv", "parquet"],
+                format_func=lambda f: {"csv.gz": "CSV compressé (.csv.gz)", "csv": "CSV (.csv)", "parquet": "Parquet (.parquet)"}[f]
+            )
+            partitionner_par_date = format_flux == "parquet" and st.checkbox(
+                "Partitionner par date (un dossier, avec un sous-dossier date=AAAA-MM-JJ par jour)", value=False
+            )
+        
+        # Extraction en arrière-plan : elle continue même si la page est réexécutée ou fermée
+        arriere_plan = not export_flux and st.checkbox(
+            "Exécuter en arrière-plan (l'extraction continue si la page est rechargée ou fermée, "
+            "plusieurs extractions peuvent être mises en file)",
+            value=False
+        )
+        
+        # Balayage unique : une seule extraction pages et mots-clés au lieu de trois
+        balayage_unique = extraction_type == "Extraire les trois types de données" and st.checkbox(
+            "Balayage unique : calculer les vues pages et mots-clés à partir des données pages et mots-clés "
+            "(environ 3 fois moins de requêtes, mais sans les requêtes anonymisées)",
+            value=False
         )
         
         # Variables pour les options d'extraction
@@ -483,49 +896,129 @@ def main():
         extract_queries = extraction_type == "Extraire les données par mots-clés" or extraction_type == "Extraire les trois types de données"
         extract_pages_queries = extraction_type == "Extraire les données par pages et mots-clés" or extraction_type == "Extraire les trois types de données"
         
+        types_selectionnes = [
+            (dimensions, libelle, nom)
+            for selectionne, dimensions, libelle, nom in [
+                (extract_pages, ['page'], "par pages", "pages_data"),
+                (extract_queries, ['query'], "par mots-clés", "queries_data"),
+                (extract_pages_queries, ['page', 'query'], "par pages et mots-clés", "pages_queries_data"),
+                (extract_custom, dimensions_personnalisees if extract_custom else [], "personnalisées", "custom_data"),
+            ]
+            if selectionne
+        ]
+        
         # Bouton d'extraction avec style amélioré
         st.markdown("<br>", unsafe_allow_html=True)  # Espace avant le bouton
         extract_button = st.button("📊 Extraire les données")
         
+        # Estimation du découpage automatique, sans lancer l'extraction
+        if granularite == 'auto' and st.button("🔎 Estimer le découpage et le nombre de requêtes"):
+            with st.spinner("Estimation du volume de données..."):
+                afficher_plan(service, selected_property, start_date_str, end_date_str, types_selectionnes, cache,
+                              options_personnalisees)
+        
         if extract_button:
             with st.spinner("Extraction des données en cours..."):
                 # Création d'un conteneur pour afficher la progression
                 progress_container = st.empty()
                 
+                # Export en flux vers un fichier
+                if export_flux:
+                    exporter_en_flux(service, selected_property, start_date_str, end_date_str,
+                                     types_selectionnes, format_flux, granularite, cache, options_personnalisees,
+                                     partitionner_par_date)
+                
+                # Extractions confiées à la file d'arrière-plan
+                elif arriere_plan:
+                    soumettre_en_arriere_plan(service, selected_property, start_date_str, end_date_str,
+                                              types_selectionnes, granularite, cache, options_personnalisees, comparaison)
+                
+                # Comparaison de la période avec sa période de référence
+                elif comparaison:
+                    dimensions, libelle, nom = (
+                        (dimensions_personnalisees, "personnalisées", "custom_data") if extract_custom else
+                        (['page'], "par pages", "pages_data") if extract_pages else
+                        (['query'], "par mots-clés", "queries_data") if extract_queries else
+                        (['page', 'query'], "par pages et mots-clés", "pages_queries_data")
+                    )
+                    if not dimensions or 'date' in dimensions:
+                        st.warning("Sélectionnez au moins une dimension, hors date, pour comparer deux périodes.")
+                    else:
+                        progress_container.info("Extraction simultanée des deux périodes (avec pagination)...")
+                        comparaison_df = extraire_avec_progression(service, selected_property, start_date_str, end_date_str,
+                                                                   dimensions, libelle, granularite, cache,
+                                                                   options=options_personnalisees, comparaison=comparaison)
+                        if not comparaison_df.empty:
+                            st.success(f"Comparaison des données {libelle} réussie: {len(comparaison_df)} lignes "
+                                       f"(suffixe _a : période de référence, _b : période choisie).")
+                            st.dataframe(comparaison_df.head(10))
+                            st.markdown(get_download_link(comparaison_df, f"{nom}_comparaison.csv", f"la comparaison des données {libelle}"),
+                                        unsafe_allow_html=True)
+                            afficher_telechargements_colonnaires(comparaison_df, f"{nom}_comparaison",
+                                                                 f"la comparaison des données {libelle}")
+                        else:
+                            st.warning("Aucune donnée n'a été trouvée sur les deux périodes.")
+                
                 # Extraction selon le type sélectionné
-                if extraction_type == "Extraire les trois types de données":
+                elif extraction_type == "Extraire les trois types de données":
                     # Créer un conteneur pour afficher la progression
                     progress_container.info("Extraction des trois types de données (avec pagination)...")
                     
-                    # Extraction des pages
-                    st.write("1. Extraction des données par pages...")
-                    pages_df = get_page_data(service, selected_property, start_date_str, end_date_str)
-                    if not pages_df.empty:
-                        st.success(f"Extraction des données par pages réussie: {len(pages_df)} lignes.")
-                        st.dataframe(pages_df.head(10))
-                    else:
-                        st.warning("Aucune donnée par page n'a été trouvée.")
-                    
-                    # Extraction des mots-clés
-                    st.write("2. Extraction des données par mots-clés...")
-                    queries_df = get_query_data(service, selected_property, start_date_str, end_date_str)
-                    if not queries_df.empty:
-                        st.success(f"Extraction des données par mots-clés réussie: {len(queries_df)} lignes.")
-                        st.dataframe(queries_df.head(10))
-                    else:
-                        st.warning("Aucune donnée par mot-clé n'a été trouvée.")
-                    
-                    # Extraction des pages et mots-clés
-                    st.write("3. Extraction des données par pages et mots-clés...")
-                    pages_queries_df = get_page_query_data(service, selected_property, start_date_str, end_date_str)
-                    if not pages_queries_df.empty:
-                        st.success(f"Extraction des données par pages et mots-clés réussie: {len(pages_queries_df)} lignes.")
-                        st.dataframe(pages_queries_df.head(10))
+                    if balayage_unique:
+                        # Une seule extraction pages et mots-clés, les deux autres vues sont calculées localement
+                        st.write("1. Extraction des données par pages et mots-clés (balayage unique)...")
+                        pages_queries_df = get_page_query_data(service, selected_property, start_date_str, end_date_str, granularite, cache, reprise)
+                        from gsc_extracteur.derivees import deriver_vues
+                        
+                        pages_df, queries_df = deriver_vues(pages_queries_df)
+                        if not pages_queries_df.empty:
+                            afficher_ecarts_balayage_unique(service, selected_property, start_date_str, end_date_str,
+                                                            pages_queries_df, cache)
+                        
+                        st.write("2. Vues par pages, par mots-clés et par pages et mots-clés...")
+                        for df, libelle, message_vide in [
+                            (pages_df, "par pages", "Aucune donnée par page n'a été trouvée."),
+                            (queries_df, "par mots-clés", "Aucune donnée par mot-clé n'a été trouvée."),
+                            (pages_queries_df, "par pages et mots-clés", "Aucune donnée par page et mot-clé n'a été trouvée."),
+                        ]:
+                            if not df.empty:
+                                memoriser_pour_analyse(f"données {libelle}", df)
+                                st.success(f"Données {libelle} : {len(df)} lignes.")
+                                st.dataframe(df.head(10))
+                            else:
+                                st.warning(message_vide)
                     else:
-                        st.warning("Aucune donnée par page et mot-clé n'a été trouvée.")
+                        # Extraction des pages
+                        st.write("1. Extraction des données par pages...")
+                        pages_df = get_page_data(service, selected_property, start_date_str, end_date_str, granularite, cache, reprise)
+                        if not pages_df.empty:
+                            st.success(f"Extraction des données par pages réussie: {len(pages_df)} lignes.")
+                            st.dataframe(pages_df.head(10))
+                        else:
+                            st.warning("Aucune donnée par page n'a été trouvée.")
+                        
+                        # Extraction des mots-clés
+                        st.write("2. Extraction des données par mots-clés...")
+                        queries_df = get_query_data(service, selected_property, start_date_str, end_date_str, granularite, cache, reprise)
+                        if not queries_df.empty:
+                            st.success(f"Extraction des données par mots-clés réussie: {len(queries_df)} lignes.")
+                            st.dataframe(queries_df.head(10))
+                        else:
+                            st.warning("Aucune donnée par mot-clé n'a été trouvée.")
+                        
+                        # Extraction des pages et mots-clés
+                        st.write("3. Extraction des données par pages et mots-clés...")
+                        pages_queries_df = get_page_query_data(service, selected_property, start_date_str, end_date_str, granularite, cache, reprise)
+                        if not pages_queries_df.empty:
+                            st.success(f"Extraction des données par pages et mots-clés réussie: {len(pages_queries_df)} lignes.")
+                            st.dataframe(pages_queries_df.head(10))
+                        else:
+                            st.warning("Aucune donnée par page et mot-clé n'a été trouvée.")
                     
                     # Proposer le téléchargement d'un fichier Excel avec les trois types de données
                     if not pages_df.empty or not queries_df.empty or not pages_queries_df.empty:
+                        import pandas as pd
+                        
                         # Créer des dataframes vides pour les feuilles manquantes si nécessaire
                         if pages_df.empty:
                             pages_df = pd.DataFrame(columns=['page', 'clicks', 'impressions', 'ctr', 'position'])
@@ -540,9 +1033,8 @@ def main():
                         date_str = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
                         excel_filename = f"gsc_data_{date_str}.xlsx"
                         
-                        st.markdown(get_excel_download_link(dataframes, sheet_names, excel_filename, 
-                                                          "le fichier Excel avec les trois types de données"), 
-                                  unsafe_allow_html=True)
+                        afficher_telechargement_excel(dataframes, sheet_names, excel_filename,
+                                                      "le fichier Excel avec les trois types de données")
                         
                         # Proposer aussi le téléchargement des fichiers CSV individuels
                         st.write("Vous pouvez également télécharger chaque type de données séparément en CSV :")
@@ -560,41 +1052,107 @@ def main():
                                 st.markdown(get_download_link(pages_queries_df, "pages_queries_data.csv", 
                                                            "les données par pages et mots-clés (CSV)"), 
                                           unsafe_allow_html=True)
+                        
+                        # Formats colonnaires, plus compacts et sans limite de lignes
+                        st.write("Ou aux formats Parquet et Arrow, plus compacts et sans limite de lignes :")
+                        if not pages_df.empty:
+                            afficher_telechargements_colonnaires(pages_df, "pages_data", "les données par pages")
+                        if not queries_df.empty:
+                            afficher_telechargements_colonnaires(queries_df, "queries_data", "les données par mots-clés")
+                        if not pages_queries_df.empty:
+                            afficher_telechargements_colonnaires(pages_queries_df, "pages_queries_data",
+                                                                 "les données par pages et mots-clés")
                 
                 # Extraction des données par page
                 elif extraction_type == "Extraire les données par pages":
                     progress_container.info("Extraction des données par pages (avec pagination)...")
-                    pages_df = get_page_data(service, selected_property, start_date_str, end_date_str)
+                    pages_df = get_page_data(service, selected_property, start_date_str, end_date_str, granularite, cache, reprise)
                     if not pages_df.empty:
                         st.success(f"Extraction des données par pages réussie: {len(pages_df)} lignes.")
                         st.dataframe(pages_df.head(10))
                         st.markdown(get_download_link(pages_df, "pages_data.csv", "les données par pages"), unsafe_allow_html=True)
+                        afficher_telechargements_colonnaires(pages_df, "pages_data", "les données par pages")
                     else:
                         st.warning("Aucune donnée par page n'a été trouvée.")
                 
                 # Extraction des données par mot-clé
                 elif extraction_type == "Extraire les données par mots-clés":
                     progress_container.info("Extraction des données par mots-clés (avec pagination)...")
-                    queries_df = get_query_data(service, selected_property, start_date_str, end_date_str)
+                    queries_df = get_query_data(service, selected_property, start_date_str, end_date_str, granularite, cache, reprise)
                     if not queries_df.empty:
                         st.success(f"Extraction des données par mots-clés réussie: {len(queries_df)} lignes.")
                         st.dataframe(queries_df.head(10))
                         st.markdown(get_download_link(queries_df, "queries_data.csv", "les données par mots-clés"), unsafe_allow_html=True)
+                        afficher_telechargements_colonnaires(queries_df, "queries_data", "les données par mots-clés")
                     else:
                         st.warning("Aucune donnée par mot-clé n'a été trouvée.")
                 
                 # Extraction des données par page et mot-clé
                 elif extraction_type == "Extraire les données par pages et mots-clés":
                     progress_container.info("Extraction des données par pages et mots-clés (avec pagination)...")
-                    pages_queries_df = get_page_query_data(service, selected_property, start_date_str, end_date_str)
+                    pages_queries_df = get_page_query_data(service, selected_property, start_date_str, end_date_str, granularite, cache, reprise)
                     if not pages_queries_df.empty:
                         st.success(f"Extraction des données par pages et mots-clés réussie: {len(pages_queries_df)} lignes.")
                         st.dataframe(pages_queries_df.head(10))
                         st.markdown(get_download_link(pages_queries_df, "pages_queries_data.csv", "les données par pages et mots-clés"), unsafe_allow_html=True)
+                        afficher_telechargements_colonnaires(pages_queries_df, "pages_queries_data",
+                                                             "les données par pages et mots-clés")
                     else:
                         st.warning("Aucune donnée par page et mot-clé n'a été trouvée.")
                 
+                # Extraction personnalisée
+                elif extract_custom:
+                    if not dimensions_personnalisees:
+                        st.warning("Sélectionnez au moins une dimension.")
+                    else:
+                        progress_container.info("Extraction personnalisée (avec pagination et découpage automatique)...")
+                        custom_df = get_custom_data(service, selected_property, start_date_str, end_date_str,
+                                                    dimensions_personnalisees, options_personnalisees, granularite, cache)
+                        if not custom_df.empty:
+                            st.success(f"Extraction personnalisée réussie: {len(custom_df)} lignes.")
+                            st.dataframe(custom_df.head(10))
+                            st.markdown(get_download_link(custom_df, "custom_data.csv", "les données personnalisées"), unsafe_allow_html=True)
+                            afficher_telechargements_colonnaires(custom_df, "custom_data", "les données personnalisées")
+                        else:
+                            st.warning("Aucune donnée n'a été trouvée.")
+                
                 progress_container.empty()
+        
+        # Suivi des extractions en arrière-plan, retrouvées à chaque réexécution de la page
+        afficher_taches()
+        
+        # Télémétrie : mesures cumulées de toutes les extractions de ce serveur
+        with st.expander("Télémétrie des extractions"):
+            telemetrie = obtenir_telemetrie()
+            afficher_telemetrie(st.empty())
+            col_json, col_openmetrics = st.columns(2)
+            with col_json:
+                st.download_button("Télécharger les mesures (JSON)", telemetrie.vers_json(),
+                                   file_name="telemetrie_gsc.json", mime="application/json")
+            with col_openmetrics:
+                st.download_button("Télécharger les mesures (OpenMetrics)", telemetrie.vers_openmetrics(),
+                                   file_name="telemetrie_gsc.prom", mime="text/plain")
+        
+        # Exploration des résultats de la session, page par page
+        jeux = st.session_state.get('jeux_analyse', {})
+        if jeux:
+            with st.expander("Explorer les résultats", expanded=True):
+                afficher_grille(jeux)
+        
+        # Métriques par répertoire et par section des résultats par page
+        cumuls = st.session_state.get('cumuls_repertoires', {})
+        if cumuls:
+            with st.expander("Répertoires et sections du site"):
+                afficher_repertoires(cumuls)
+        
+        # Analyse locale des données extraites
+        with st.expander("Analyse des données extraites"):
+            afficher_analyse()
+        
+        # Actualisation du suivi tant que des extractions sont en cours
+        if st.session_state.get('actualisation_auto', True) and any(t.active for t in obtenir_file_taches().lister(identifiant_session())):
+            time.sleep(DELAI_ACTUALISATION)
+            st.rerun()
                 
     except Exception as e:
         error_message = str(e)
@@ -0,0 +1,54 @@
+"""
+Bibliothèque d'extraction des données Google Search Console.
+
+Ce paquet ne dépend pas de Streamlit : l'application `extraction-donnees-gsc.py`
+l'utilise pour l'interface, mais il peut aussi être importé depuis un script.
+
+Les modules ne sont importés qu'au premier accès à l'un de leurs noms :
+`import gsc_extracteur` ou `from gsc_extracteur import lister_proprietes`
+ne chargent ni pandas ni pyarrow.
+"""
+
+import importlib
+
+# Noms exportés, par module
+_EXPORTS = {
+    'analyse': ['MoteurAnalyse', 'lister_exports'],
+    'arriere_plan': ['FileTaches', 'Tache', 'obtenir_file_taches'],
+    'auth': ['RafraichisseurJeton', 'charger_identifiants', 'construire_service', 'lister_proprietes',
+             'rafraichisseur_pour'],
+    'cache': ['CacheReponses', 'obtenir_cache'],
+    'comparaison': ['comparer_extractions', 'extraire_comparaison', 'periode_reference'],
+    'derivees': ['comparer_totaux', 'deriver_vues', 'totaux_site'],
+    'export': ['EcrivainCSV', 'EcrivainParquet', 'chemin_export', 'ecrire_arrow', 'ecrire_dataframe', 'ecrire_excel',
+               'ecrire_parquet', 'exporter_octets', 'ouvrir_ecrivain', 'vers_table_arrow'],
+    'grille': ['JeuPagine'],
+    'identifiants': ['PoolIdentifiants', 'construire_pool'],
+    'limiteur': ['LimiteurDebit', 'etat_limiteurs'],
+    'lot': ['extraire_lot', 'extraire_propriete', 'synchroniser_lot'],
+    'moteur': ['TYPES_RECHERCHE', 'extraire_donnees', 'extraire_en_flux', 'filtre', 'generer_shards',
+               'options_requete'],
+    'planificateur': ['Plan', 'lire_densites', 'planifier'],
+    'progression': ['Progression', 'ProgressionJournal'],
+    'repertoires': ['CumulsRepertoires', 'DictionnaireUrls'],
+    'reprise': ['Travail', 'extraire_reprenable', 'lister_travaux'],
+    'synchro': ['Entrepot', 'synchroniser'],
+    'telemetrie': ['SuiviExtraction', 'Telemetrie', 'obtenir_telemetrie'],
+}
+
+_MODULES = {nom: module for module, noms in _EXPORTS.items() for nom in noms}
+
+__all__ = [nom for noms in _EXPORTS.values() for nom in noms]
+
+
+def __getattr__(nom):
+    module = _MODULES.get(nom)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {nom!r}")
+    valeur = getattr(importlib.import_module(f".{module}", __name__), nom)
+    globals()[nom] = valeur
+    return valeur
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,157 @@
+import glob
+import os
+import threading
+
+from .export import DOSSIER_EXPORTS
+
+METRIQUES_ANALYSE = ['clicks', 'impressions', 'ctr', 'position']
+
+
+# Fonction pour importer duckdb avec un message explicite s'il est absent
+def _importer_duckdb():
+    try:
+        import duckdb
+    except ImportError:
+        raise ImportError("Le moteur d'analyse nécessite le paquet duckdb (pip install duckdb).")
+    return duckdb
+
+
+# Fonction pour protéger un identifiant SQL (nom de jeu de données ou de colonne)
+def _identifiant(nom):
+    return '"' + str(nom).replace('"', '""') + '"'
+
+
+# Fonction pour construire la lecture DuckDB d'un fichier, d'un motif ou d'un dossier
+def _lecture(chemin):
+    if os.path.isdir(chemin):
+        # Dossier partitionné (ex. date=AAAA-MM-JJ/, voir `ecrire_parquet`)
+        chemin = os.path.join(chemin, '**', '*.parquet')
+    litteral = "'" + chemin.replace("'", "''") + "'"
+    if chemin.endswith('.parquet'):
+        return f"read_parquet({litteral}, hive_partitioning = true)"
+    if chemin.endswith('.csv') or chemin.endswith('.csv.gz'):
+        return f"read_csv_auto({litteral}, header = true)"
+    raise ValueError(f"Format non pris en charge par le moteur d'analyse : {chemin}")
+
+
+# Fonction pour lister les fichiers exportés lisibles par le moteur d'analyse
+def lister_exports(dossier=DOSSIER_EXPORTS):
+    """Renvoie {nom du fichier : chemin} pour les exports Parquet et CSV du dossier."""
+    fichiers = []
+    for motif in ('*.parquet', '*.csv', '*.csv.gz'):
+        fichiers += glob.glob(os.path.join(dossier, motif))
+    return {os.path.basename(chemin): chemin for chemin in sorted(fichiers)}
+
+
+# Moteur d'analyse local sur les données extraites
+class MoteurAnalyse:
+    """
+    Connexion DuckDB sur laquelle sont enregistrés des jeux de données :
+    DataFrames (lus sans copie via Arrow) ou fichiers Parquet/CSV lus
+    directement sur disque, sans les charger en mémoire. Les métriques sont
+    réagrégées comme dans le moteur d'extraction : clics et impressions
+    sommés, CTR recalculé, position pondérée par les impressions.
+    """
+
+    def __init__(self, chemin=':memory:'):
+        duckdb = _importer_duckdb()
+        self.conn = duckdb.connect(chemin)
+        self.lock = threading.Lock()
+        self.jeux = {}
+
+    def enregistrer(self, nom, source):
+        """`source` : DataFrame, chemin de fichier Parquet/CSV, motif glob ou dossier partitionné."""
+        with self.lock:
+            if isinstance(source, str):
+                self.conn.execute(f"CREATE OR REPLACE VIEW {_identifiant(nom)} AS SELECT * FROM {_lecture(source)}")
+            else:
+                self.conn.register(nom, source)
+            self.jeux[nom] = source
+
+    def colonnes(self, nom):
+        with self.lock:
+            return [ligne[0] for ligne in self.conn.execute(f"DESCRIBE {_identifiant(nom)}").fetchall()]
+
+    def dimensions(self, nom):
+        """Colonnes du jeu de données qui ne sont pas des métriques."""
+        return [colonne for colonne in self.colonnes(nom) if colonne not in METRIQUES_ANALYSE]
+
+    def periode(self, nom):
+        """Première et dernière dates (datetime.date) d'un jeu de données avec une colonne `date`."""
+        with self.lock:
+            return self.conn.execute(
+                f"SELECT MIN(CAST(date AS DATE)), MAX(CAST(date AS DATE)) FROM {_identifiant(nom)}").fetchone()
+
+    def requete(self, sql, parametres=None):
+        """Exécute une requête SQL quelconque et renvoie un DataFrame."""
+        with self.lock:
+            return self.conn.execute(sql, parametres or []).df()
+
+    def _agregation(self, nom, dimensions, conditions):
+        cles = ', '.join(_identifiant(d) for d in dimensions)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        return f"""
+            SELECT {cles},
+                   CAST(SUM(clicks) AS BIGINT) AS clicks,
+                   CAST(SUM(impressions) AS BIGINT) AS impressions,
+                   CASE WHEN SUM(impressions) > 0 THEN SUM(clicks) / SUM(impressions) ELSE 0 END AS ctr,
+                   CASE WHEN SUM(impressions) > 0 THEN SUM(position * impressions) / SUM(impressions) ELSE 0 END
+                       AS position
+            FROM {_identifiant(nom)}
+            {where}
+            GROUP BY {cles}
+        """
+
+    def _conditions(self, dimensions, contient, periode):
+        conditions, parametres = [], []
+        if contient:
+            conditions.append(f"CAST({_identifiant(dimensions[0])} AS VARCHAR) ILIKE ?")
+            parametres.append(f"%{contient}%")
+        if periode:
+            conditions.append("CAST(date AS VARCHAR) BETWEEN ? AND ?")
+            parametres += [str(periode[0]), str(periode[1])]
+        return conditions, parametres
+
+    def top(self, nom, dimensions, metrique='clicks', n=50, contient=None, periode=None):
+        """
+        Renvoie les `n` premières clés selon `metrique` (la position est triée
+        par ordre croissant). `contient` filtre la première dimension (sans
+        tenir compte de la casse) ; `periode` (debut, fin) nécessite une
+        colonne `date`.
+        """
+        if isinstance(dimensions, str):
+            dimensions = [dimensions]
+        if metrique not in METRIQUES_ANALYSE:
+            raise ValueError(f"Métrique inconnue : {metrique}")
+        conditions, parametres = self._conditions(dimensions, contient, periode)
+        ordre = 'ASC' if metrique == 'position' else 'DESC'
+        sql = f"{self._agregation(nom, dimensions, conditions)} ORDER BY {metrique} {ordre} LIMIT ?"
+        return self.requete(sql, parametres + [int(n)])
+
+    def comparer_periodes(self, nom, dimension, periode_a, periode_b, n=50, contient=None):
+        """
+        Compare deux périodes (debut, fin) d'un jeu de données avec une colonne
+        `date` : métriques de chaque période par clé et écarts (B - A), triés
+        par écart de clics absolu décroissant.
+        """
+        conditions_a, parametres_a = self._conditions([dimension], contient, periode_a)
+        conditions_b, parametres_b = self._conditions([dimension], contient, periode_b)
+        cle = _identifiant(dimension)
+        sql = f"""
+            WITH a AS ({self._agregation(nom, [dimension], conditions_a)}),
+                 b AS ({self._agregation(nom, [dimension], conditions_b)})
+            SELECT COALESCE(a.{cle}, b.{cle}) AS {cle},
+                   COALESCE(a.clicks, 0) AS clicks_a,
+                   COALESCE(b.clicks, 0) AS clicks_b,
+                   COALESCE(b.clicks, 0) - COALESCE(a.clicks, 0) AS ecart_clicks,
+                   COALESCE(a.impressions, 0) AS impressions_a,
+                   COALESCE(b.impressions, 0) AS impressions_b,
+                   COALESCE(b.impressions, 0) - COALESCE(a.impressions, 0) AS ecart_impressions,
+                   a.position AS position_a,
+                   b.position AS position_b,
+                   b.position - a.position AS ecart_position
+            FROM a FULL OUTER JOIN b ON a.{cle} = b.{cle}
+            ORDER BY ABS(ecart_clicks) DESC, ABS(ecart_impressions) DESC
+            LIMIT ?
+        """
+        return self.requete(sql, parametres_a + parametres_b + [int(n)])
@@ -0,0 +1,193 @@
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+MAX_TACHES = 2  # Nombre d'extractions exécutées en même temps en arrière-plan
+MAX_ERREURS = 20  # Nombre de messages d'erreur distincts conservés par tâche
+
+# Statuts d'une tâche, dans l'ordre où ils se succèdent
+EN_ATTENTE = 'en_attente'
+EN_COURS = 'en_cours'
+TERMINEE = 'terminee'
+ECHEC = 'echec'
+ANNULEE = 'annulee'
+
+
+# Extraction soumise en arrière-plan
+class Tache:
+    """
+    État d'une extraction, mis à jour par le thread qui l'exécute et lu par
+    l'interface : statut, avancement (tranches et lignes), messages d'erreur
+    des tranches en échec, puis résultat ou exception. `proprietaire`
+    identifie la session (ou l'utilisateur) qui l'a soumise.
+    """
+
+    def __init__(self, identifiant, libelle, parametres=None, proprietaire=None):
+        self.identifiant = identifiant
+        self.libelle = libelle
+        self.parametres = parametres or {}
+        self.proprietaire = proprietaire
+        self.lock = threading.Lock()
+        self.statut = EN_ATTENTE
+        self.terminees = 0
+        self.total = 0
+        self.lignes = 0
+        self.erreurs = []
+        self.resultat = None
+        self.exception = None
+        self.soumise = time.time()
+        self.debut = None
+        self.fin = None
+        self.future = None
+
+    def on_progress(self, terminees, total, lignes):
+        with self.lock:
+            self.terminees, self.total, self.lignes = terminees, total, lignes
+
+    def on_error(self, e):
+        message = str(e)
+        with self.lock:
+            if message not in self.erreurs and len(self.erreurs) < MAX_ERREURS:
+                self.erreurs.append(message)
+
+    @property
+    def active(self):
+        return self.statut in (EN_ATTENTE, EN_COURS)
+
+    @property
+    def avancement(self):
+        """Fraction des tranches terminées, entre 0 et 1."""
+        with self.lock:
+            if self.statut == TERMINEE:
+                return 1.0
+            return self.terminees / self.total if self.total else 0.0
+
+    @property
+    def duree(self):
+        if self.debut is None:
+            return None
+        return (self.fin or time.time()) - self.debut
+
+    def vers_dict(self):
+        """Résumé sérialisable en JSON (sans le résultat)."""
+        with self.lock:
+            return {
+                'identifiant': self.identifiant,
+                'libelle': self.libelle,
+                'parametres': dict(self.parametres),
+                'statut': self.statut,
+                'terminees': self.terminees,
+                'total': self.total,
+                'lignes': self.lignes,
+                'erreurs': list(self.erreurs),
+                'exception': str(self.exception) if self.exception is not None else None,
+                'soumise': self.soumise,
+                'duree': self.duree,
+            }
+
+
+# File d'extractions exécutées en arrière-plan, avec le registre des tâches
+class FileTaches:
+    """
+    Les extractions s'exécutent dans un pool de threads du processus, et non
+    dans le script de l'interface : elles continuent quand la page est
+    réexécutée ou fermée, et l'interface retrouve les tâches et leurs
+    résultats dans le registre. Les quotas de l'API restent partagés grâce
+    aux limiteurs.
+
+    Le registre est commun au processus : chaque tâche porte le
+    `proprietaire` qui l'a soumise, et `lister`, `tache`, `annuler` et
+    `oublier` ne donnent accès qu'à ses tâches quand il est précisé.
+    """
+
+    def __init__(self, max_taches=MAX_TACHES):
+        self.executor = ThreadPoolExecutor(max_workers=max_taches, thread_name_prefix='gsc-tache')
+        self.lock = threading.Lock()
+        self.taches = {}
+        self.compteur = itertools.count(1)
+
+    def soumettre(self, libelle, fonction, *args, parametres=None, proprietaire=None, **kwargs):
+        """
+        Planifie `fonction(*args, on_progress=..., on_error=..., **kwargs)`,
+        par exemple `extraire_donnees` ou `extraire_comparaison`, et renvoie
+        la `Tache` correspondante. `parametres` est un résumé affichable de
+        l'extraction (propriété, période, dimensions...), `proprietaire`
+        l'identifiant de la session qui la soumet.
+        """
+        with self.lock:
+            tache = Tache(f"tache-{next(self.compteur)}", libelle, parametres, proprietaire)
+            self.taches[tache.identifiant] = tache
+
+        def executer():
+            with tache.lock:
+                if tache.statut == ANNULEE:
+                    return
+                tache.statut = EN_COURS
+                tache.debut = time.time()
+            try:
+                resultat = fonction(*args, on_progress=tache.on_progress, on_error=tache.on_error, **kwargs)
+            except Exception as e:
+                with tache.lock:
+                    tache.exception = e
+                    tache.statut = ECHEC
+            else:
+                with tache.lock:
+                    tache.resultat = resultat
+                    tache.statut = TERMINEE
+            finally:
+                tache.fin = time.time()
+
+        tache.future = self.executor.submit(executer)
+        return tache
+
+    def tache(self, identifiant, proprietaire=None):
+        with self.lock:
+            tache = self.taches.get(identifiant)
+        if tache is None or (proprietaire is not None and tache.proprietaire != proprietaire):
+            return None
+        return tache
+
+    def lister(self, proprietaire=None):
+        """Les tâches (de `proprietaire` s'il est précisé), de la plus récente à la plus ancienne."""
+        with self.lock:
+            taches = list(reversed(self.taches.values()))
+        if proprietaire is None:
+            return taches
+        return [tache for tache in taches if tache.proprietaire == proprietaire]
+
+    def annuler(self, identifiant, proprietaire=None):
+        """Annule une tâche en attente ; une tâche déjà démarrée va jusqu'au bout. Renvoie True si annulée."""
+        tache = self.tache(identifiant, proprietaire)
+        if tache is None:
+            return False
+        with tache.lock:
+            if tache.statut != EN_ATTENTE:
+                return False
+            tache.statut = ANNULEE
+        tache.future.cancel()
+        return True
+
+    def oublier(self, identifiant, proprietaire=None):
+        """Retire une tâche terminée du registre (et libère son résultat)."""
+        with self.lock:
+            tache = self.taches.get(identifiant)
+            if proprietaire is not None and tache is not None and tache.proprietaire != proprietaire:
+                return False
+            if tache is not None and not tache.active:
+                del self.taches[identifiant]
+                return True
+            return False
+
+
+_file_taches = None
+_file_taches_lock = threading.Lock()
+
+
+# Fonction pour obtenir la file d'extractions partagée par toutes les sessions du processus
+def obtenir_file_taches():
+    global _file_taches
+    with _file_taches_lock:
+        if _file_taches is None:
+            _file_taches = FileTaches()
+        return _file_taches
@@ -0,0 +1,131 @@
+import datetime
+import os
+import pickle
+import threading
+
+SCOPES = ['https://www.googleapis.com/auth/webmasters']
+MARGE_RAFRAICHISSEMENT = 300  # Secondes avant l'expiration du jeton où il est rafraîchi
+
+
+# Fonction d'authentification sans interface (scripts, tâches planifiées)
+def charger_identifiants(token_path='token.pickle', credentials_path='credentials.json',
+                         compte_service=None, interactif=True):
+    """
+    Renvoie des identifiants valides pour l'API Search Console :
+    - depuis le fichier de clé d'un compte de service si `compte_service` est fourni ;
+    - sinon depuis `token_path` (créé par l'application), rafraîchi si besoin ;
+    - sinon, si `interactif`, via le flux OAuth local à partir de `credentials_path`.
+    """
+    from google.auth.transport.requests import Request
+
+    if compte_service:
+        from google.oauth2 import service_account
+        return service_account.Credentials.from_service_account_file(compte_service, scopes=SCOPES)
+
+    creds = None
+    if os.path.exists(token_path):
+        with open(token_path, 'rb') as token:
+            creds = pickle.load(token)
+
+    if creds and creds.valid:
+        return creds
+
+    if creds and creds.expired and creds.refresh_token:
+        creds.refresh(Request())
+    else:
+        if not interactif:
+            raise RuntimeError(f"Aucun jeton valide dans {token_path} et l'authentification interactive est désactivée.")
+        if not os.path.exists(credentials_path):
+            raise FileNotFoundError(f"Le fichier {credentials_path} n'existe pas pour l'authentification locale.")
+        from google_auth_oauthlib.flow import InstalledAppFlow
+        flow = InstalledAppFlow.from_client_secrets_file(credentials_path, SCOPES)
+        creds = flow.run_local_server(port=8080)
+
+    with open(token_path, 'wb') as token:
+        pickle.dump(creds, token)
+    return creds
+
+
+# Fonction pour construire le client de l'API Search Console
+def construire_service(creds):
+    from googleapiclient.discovery import build
+    # Document de découverte statique fourni avec google-api-python-client : aucun appel réseau,
+    # et pas de recherche dans le cache de découverte (oauth2client/file_cache)
+    return build('searchconsole', 'v1', credentials=creds, static_discovery=True, cache_discovery=False)
+
+
+# Fonction pour récupérer les propriétés disponibles
+def lister_proprietes(service):
+    site_list = service.sites().list().execute()
+    return [site['siteUrl'] for site in site_list.get('siteEntry', [])]
+
+
+# Rafraîchissement du jeton en arrière-plan
+class RafraichisseurJeton:
+    """
+    Thread qui rafraîchit les identifiants `MARGE_RAFRAICHISSEMENT` secondes
+    avant l'expiration du jeton, pour qu'aucune requête n'ait à attendre
+    un rafraîchissement. Appeler `arreter()` pour l'interrompre.
+    """
+
+    def __init__(self, creds, marge=MARGE_RAFRAICHISSEMENT):
+        self.creds = creds
+        self.marge = marge
+        self.arret = threading.Event()
+        self.thread = threading.Thread(target=self._boucle, name='rafraichissement-jeton', daemon=True)
+        self.thread.start()
+
+    def _delai(self):
+        expiration = getattr(self.creds, 'expiry', None)
+        if expiration is None:
+            return 0
+        # google-auth stocke l'expiration en UTC, sans fuseau horaire
+        restant = expiration - datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+        return max(0, restant.total_seconds() - self.marge)
+
+    def _boucle(self):
+        from google.auth.transport.requests import Request
+
+        while not self.arret.wait(self._delai()):
+            try:
+                self.creds.refresh(Request())
+            except Exception:
+                # Les requêtes rafraîchissent aussi le jeton si besoin : on réessaie plus tard
+                pass
+            # Échec ou jeton sans date d'expiration : nouvel essai dans une minute
+            if self._delai() == 0 and self.arret.wait(60):
+                return
+
+    def arreter(self):
+        self.arret.set()
+
+
+_rafraichisseurs = {}
+_rafraichisseurs_lock = threading.Lock()
+
+
+# Fonction pour identifier un compte à partir de ses identifiants (deux chargements du même jeton donnent la même clé)
+def _cle_identifiants(creds):
+    email = getattr(creds, 'service_account_email', None)
+    if email:
+        return ('compte_service', email)
+    if getattr(creds, 'refresh_token', None):
+        return ('oauth', getattr(creds, 'client_id', None), creds.refresh_token)
+    return ('objet', id(creds))
+
+
+# Fonction pour obtenir l'unique rafraîchisseur du processus pour un compte
+def rafraichisseur_pour(creds):
+    """
+    Démarre un `RafraichisseurJeton` au premier appel pour un compte, puis
+    renvoie le même aux appels suivants, même avec un autre objet chargé
+    depuis le même jeton : utiliser alors ses `creds`, tenus à jour, à la
+    place de `creds` (un seul thread et un seul rafraîchissement par compte,
+    quel que soit le nombre de sessions de l'application).
+    """
+    cle = _cle_identifiants(creds)
+    with _rafraichisseurs_lock:
+        rafraichisseur = _rafraichisseurs.get(cle)
+        if rafraichisseur is None or rafraichisseur.arret.is_set():
+            rafraichisseur = _rafraichisseurs[cle] = RafraichisseurJeton(creds)
+        return rafraichisseur
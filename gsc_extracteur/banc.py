@@ -0,0 +1,296 @@
+"""
+Banc d'essai de l'extraction et des exports, sur le simulateur local
+(aucun quota de l'API consommé) :
+
+    python -m gsc_extracteur.banc --jours 30 --lignes-par-jour 20000 --latence 0.05
+    python -m gsc_extracteur.banc --json resultats.json --reference precedents.json
+    python -m gsc_extracteur.banc --demarrage --json demarrage.json
+
+Chaque scénario est exécuté dans un processus séparé, pour que le pic de
+mémoire (RSS) mesuré soit le sien. Les scénarios de mêmes dimensions
+doivent renvoyer les mêmes lignes (voir `verifier_completude`) : le code de
+retour est non nul sinon.
+"""
+
+import argparse
+import ast
+import datetime
+import io
+import json
+import multiprocessing
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# Scénarios : (dimensions extraites, export mesuré après l'extraction, mode d'extraction)
+SCENARIOS = {
+    'pages': (['page'], None, 'memoire'),
+    'mots_cles': (['query'], None, 'memoire'),
+    'pages_mots_cles': (['page', 'query'], None, 'memoire'),
+    'reprise': (['page', 'query'], None, 'reprise'),
+    'export_csv': (['page', 'query'], 'csv', 'memoire'),
+    'export_excel': (['page', 'query'], 'excel', 'memoire'),
+}
+
+APPLICATION = 'extraction-donnees-gsc.py'  # Script Streamlit dont les imports sont mesurés au démarrage
+
+# Démarrages mesurés : code exécuté dans un interpréteur neuf (les imports de l'application sont ajoutés ensuite)
+DEMARRAGES = {
+    'interpreteur': 'pass',
+    'paquet': 'import gsc_extracteur',
+    'cli': 'import gsc_extracteur.cli',
+    'service': ("from google.oauth2.credentials import Credentials\n"
+                "from gsc_extracteur.auth import construire_service\n"
+                "construire_service(Credentials(token='x'))"),
+}
+
+
+# Fonction pour exporter un DataFrame comme le fait l'application
+def _exporter(df, format_export):
+    if format_export == 'csv':
+        sortie = io.BytesIO()
+        df.to_csv(sortie, index=False)
+        return sortie.tell()
+
+    from .export import ecrire_excel
+    descripteur, chemin = tempfile.mkstemp(suffix='.xlsx')
+    os.close(descripteur)
+    try:
+        ecrire_excel([('Données', df)], chemin)
+        return os.path.getsize(chemin)
+    finally:
+        os.remove(chemin)
+
+
+# Fonction exécutée dans un processus séparé pour mesurer un scénario
+def _mesurer(url, site_url, scenario, debut, fin, granularite, quota, taille_lot):
+    from .limiteur import definir_limiteur
+    from .moteur import extraire_donnees
+    from .reprise import extraire_reprenable
+    from .simulateur import service_simule
+    from .telemetrie import obtenir_telemetrie, pic_memoire
+    from .transport import TAILLE_LOT
+
+    dimensions, format_export, mode = SCENARIOS[scenario]
+    taille_lot = TAILLE_LOT if taille_lot is None else taille_lot
+    service = service_simule(url)
+    if quota:
+        definir_limiteur(('utilisateur', id(service._http.credentials)), quota, quota / 60)
+        definir_limiteur(('site', site_url), quota, quota / 60)
+
+    depart = time.perf_counter()
+    premiere_ligne = None
+    lignes_recues = 0
+
+    def on_progress(terminees, total, lignes):
+        nonlocal premiere_ligne, lignes_recues
+        lignes_recues = lignes
+        if lignes and premiere_ligne is None:
+            premiere_ligne = time.perf_counter() - depart
+
+    if mode == 'reprise':
+        # Identifiant propre à l'exécution : un travail laissé par un banc précédent n'est pas repris
+        df, _ = extraire_reprenable(service, site_url, debut, fin, dimensions, granularite=granularite,
+                                    identifiant=f"banc-{os.getpid()}-{time.time_ns()}", taille_lot=taille_lot,
+                                    on_progress=on_progress)
+    else:
+        df = extraire_donnees(service, site_url, debut, fin, dimensions, granularite=granularite,
+                              taille_lot=taille_lot, on_progress=on_progress)
+    duree = time.perf_counter() - depart
+
+    resultat = {
+        'scenario': scenario,
+        'dimensions': dimensions,
+        'lignes_recues': lignes_recues,
+        'lignes': len(df),
+        'duree': round(duree, 3),
+        'lignes_par_seconde': round(lignes_recues / duree) if duree else None,
+        'premiere_ligne': round(premiere_ligne, 3) if premiere_ligne is not None else None,
+    }
+    if format_export:
+        depart = time.perf_counter()
+        resultat['taille_export'] = _exporter(df, format_export)
+        resultat['duree_export'] = round(time.perf_counter() - depart, 3)
+    pic = pic_memoire()
+    mesures = obtenir_telemetrie().instantane()
+    resultat['pic_memoire_mo'] = round(pic / 1024 ** 2, 1) if pic is not None else None
+    resultat['requetes'] = sum(mesures['requetes'].values())
+    resultat['nouvelles_tentatives'] = mesures['nouvelles_tentatives']
+    resultat['latence_p50'] = mesures['latence']['p50']
+    return resultat
+
+
+# Fonction pour lancer les scénarios contre un simulateur démarré pour l'occasion
+def executer_banc(scenarios=tuple(SCENARIOS), jours=30, lignes_par_jour=10000, latence=0.0, taux_429=0.0,
+                  granularite='day', quota=None, taille_lot=None):
+    """
+    Renvoie une liste de résultats, un par scénario : lignes reçues de l'API,
+    lignes après agrégation, durée, débit (lignes/s), délai avant la première
+    ligne, pic de mémoire et, pour les exports, durée et taille de l'export.
+    `quota` (requêtes par minute) remplace les quotas de l'API, pour mesurer
+    le moteur lui-même plutôt que le limiteur de débit. `taille_lot` est la
+    taille des requêtes groupées de préchargement (0 pour les désactiver,
+    None pour la valeur par défaut du moteur).
+    """
+    from .simulateur import SimulateurSearchConsole
+
+    fin = datetime.date(2024, 1, 1) + datetime.timedelta(days=jours - 1)
+    resultats = []
+    with SimulateurSearchConsole(lignes_par_jour=lignes_par_jour, latence=latence, taux_429=taux_429) as simulateur:
+        for scenario in scenarios:
+            contexte = multiprocessing.get_context('spawn')
+            with ProcessPoolExecutor(max_workers=1, mp_context=contexte) as executor:
+                resultats.append(executor.submit(
+                    _mesurer, simulateur.url, simulateur.proprietes[0], scenario,
+                    '2024-01-01', fin.isoformat(), granularite, quota, taille_lot
+                ).result())
+    return resultats
+
+
+# Fonction pour vérifier que tous les modes d'extraction renvoient les mêmes lignes
+def verifier_completude(resultats):
+    """
+    Renvoie la liste des écarts entre scénarios de mêmes dimensions (par
+    exemple une extraction avec points de reprise qui perdrait les lignes
+    au-delà de la troncature de l'API) ; vide si tout concorde.
+    """
+    attendues, ecarts = {}, []
+    for r in resultats:
+        cle = tuple(r['dimensions'])
+        if cle not in attendues:
+            attendues[cle] = r
+        elif r['lignes'] != attendues[cle]['lignes']:
+            ecarts.append(f"{r['scenario']} : {r['lignes']} lignes, {attendues[cle]['scenario']} : "
+                          f"{attendues[cle]['lignes']} lignes")
+    return ecarts
+
+
+# Fonction pour extraire les imports de premier niveau du script de l'application
+def _imports_application(chemin):
+    """
+    Renvoie (imports exécutés avant le premier affichage, tous les imports),
+    le premier affichage étant le premier appel à `st.markdown`.
+    """
+    with open(chemin, encoding='utf-8') as fichier:
+        source = fichier.read()
+    avant, tous, affiche = [], [], False
+    for noeud in ast.parse(source).body:
+        if isinstance(noeud, (ast.Import, ast.ImportFrom)):
+            instruction = ast.get_source_segment(source, noeud)
+            tous.append(instruction)
+            if not affiche:
+                avant.append(instruction)
+        elif (isinstance(noeud, ast.Expr) and isinstance(noeud.value, ast.Call)
+              and ast.get_source_segment(source, noeud.value.func) == 'st.markdown'):
+            affiche = True
+    return '\n'.join(avant), '\n'.join(tous)
+
+
+# Fonction pour mesurer le temps de démarrage de l'application, du paquet et de la CLI
+def mesurer_demarrage(repetitions=5):
+    """
+    Exécute chaque démarrage de `DEMARRAGES` (et les imports de l'application,
+    avant le premier affichage puis en totalité) dans un interpréteur neuf,
+    `repetitions` fois, et renvoie une liste de résultats avec les durées
+    médiane et minimale en secondes.
+    """
+    racine = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    demarrages = dict(DEMARRAGES)
+    chemin = os.path.join(racine, APPLICATION)
+    if os.path.exists(chemin):
+        demarrages['application_affichage'], demarrages['application'] = _imports_application(chemin)
+
+    resultats = []
+    for nom, code in demarrages.items():
+        durees = []
+        for _ in range(repetitions):
+            depart = time.perf_counter()
+            subprocess.run([sys.executable, '-c', code], cwd=racine, check=True)
+            durees.append(time.perf_counter() - depart)
+        resultats.append({
+            'scenario': nom,
+            'mediane': round(statistics.median(durees), 3),
+            'minimum': round(min(durees), 3),
+        })
+    return resultats
+
+
+# Fonction pour afficher les temps de démarrage, avec la variation par rapport à une exécution de référence
+def formater_demarrage(resultats, reference=None):
+    references = {r['scenario']: r for r in reference or []}
+    lignes = [f"{'démarrage':<22} {'médiane (s)':>12} {'min (s)':>9} {'variation':>10}"]
+    for r in resultats:
+        variation = ''
+        precedent = references.get(r['scenario'])
+        if precedent and precedent.get('mediane'):
+            variation = f"{100 * (r['mediane'] / precedent['mediane'] - 1):+.1f} %"
+        lignes.append(f"{r['scenario']:<22} {r['mediane']:>12.3f} {r['minimum']:>9.3f} {variation:>10}")
+    return '\n'.join(lignes)
+
+
+# Fonction pour afficher les résultats, avec la variation par rapport à une exécution de référence
+def formater_resultats(resultats, reference=None):
+    references = {r['scenario']: r for r in reference or []}
+    lignes = [f"{'scénario':<16} {'lignes':>9} {'durée (s)':>10} {'lignes/s':>10} {'1re ligne':>10} "
+              f"{'export (s)':>10} {'pic (Mo)':>9} {'variation':>10}"]
+    for r in resultats:
+        variation = ''
+        precedent = references.get(r['scenario'])
+        if precedent and precedent.get('lignes_par_seconde') and r['lignes_par_seconde']:
+            variation = f"{100 * (r['lignes_par_seconde'] / precedent['lignes_par_seconde'] - 1):+.1f} %"
+        lignes.append(
+            f"{r['scenario']:<16} {r['lignes_recues']:>9} {r['duree']:>10.2f} {r['lignes_par_seconde'] or 0:>10} "
+            f"{r['premiere_ligne'] if r['premiere_ligne'] is not None else '-':>10} "
+            f"{r.get('duree_export', '-'):>10} {r['pic_memoire_mo'] if r['pic_memoire_mo'] is not None else '-':>9} "
+            f"{variation:>10}"
+        )
+    return '\n'.join(lignes)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='gsc_extracteur.banc',
+                                     description="Banc d'essai de l'extraction sur un simulateur local de l'API")
+    parser.add_argument('--scenarios', nargs='+', choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument('--jours', type=int, default=30)
+    parser.add_argument('--lignes-par-jour', type=int, default=10000)
+    parser.add_argument('--latence', type=float, default=0.0, help="Latence simulée par requête HTTP (secondes)")
+    parser.add_argument('--taux-429', type=float, default=0.0, help="Proportion de requêtes refusées (429)")
+    parser.add_argument('--granularite', choices=['day', 'week', 'range', 'auto'], default='day')
+    parser.add_argument('--quota', type=int, help="Requêtes par minute autorisées (défaut : quotas de l'API)")
+    parser.add_argument('--taille-lot', type=int,
+                        help="Premières pages par requête groupée (0 : sans préchargement)")
+    parser.add_argument('--json', help="Enregistrer les résultats dans ce fichier")
+    parser.add_argument('--reference', help="Résultats d'une exécution précédente, pour comparer les débits")
+    parser.add_argument('--demarrage', action='store_true',
+                        help="Mesurer le temps de démarrage (imports) au lieu de l'extraction")
+    parser.add_argument('--repetitions', type=int, default=5, help="Démarrages mesurés par cible (avec --demarrage)")
+    args = parser.parse_args(argv)
+
+    reference = None
+    ecarts = []
+    if args.reference:
+        with open(args.reference, encoding='utf-8') as fichier:
+            reference = json.load(fichier)
+    if args.demarrage:
+        resultats = mesurer_demarrage(args.repetitions)
+        print(formater_demarrage(resultats, reference))
+    else:
+        resultats = executer_banc(args.scenarios, args.jours, args.lignes_par_jour, args.latence, args.taux_429,
+                                  args.granularite, args.quota, args.taille_lot)
+        print(formater_resultats(resultats, reference))
+        ecarts = verifier_completude(resultats)
+        for ecart in ecarts:
+            print(f"Lignes manquantes ou en trop : {ecart}", file=sys.stderr)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as fichier:
+            json.dump(resultats, fichier, indent=2)
+    return 1 if ecarts else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,136 @@
+import datetime
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+from .telemetrie import obtenir_telemetrie
+
+DOSSIER_CACHE = os.environ.get('GSC_CACHE_DIR', '.cache_gsc')
+DELAI_FINALISATION = 3  # Jours après lesquels les données GSC ne changent plus
+TTL_RECENT = 6 * 3600  # Durée de validité (secondes) des réponses sur des jours non finalisés
+TAILLE_MAX = 500 * 1024 * 1024  # Taille maximale du cache en octets
+
+_cache_partage = None
+_cache_partage_lock = threading.Lock()
+
+
+# Cache persistant des réponses de searchanalytics.query
+class CacheReponses:
+    """
+    Stocke les réponses de l'API dans une base SQLite, une entrée par requête
+    (propriété, dimensions, dates, filtres, startRow...).
+    Les réponses portant sur des jours finalisés n'expirent jamais, les autres
+    expirent après `ttl_recent` secondes. Au-delà de `taille_max` octets, les
+    entrées les moins récemment lues sont supprimées.
+    """
+
+    def __init__(self, chemin=None, taille_max=TAILLE_MAX, ttl_recent=TTL_RECENT):
+        if chemin is None:
+            os.makedirs(DOSSIER_CACHE, exist_ok=True)
+            chemin = os.path.join(DOSSIER_CACHE, 'reponses.sqlite')
+        self.taille_max = taille_max
+        self.ttl_recent = ttl_recent
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(chemin, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS reponses (
+                cle TEXT PRIMARY KEY,
+                site TEXT,
+                date_fin TEXT,
+                finalisee INTEGER,
+                creation REAL,
+                acces REAL,
+                taille INTEGER,
+                contenu BLOB
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_reponses_acces ON reponses (acces)")
+        self.conn.commit()
+        self.taille = self.conn.execute("SELECT COALESCE(SUM(taille), 0) FROM reponses").fetchone()[0]
+
+    @staticmethod
+    def cle(site_url, body):
+        contenu = json.dumps([site_url, body], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(contenu.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def est_finalisee(date_fin):
+        limite = datetime.date.today() - datetime.timedelta(days=DELAI_FINALISATION)
+        return date_fin <= limite.strftime("%Y-%m-%d")
+
+    def contient(self, site_url, body):
+        """Vrai si une réponse valide est en cache (sans la lire ni la décompresser)."""
+        with self.lock:
+            ligne = self.conn.execute(
+                "SELECT finalisee, creation FROM reponses WHERE cle = ?", (self.cle(site_url, body),)).fetchone()
+        return ligne is not None and (ligne[0] or time.time() - ligne[1] <= self.ttl_recent)
+
+    def lire(self, site_url, body):
+        """Renvoie la réponse en cache, ou None si elle est absente ou expirée."""
+        cle = self.cle(site_url, body)
+        maintenant = time.time()
+        with self.lock:
+            ligne = self.conn.execute(
+                "SELECT finalisee, creation, contenu FROM reponses WHERE cle = ?", (cle,)).fetchone()
+            if ligne is not None and (ligne[0] or maintenant - ligne[1] <= self.ttl_recent):
+                self.conn.execute("UPDATE reponses SET acces = ? WHERE cle = ?", (maintenant, cle))
+                self.conn.commit()
+            else:
+                ligne = None
+        obtenir_telemetrie().enregistrer_cache(ligne is not None)
+        if ligne is None:
+            return None
+        return json.loads(zlib.decompress(ligne[2]))
+
+    def ecrire(self, site_url, body, response):
+        cle = self.cle(site_url, body)
+        contenu = zlib.compress(json.dumps(response, ensure_ascii=False).encode('utf-8'))
+        date_fin = body['endDate']
+        maintenant = time.time()
+        with self.lock:
+            ancienne = self.conn.execute("SELECT taille FROM reponses WHERE cle = ?", (cle,)).fetchone()
+            self.conn.execute(
+                "INSERT OR REPLACE INTO reponses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (cle, site_url, date_fin, int(self.est_finalisee(date_fin)),
+                 maintenant, maintenant, len(contenu), contenu))
+            self.taille += len(contenu) - (ancienne[0] if ancienne else 0)
+            if self.taille > self.taille_max:
+                self._evincer()
+            self.conn.commit()
+
+    def _evincer(self):
+        """Supprime les entrées les moins récemment lues jusqu'à repasser sous 90 % de la taille maximale."""
+        cible = self.taille_max * 0.9
+        lignes = self.conn.execute("SELECT cle, taille FROM reponses ORDER BY acces").fetchall()
+        a_supprimer = []
+        for cle, taille in lignes:
+            if self.taille <= cible:
+                break
+            a_supprimer.append((cle,))
+            self.taille -= taille
+        self.conn.executemany("DELETE FROM reponses WHERE cle = ?", a_supprimer)
+
+    def vider(self):
+        with self.lock:
+            self.conn.execute("DELETE FROM reponses")
+            self.conn.commit()
+            self.taille = 0
+
+    def statistiques(self):
+        with self.lock:
+            entrees = self.conn.execute("SELECT COUNT(*) FROM reponses").fetchone()[0]
+        return {'entrees': entrees, 'taille': self.taille, 'taille_max': self.taille_max}
+
+
+# Fonction pour obtenir le cache partagé par toutes les extractions du processus
+def obtenir_cache():
+    global _cache_partage
+    with _cache_partage_lock:
+        if _cache_partage is None:
+            _cache_partage = CacheReponses()
+        return _cache_partage
@@ -0,0 +1,174 @@
+"""
+Ligne de commande : extraction par lots et synchronisation sans Streamlit.
+
+    python -m gsc_extracteur proprietes
+    python -m gsc_extracteur extraire --proprietes https://www.exemple.fr/ --dimensions page page,query
+    python -m gsc_extracteur synchroniser --fichier-proprietes proprietes.txt --dimensions page,query
+    python -m gsc_extracteur extraire --toutes --compte-service cle1.json cle2.json cle3.json
+    python -m gsc_extracteur extraire --toutes --format parquet --flux --partitionner-par-date
+"""
+
+import argparse
+import datetime
+import logging
+import sys
+
+from .auth import charger_identifiants, construire_service, lister_proprietes
+from .cache import obtenir_cache
+from .identifiants import PoolIdentifiants, construire_pool
+from .lot import FORMATS_LOT, MAX_PROPRIETES, extraire_lot, synchroniser_lot
+from .progression import ProgressionJournal, logger
+from .synchro import JOURS_INITIAUX, Entrepot
+from .telemetrie import obtenir_telemetrie
+
+
+# Fonction pour charger les identifiants demandés : un service, ou un pool s'il y en a plusieurs
+def _service(args):
+    interactif = sys.stdin.isatty()
+    if args.compte_service:
+        liste_identifiants = [charger_identifiants(compte_service=chemin) for chemin in args.compte_service]
+    else:
+        liste_identifiants = [charger_identifiants(chemin, args.credentials, interactif=interactif)
+                              for chemin in args.token]
+    if len(liste_identifiants) == 1:
+        return construire_service(liste_identifiants[0])
+    return construire_pool(liste_identifiants)
+
+
+# Fonction pour lister les propriétés accessibles (avec au moins un identifiant du pool)
+def _lister(service):
+    if isinstance(service, PoolIdentifiants):
+        return service.proprietes()
+    return lister_proprietes(service)
+
+
+# Fonction pour lire la liste des propriétés demandées
+def _proprietes(args, service):
+    """
+    Avec un pool, les propriétés accessibles avec chaque identifiant sont
+    retenues (voir `PoolIdentifiants.proprietes`) : une propriété demandée
+    qu'aucun identifiant ne peut lire est refusée avant toute extraction.
+    """
+    if args.toutes:
+        return _lister(service)
+    proprietes = list(args.proprietes or [])
+    if args.fichier_proprietes:
+        with open(args.fichier_proprietes, encoding='utf-8') as fichier:
+            proprietes += [ligne.strip() for ligne in fichier if ligne.strip() and not ligne.startswith('#')]
+    if not proprietes:
+        raise SystemExit("Aucune propriété : utilisez --proprietes, --fichier-proprietes ou --toutes.")
+    if isinstance(service, PoolIdentifiants):
+        accessibles = set(service.proprietes())
+        inaccessibles = [site_url for site_url in proprietes if site_url not in accessibles]
+        if inaccessibles:
+            raise SystemExit("Aucun identifiant du pool n'a accès à : " + ', '.join(inaccessibles))
+    return proprietes
+
+
+# Fonction pour convertir "page,query" en ['page', 'query']
+def _jeu_dimensions(valeur):
+    return [dimension.strip() for dimension in valeur.split(',') if dimension.strip()]
+
+
+def _date(valeur):
+    return datetime.date.fromisoformat(valeur)
+
+
+def _ajouter_options_communes(parser):
+    groupe = parser.add_argument_group('authentification')
+    groupe.add_argument('--token', nargs='+', default=['token.pickle'],
+                        help="Jeton(s) OAuth créé(s) par l'application ; plusieurs jetons forment un pool")
+    groupe.add_argument('--credentials', default='credentials.json', help="Identifiants OAuth du client")
+    groupe.add_argument('--compte-service', nargs='+',
+                        help="Fichier(s) de clé de comptes de service ; plusieurs comptes forment un pool")
+
+    groupe = parser.add_argument_group('propriétés')
+    groupe.add_argument('--proprietes', nargs='+', metavar='URL')
+    groupe.add_argument('--fichier-proprietes', help="Fichier texte, une propriété par ligne")
+    groupe.add_argument('--toutes', action='store_true', help="Toutes les propriétés accessibles")
+
+    parser.add_argument('--dimensions', nargs='+', type=_jeu_dimensions, default=[['page'], ['query'], ['page', 'query']],
+                        help="Jeux de dimensions, ex. : page query page,query")
+    parser.add_argument('--workers-proprietes', type=int, default=MAX_PROPRIETES,
+                        help="Nombre de propriétés traitées en parallèle (par identifiant avec un pool)")
+    parser.add_argument('--sans-cache', action='store_true', help="Ne pas utiliser le cache local des réponses")
+    parser.add_argument('--telemetrie', metavar='FICHIER',
+                        help="Écrire les mesures de l'exécution (JSON si .json, sinon format OpenMetrics)")
+    parser.add_argument('-v', '--verbose', action='store_true')
+
+
+# Construction de l'analyseur des arguments
+def construire_parser():
+    parser = argparse.ArgumentParser(prog='gsc_extracteur', description="Extracteur de données Google Search Console")
+    sous_commandes = parser.add_subparsers(dest='commande', required=True)
+
+    proprietes = sous_commandes.add_parser('proprietes', help="Lister les propriétés accessibles")
+    proprietes.add_argument('--token', nargs='+', default=['token.pickle'])
+    proprietes.add_argument('--credentials', default='credentials.json')
+    proprietes.add_argument('--compte-service', nargs='+')
+    proprietes.add_argument('-v', '--verbose', action='store_true')
+
+    extraire = sous_commandes.add_parser('extraire', help="Extraire une période pour plusieurs propriétés")
+    _ajouter_options_communes(extraire)
+    hier = datetime.date.today() - datetime.timedelta(days=1)
+    extraire.add_argument('--debut', type=_date, default=hier - datetime.timedelta(days=29))
+    extraire.add_argument('--fin', type=_date, default=hier)
+    extraire.add_argument('--dossier', default='exports')
+    extraire.add_argument('--format', choices=list(FORMATS_LOT), default='csv')
+    extraire.add_argument('--granularite', choices=['day', 'week', 'range', 'auto'], default='day')
+    extraire.add_argument('--flux', action='store_true',
+                          help="Écrire les pages au fil de l'eau (une ligne par jour et par clé)")
+    extraire.add_argument('--reprise', action='store_true',
+                          help="Sauvegarder chaque page pour reprendre une extraction interrompue en la relançant")
+    extraire.add_argument('--partitionner-par-date', action='store_true',
+                          help="Avec --format parquet : un dossier par fichier, avec un sous-dossier date=AAAA-MM-JJ "
+                               "par jour (nécessite --flux ou la dimension date)")
+
+    synchro = sous_commandes.add_parser('synchroniser', help="Synchronisation incrémentale dans l'entrepôt local")
+    _ajouter_options_communes(synchro)
+    synchro.add_argument('--entrepot', help="Chemin de la base SQLite (défaut : .cache_gsc/entrepot.sqlite)")
+    synchro.add_argument('--jours-initiaux', type=int, default=JOURS_INITIAUX)
+
+    return parser
+
+
+# Point d'entrée de la ligne de commande
+def main(argv=None):
+    parser = construire_parser()
+    args = parser.parse_args(argv)
+    if getattr(args, 'partitionner_par_date', False):
+        if args.format != 'parquet':
+            parser.error("--partitionner-par-date nécessite --format parquet")
+        if not args.flux and any('date' not in dimensions for dimensions in args.dimensions):
+            parser.error("--partitionner-par-date nécessite --flux ou la dimension date dans chaque jeu")
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO,
+                        format='%(asctime)s %(levelname)s %(message)s')
+
+    service = _service(args)
+
+    if args.commande == 'proprietes':
+        for site_url in _lister(service):
+            print(site_url)
+        return 0
+
+    proprietes = _proprietes(args, service)
+    cache = None if args.sans_cache else obtenir_cache()
+
+    if args.commande == 'extraire':
+        resumes = extraire_lot(service, proprietes, args.debut, args.fin, args.dimensions, args.dossier,
+                               max_proprietes=args.workers_proprietes, progression=ProgressionJournal(),
+                               format_export=args.format, granularite=args.granularite, cache=cache, flux=args.flux,
+                               reprise=args.reprise, partitionner_par_date=args.partitionner_par_date)
+    else:
+        resumes = synchroniser_lot(service, proprietes, args.dimensions, Entrepot(args.entrepot),
+                                   max_proprietes=args.workers_proprietes, progression=ProgressionJournal(),
+                                   jours_initiaux=args.jours_initiaux, cache=cache)
+
+    if isinstance(service, PoolIdentifiants):
+        for etat in service.etat():
+            logger.info("%s : %d tranches, %d requêtes", etat['identifiant'], etat['tranches'], etat['requetes'])
+    if args.telemetrie:
+        obtenir_telemetrie().ecrire(args.telemetrie)
+
+    # Code de retour non nul si une partie des données n'a pas pu être extraite
+    return 1 if any(resume['erreurs'] for resume in resumes) else 0
@@ -0,0 +1,58 @@
+from array import array
+
+import numpy as np
+import pandas as pd
+
+
+# Tampon d'accumulation des lignes de l'API en colonnes typées
+class TamponColonnes:
+    """
+    Accumule les lignes renvoyées par l'API page par page, sans créer
+    d'objet Python par ligne : une liste de chaînes internées par dimension
+    et un `array('d')` par métrique. La position est stockée pondérée par
+    les impressions pour pouvoir être réagrégée.
+
+    `chaines` est un dictionnaire d'internement qui peut être partagé entre
+    plusieurs tampons (une même URL n'est alors stockée qu'une fois).
+    """
+
+    def __init__(self, nb_cles, chaines=None):
+        self.cles = [[] for _ in range(nb_cles)]
+        self.clicks = array('d')
+        self.impressions = array('d')
+        self.position_ponderee = array('d')
+        self.chaines = {} if chaines is None else chaines
+
+    def __len__(self):
+        return len(self.clicks)
+
+    def ajouter_page(self, rows):
+        """Ajoute les lignes d'une réponse de l'API."""
+        interner = self.chaines.setdefault
+        for i, colonne in enumerate(self.cles):
+            colonne.extend([interner(row['keys'][i], row['keys'][i]) for row in rows])
+        self.clicks.extend([row['clicks'] for row in rows])
+        self.impressions.extend([row['impressions'] for row in rows])
+        self.position_ponderee.extend([row['position'] * row['impressions'] for row in rows])
+
+    def etendre(self, autre):
+        """Ajoute le contenu d'un autre tampon (copie mémoire des colonnes numériques)."""
+        for colonne, autre_colonne in zip(self.cles, autre.cles):
+            colonne.extend(autre_colonne)
+        self.clicks.extend(autre.clicks)
+        self.impressions.extend(autre.impressions)
+        self.position_ponderee.extend(autre.position_ponderee)
+
+    def vers_dataframe(self, colonnes_cles):
+        """
+        Construit un DataFrame en une seule fois : colonnes de clés catégorielles,
+        métriques lues directement depuis les tampons sans copie intermédiaire.
+        """
+        donnees = {
+            nom: pd.Categorical(colonne)
+            for nom, colonne in zip(colonnes_cles, self.cles)
+        }
+        donnees['clicks'] = np.frombuffer(self.clicks, dtype=np.float64)
+        donnees['impressions'] = np.frombuffer(self.impressions, dtype=np.float64)
+        donnees['_position_ponderee'] = np.frombuffer(self.position_ponderee, dtype=np.float64)
+        return pd.DataFrame(donnees, copy=False)
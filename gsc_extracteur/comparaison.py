@@ -0,0 +1,116 @@
+import datetime
+import queue
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from .moteur import METRIQUES, NOMS_COLONNES, _format_date, extraire_donnees
+
+# Périodes de référence : période de même durée juste avant, ou mêmes dates un an plus tôt
+PERIODES_REFERENCE = ('precedente', 'annee_precedente')
+
+
+# Fonction pour reculer une date d'un an (le 29 février devient le 28)
+def _annee_precedente(date):
+    try:
+        return date.replace(year=date.year - 1)
+    except ValueError:
+        return date.replace(year=date.year - 1, day=28)
+
+
+# Fonction pour calculer la période de référence d'une période
+def periode_reference(start_date, end_date, reference='precedente'):
+    """
+    Renvoie (debut, fin) au format YYYY-MM-DD : la période de même durée qui
+    précède [start_date, end_date] ('precedente', ex. les 28 jours d'avant)
+    ou les mêmes dates l'année précédente ('annee_precedente').
+    """
+    if isinstance(start_date, str):
+        start_date = datetime.date.fromisoformat(start_date)
+    if isinstance(end_date, str):
+        end_date = datetime.date.fromisoformat(end_date)
+
+    if reference == 'precedente':
+        duree = end_date - start_date + datetime.timedelta(days=1)
+        return _format_date(start_date - duree), _format_date(end_date - duree)
+    if reference == 'annee_precedente':
+        return _format_date(_annee_precedente(start_date)), _format_date(_annee_precedente(end_date))
+    raise ValueError(f"Période de référence inconnue : {reference}")
+
+
+# Fonction pour comparer deux extractions des mêmes dimensions
+def comparer_extractions(df_a, df_b, colonnes_cles):
+    """
+    Jointure externe de deux résultats du moteur sur `colonnes_cles` :
+    métriques de la période A (référence) et de la période B, et écarts
+    B - A (un écart de position négatif est une amélioration). Une clé
+    absente d'une période y compte zéro clic et zéro impression, sans
+    position. Les lignes sont triées par écart de clics absolu décroissant.
+    """
+    df = pd.merge(df_a, df_b, on=colonnes_cles, how='outer', suffixes=('_a', '_b'), sort=False)
+    for suffixe in ('_a', '_b'):
+        df['clicks' + suffixe] = df['clicks' + suffixe].fillna(0).astype('int64')
+        df['impressions' + suffixe] = df['impressions' + suffixe].fillna(0).astype('int64')
+        df['ctr' + suffixe] = df['ctr' + suffixe].fillna(0.0).astype('float64')
+        df['position' + suffixe] = df['position' + suffixe].astype('float64')
+    for metrique in METRIQUES:
+        df['ecart_' + metrique] = df[metrique + '_b'] - df[metrique + '_a']
+
+    colonnes = colonnes_cles + [
+        colonne
+        for metrique in METRIQUES
+        for colonne in (metrique + '_a', metrique + '_b', 'ecart_' + metrique)
+    ]
+    df = df.sort_values(['ecart_clicks', 'ecart_impressions'], key=lambda ecarts: ecarts.abs(), ascending=False,
+                        ignore_index=True)
+    return df[colonnes]
+
+
+# Comparaison d'une période avec sa période de référence, les deux étant extraites en même temps
+def extraire_comparaison(service, site_url, start_date, end_date, dimensions, reference='precedente',
+                         on_progress=None, on_error=None, **options):
+    """
+    Extrait [start_date, end_date] (période B) et sa période de référence
+    (période A, voir `periode_reference`) en parallèle avec
+    `extraire_donnees`, puis les compare avec `comparer_extractions`.
+    Les deux extractions partagent les quotas et les connexions : la durée
+    totale est proche de celle d'une seule extraction tant que les quotas
+    ne sont pas atteints. `options` est transmis à `extraire_donnees`.
+
+    Les callbacks sont appelés depuis le thread appelant, avec l'avancement
+    cumulé des deux extractions.
+    """
+    if 'date' in dimensions:
+        raise ValueError("La dimension date ne peut pas servir de clé pour comparer deux périodes.")
+
+    periodes = [periode_reference(start_date, end_date, reference), (_format_date(start_date), _format_date(end_date))]
+    evenements = queue.Queue()
+    avancement = [(0, 0, 0)] * len(periodes)
+
+    # Les événements des deux extractions sont relayés vers le thread appelant
+    def extraire(i, debut, fin):
+        try:
+            return extraire_donnees(
+                service, site_url, debut, fin, dimensions,
+                on_progress=lambda *etat: evenements.put(('progression', i, etat)),
+                on_error=(lambda e: evenements.put(('erreur', i, e))) if on_error else None,
+                **options
+            )
+        finally:
+            evenements.put(('fin', i, None))
+
+    with ThreadPoolExecutor(max_workers=len(periodes)) as executor:
+        futures = [executor.submit(extraire, i, debut, fin) for i, (debut, fin) in enumerate(periodes)]
+        en_cours = len(futures)
+        while en_cours:
+            evenement, i, valeur = evenements.get()
+            if evenement == 'fin':
+                en_cours -= 1
+            elif evenement == 'erreur':
+                on_error(valeur)
+            elif on_progress:
+                avancement[i] = valeur
+                on_progress(*(sum(etats) for etats in zip(*avancement)))
+        df_a, df_b = [future.result() for future in futures]
+
+    return comparer_extractions(df_a, df_b, [NOMS_COLONNES.get(d, d) for d in dimensions])
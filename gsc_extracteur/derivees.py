@@ -0,0 +1,53 @@
+from .moteur import _agreger, extraire_donnees
+
+
+# Fonction pour calculer les vues pages et mots-clés à partir des données pages et mots-clés
+def deriver_vues(df_pages_requetes):
+    """
+    Agrège localement le résultat d'une extraction ['page', 'query'] en une
+    vue par page et une vue par mot-clé (clics et impressions sommés, CTR
+    recalculé, position pondérée par les impressions).
+
+    Les totaux obtenus sont inférieurs à ceux que renverrait l'API pour
+    ['page'] seul, car les requêtes anonymisées ne figurent pas dans les
+    données pages et mots-clés (voir `comparer_totaux`).
+    Renvoie (df_pages, df_mots_cles).
+    """
+    df = df_pages_requetes[['page', 'mot-clé', 'clicks', 'impressions']].copy()
+    df['_position_ponderee'] = df_pages_requetes['position'] * df_pages_requetes['impressions']
+    df_pages = _agreger(df.drop(columns=['mot-clé']), ['page'])
+    df_mots_cles = _agreger(df.drop(columns=['page']), ['mot-clé'])
+    return df_pages, df_mots_cles
+
+
+# Fonction pour récupérer les totaux du site sur la période (une seule requête)
+def totaux_site(service, site_url, start_date, end_date, cache=None):
+    """
+    Renvoie les clics et impressions totaux, requêtes anonymisées comprises,
+    agrégés par page comme les données pages et mots-clés : agrégées par
+    propriété (défaut de l'API pour ['date']), les impressions ne compteraient
+    qu'une fois chaque page de résultats, quel que soit le nombre d'URL du site
+    affichées, et l'écart mêlerait cette différence à l'anonymisation.
+    """
+    df = extraire_donnees(service, site_url, start_date, end_date, ['date'], granularite='range', cache=cache,
+                          type_agregation='byPage')
+    return {'clicks': int(df['clicks'].sum()), 'impressions': int(df['impressions'].sum())}
+
+
+# Fonction pour mesurer l'écart entre les vues dérivées et les totaux de l'API
+def comparer_totaux(df_derive, totaux):
+    """
+    Renvoie, pour les clics et les impressions, le total de l'API (agrégé
+    par page, voir `totaux_site`), le total des données dérivées et la part
+    manquante (en %) due à l'anonymisation.
+    """
+    ecarts = {}
+    for metrique in ('clicks', 'impressions'):
+        total_api = totaux[metrique]
+        total_derive = int(df_derive[metrique].sum())
+        ecarts[metrique] = {
+            'api': total_api,
+            'derive': total_derive,
+            'ecart_pct': 100 * (total_api - total_derive) / total_api if total_api else 0.0,
+        }
+    return ecarts
@@ -0,0 +1,296 @@
+import gzip
+import os
+import threading
+import time
+
+from .cache import DOSSIER_CACHE
+from .telemetrie import obtenir_telemetrie
+
+DOSSIER_EXPORTS = os.path.join(DOSSIER_CACHE, 'exports')
+
+LIGNES_MAX_EXCEL = 1048576  # Lignes par feuille Excel, en-tête compris
+TAILLE_BLOC_EXCEL = 50000  # Lignes converties en objets Python à la fois lors de l'écriture Excel
+
+# Extensions de fichier reconnues pour l'export en flux
+FORMATS_FLUX = {
+    'csv': '.csv',
+    'csv.gz': '.csv.gz',
+    'parquet': '.parquet',
+}
+
+
+# Fonction pour importer pyarrow avec un message explicite s'il est absent
+def _importer_pyarrow():
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise ImportError("Les exports Parquet et Arrow nécessitent le paquet pyarrow (pip install pyarrow).")
+    return pa
+
+
+# Écrivain CSV (éventuellement compressé en gzip) alimenté page par page
+class EcrivainCSV:
+    """Écrit chaque DataFrame reçu à la suite du fichier ; l'en-tête n'est écrit qu'une fois."""
+
+    def __init__(self, chemin):
+        self.chemin = chemin
+        self.lock = threading.Lock()
+        if chemin.endswith('.gz'):
+            self.fichier = gzip.open(chemin, 'wt', encoding='utf-8', newline='')
+        else:
+            self.fichier = open(chemin, 'w', encoding='utf-8', newline='')
+        self.entete = True
+        self.lignes = 0
+        self.duree = 0.0
+
+    def ecrire(self, df):
+        with self.lock:
+            debut = time.perf_counter()
+            df.to_csv(self.fichier, header=self.entete, index=False)
+            self.duree += time.perf_counter() - debut
+            self.entete = False
+            self.lignes += len(df)
+
+    def fermer(self):
+        self.fichier.close()
+        _enregistrer_export(self.chemin, self.duree)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fermer()
+
+
+# Écrivain Parquet alimenté page par page (un groupe de lignes par page)
+class EcrivainParquet:
+    """
+    Les colonnes de clés sont converties en chaînes pour que toutes les pages
+    partagent le même schéma ; Parquet les encode ensuite par dictionnaire.
+    Avec `partitionner_par_date`, `chemin` est un dossier : chaque écriture
+    ajoute un fichier dans le sous-dossier `date=AAAA-MM-JJ` de chacun de ses
+    jours (comme `ecrire_parquet`).
+    """
+
+    def __init__(self, chemin, compression='zstd', partitionner_par_date=False):
+        pa = _importer_pyarrow()
+        import pyarrow.parquet as pq
+
+        self.pa = pa
+        self.pq = pq
+        self.chemin = chemin
+        self.compression = compression
+        self.partitionner_par_date = partitionner_par_date
+        self.lock = threading.Lock()
+        self.writer = None
+        self.parties = 0
+        self.lignes = 0
+        self.duree = 0.0
+
+    def ecrire(self, df):
+        debut = time.perf_counter()
+        colonnes = {
+            nom: self.pa.array(df[nom].astype(object), type=self.pa.string())
+            if df[nom].dtype.name in ('category', 'object', 'str', 'string')
+            else self.pa.array(df[nom].to_numpy())
+            for nom in df.columns
+        }
+        table = self.pa.table(colonnes)
+        with self.lock:
+            if self.partitionner_par_date:
+                self.pq.write_to_dataset(table, root_path=self.chemin, partition_cols=['date'],
+                                         basename_template=f"partie-{self.parties}-{{i}}.parquet",
+                                         existing_data_behavior='overwrite_or_ignore', compression=self.compression)
+                self.parties += 1
+            else:
+                if self.writer is None:
+                    self.writer = self.pq.ParquetWriter(self.chemin, table.schema, compression=self.compression)
+                self.writer.write_table(table)
+            self.lignes += len(df)
+            self.duree += time.perf_counter() - debut
+
+    def fermer(self):
+        if self.writer is not None:
+            self.writer.close()
+        if self.writer is not None or self.parties:
+            _enregistrer_export(self.chemin, self.duree)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fermer()
+
+
+# Fonction pour enregistrer la taille et la durée d'un export dans la télémétrie
+def _enregistrer_export(chemin, duree):
+    format_export = next((f for f in ('csv.gz', 'csv', 'parquet', 'arrow', 'xlsx') if chemin.endswith('.' + f)), 'autre')
+    if os.path.isdir(chemin):
+        octets = sum(os.path.getsize(os.path.join(dossier, nom))
+                     for dossier, _, noms in os.walk(chemin) for nom in noms)
+    else:
+        octets = os.path.getsize(chemin) if os.path.isfile(chemin) else 0
+    obtenir_telemetrie().enregistrer_export(format_export, octets, duree)
+
+
+# Fonction pour ouvrir l'écrivain correspondant à l'extension du fichier
+def ouvrir_ecrivain(chemin, partitionner_par_date=False):
+    if chemin.endswith('.parquet'):
+        return EcrivainParquet(chemin, partitionner_par_date=partitionner_par_date)
+    if partitionner_par_date:
+        raise ValueError("Le partitionnement par date n'est disponible qu'au format Parquet.")
+    if chemin.endswith('.csv') or chemin.endswith('.csv.gz'):
+        return EcrivainCSV(chemin)
+    raise ValueError(f"Format d'export non pris en charge : {chemin}")
+
+
+# Fonction pour construire le chemin d'un fichier d'export
+def chemin_export(nom, format_flux, dossier=DOSSIER_EXPORTS):
+    os.makedirs(dossier, exist_ok=True)
+    return os.path.join(dossier, nom + FORMATS_FLUX[format_flux])
+
+
+# Fonction pour convertir un DataFrame en table Arrow aux clés encodées par dictionnaire
+def vers_table_arrow(df):
+    """
+    Les colonnes de texte (pages, mots-clés, dates...) sont encodées par
+    dictionnaire : chaque valeur distincte n'est stockée qu'une fois.
+    """
+    pa = _importer_pyarrow()
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    for i, champ in enumerate(table.schema):
+        if pa.types.is_string(champ.type) or pa.types.is_large_string(champ.type):
+            table = table.set_column(i, champ.name, table.column(i).dictionary_encode())
+    return table
+
+
+# Fonction pour écrire un DataFrame au format Parquet
+def ecrire_parquet(df, chemin, compression='zstd', partitionner_par_date=False):
+    """
+    Écrit `df` dans un fichier Parquet compressé (zstd ou snappy).
+    Avec `partitionner_par_date`, `chemin` est un dossier contenant un
+    sous-dossier `date=AAAA-MM-JJ` par jour (le DataFrame doit avoir une colonne `date`).
+    """
+    _importer_pyarrow()
+    import pyarrow.parquet as pq
+
+    table = vers_table_arrow(df)
+    if partitionner_par_date:
+        pq.write_to_dataset(table, root_path=chemin, partition_cols=['date'], compression=compression)
+    else:
+        pq.write_table(table, chemin, compression=compression)
+
+
+# Fonction pour écrire un DataFrame au format Arrow IPC (Feather v2)
+def ecrire_arrow(df, chemin, compression='zstd'):
+    _importer_pyarrow()
+    import pyarrow.feather as feather
+
+    feather.write_feather(vers_table_arrow(df), chemin, compression=compression)
+
+
+# Fonction pour sérialiser un DataFrame en mémoire (téléchargement depuis l'interface)
+def exporter_octets(df, format_export, compression='zstd'):
+    """Renvoie le contenu du fichier Parquet ou Arrow (`format_export` vaut 'parquet' ou 'arrow')."""
+    pa = _importer_pyarrow()
+    debut = time.perf_counter()
+    tampon = pa.BufferOutputStream()
+    if format_export == 'parquet':
+        ecrire_parquet(df, tampon, compression=compression)
+    elif format_export == 'arrow':
+        ecrire_arrow(df, tampon, compression=compression)
+    else:
+        raise ValueError(f"Format d'export non pris en charge : {format_export}")
+    octets = tampon.getvalue().to_pybytes()
+    obtenir_telemetrie().enregistrer_export(format_export, len(octets), time.perf_counter() - debut)
+    return octets
+
+
+# Fonction pour nommer la n-ième feuille d'un DataFrame réparti sur plusieurs feuilles
+def _nom_feuille(nom, numero):
+    suffixe = f" ({numero + 1})" if numero else ""
+    # Excel limite les noms de feuilles à 31 caractères
+    return nom[:31 - len(suffixe)] + suffixe
+
+
+# Fonction pour écrire un DataFrame dans une ou plusieurs feuilles d'un classeur
+def _ecrire_feuilles(classeur, format_entete, nom, df):
+    import pandas as pd
+
+    lignes_par_feuille = LIGNES_MAX_EXCEL - 1
+    nb_feuilles = max(1, -(-len(df) // lignes_par_feuille))
+    numeriques = [pd.api.types.is_numeric_dtype(df[colonne]) for colonne in df.columns]
+
+    for numero in range(nb_feuilles):
+        feuille = classeur.add_worksheet(_nom_feuille(nom, numero))
+        feuille.write_row(0, 0, [str(colonne) for colonne in df.columns], format_entete)
+
+        def ecrire_texte(ligne, colonne, valeur):
+            if isinstance(valeur, str):
+                feuille.write_string(ligne, colonne, valeur)
+            else:
+                feuille.write(ligne, colonne, valeur)
+
+        ecritures = [feuille.write_number if numerique else ecrire_texte for numerique in numeriques]
+        premiere = numero * lignes_par_feuille
+        derniere = min(len(df), premiere + lignes_par_feuille)
+
+        # Conversion par blocs : seul un bloc de lignes existe en objets Python à la fois
+        for debut_bloc in range(premiere, derniere, TAILLE_BLOC_EXCEL):
+            fin_bloc = min(derniere, debut_bloc + TAILLE_BLOC_EXCEL)
+            colonnes = [df.iloc[debut_bloc:fin_bloc, i].tolist() for i in range(df.shape[1])]
+            for ligne, valeurs in enumerate(zip(*colonnes), start=debut_bloc - premiere + 1):
+                for colonne, (ecrire, valeur) in enumerate(zip(ecritures, valeurs)):
+                    ecrire(ligne, colonne, valeur)
+
+
+# Fonction pour écrire un classeur Excel, une ou plusieurs feuilles par DataFrame
+def ecrire_excel(feuilles, chemin):
+    """
+    `feuilles` est une liste de couples (nom de feuille, DataFrame). Les
+    cellules sont écrites directement avec xlsxwriter en mode `constant_memory`
+    (chaque ligne est envoyée sur disque dès que la suivante commence), sans
+    passer par `DataFrame.to_excel`. Un DataFrame de plus de 1 048 575 lignes
+    est réparti sur des feuilles numérotées : « Pages », « Pages (2) »...
+    Les URL sont écrites comme du texte (pas de liens hypertexte).
+    """
+    import xlsxwriter
+
+    debut = time.perf_counter()
+    classeur = xlsxwriter.Workbook(chemin, {
+        'constant_memory': True,
+        'strings_to_urls': False,
+        'strings_to_numbers': False,
+        'strings_to_formulas': False,
+        'nan_inf_to_errors': True,
+    })
+    try:
+        format_entete = classeur.add_format({'bold': True})
+        for nom, df in feuilles:
+            _ecrire_feuilles(classeur, format_entete, nom, df)
+    finally:
+        classeur.close()
+    _enregistrer_export(chemin, time.perf_counter() - debut)
+
+
+# Fonction pour écrire un DataFrame dans le format déduit de l'extension du fichier
+def ecrire_dataframe(df, chemin, partitionner_par_date=False):
+    """
+    Formats reconnus : .csv, .csv.gz, .parquet, .arrow et .xlsx.
+    `partitionner_par_date` (Parquet uniquement) : voir `ecrire_parquet`.
+    """
+    debut = time.perf_counter()
+    if partitionner_par_date and not chemin.endswith('.parquet'):
+        raise ValueError("Le partitionnement par date n'est disponible qu'au format Parquet.")
+    if chemin.endswith('.csv') or chemin.endswith('.csv.gz'):
+        df.to_csv(chemin, index=False)
+    elif chemin.endswith('.parquet'):
+        ecrire_parquet(df, chemin, partitionner_par_date=partitionner_par_date)
+    elif chemin.endswith('.arrow'):
+        ecrire_arrow(df, chemin)
+    elif chemin.endswith('.xlsx'):
+        # ecrire_excel enregistre lui-même l'export dans la télémétrie
+        return ecrire_excel([('Données', df)], chemin)
+    else:
+        raise ValueError(f"Format d'export non pris en charge : {chemin}")
+    _enregistrer_export(chemin, time.perf_counter() - debut)
@@ -0,0 +1,122 @@
+import threading
+from collections import OrderedDict
+
+from .export import _importer_pyarrow, vers_table_arrow
+
+TAILLE_PAGE = 100  # Lignes matérialisées et envoyées à l'interface par page de la grille
+ORDRES_CONSERVES = 4  # Nombre de combinaisons tri/filtre dont l'ordre des lignes est gardé en mémoire
+
+
+# Résultat consulté page par page, trié et filtré côté serveur
+class JeuPagine:
+    """
+    Seules les lignes de la page demandée sont converties en DataFrame et
+    envoyées à l'interface ; le tri et le filtre sont calculés sur les
+    colonnes Arrow (pyarrow.compute). La source est un DataFrame (colonnes
+    en mémoire) ou le chemin d'un fichier Arrow IPC non compressé, projeté
+    en mémoire (memory map) : le système ne charge que les parties du
+    fichier réellement lues. L'ordre des lignes de chaque combinaison
+    tri/filtre est calculé une fois puis réutilisé d'une page à l'autre.
+    """
+
+    def __init__(self, source):
+        pa = _importer_pyarrow()
+        import pyarrow.compute as pc
+
+        self.pa = pa
+        self.pc = pc
+        if isinstance(source, str):
+            self.table = pa.ipc.open_file(pa.memory_map(source, 'r')).read_all()
+        else:
+            self.table = vers_table_arrow(source)
+        self.lock = threading.Lock()
+        self.ordres = OrderedDict()
+
+    def __len__(self):
+        return self.table.num_rows
+
+    @property
+    def colonnes(self):
+        return self.table.column_names
+
+    @property
+    def colonnes_texte(self):
+        """Colonnes sur lesquelles un filtre textuel est possible (dimensions)."""
+        pa = self.pa
+        return [
+            champ.name for champ in self.table.schema
+            if pa.types.is_string(champ.type) or pa.types.is_large_string(champ.type)
+            or (pa.types.is_dictionary(champ.type)
+                and (pa.types.is_string(champ.type.value_type) or pa.types.is_large_string(champ.type.value_type)))
+        ]
+
+    # Fonction pour filtrer une colonne de texte (sans tenir compte de la casse)
+    def _masque(self, colonne, texte):
+        pa, pc = self.pa, self.pc
+        morceaux = []
+        for morceau in self.table.column(colonne).chunks:
+            if pa.types.is_dictionary(morceau.type):
+                # Le filtre n'est évalué qu'une fois par valeur distincte
+                correspond = pc.match_substring(morceau.dictionary, texte, ignore_case=True)
+                morceaux.append(pc.take(correspond, morceau.indices))
+            else:
+                morceaux.append(pc.match_substring(morceau, texte, ignore_case=True))
+        return pa.chunked_array(morceaux, type=pa.bool_())
+
+    # Fonction pour obtenir des valeurs triables (rang de chaque valeur pour une colonne encodée par dictionnaire)
+    def _valeurs_tri(self, valeurs):
+        pa, pc = self.pa, self.pc
+        if not pa.types.is_dictionary(valeurs.type):
+            return valeurs
+        valeurs = valeurs.combine_chunks() if isinstance(valeurs, pa.ChunkedArray) else valeurs
+        rangs = pc.rank(valeurs.dictionary, sort_keys='ascending', tiebreaker='dense')
+        return pc.take(rangs, valeurs.indices)
+
+    def _ordre(self, tri, croissant, colonne_filtre, texte):
+        """Indices des lignes retenues, dans l'ordre d'affichage (None : toutes, dans l'ordre d'origine)."""
+        cle = (tri, croissant, colonne_filtre, texte)
+        with self.lock:
+            if cle in self.ordres:
+                self.ordres.move_to_end(cle)
+                return self.ordres[cle]
+
+        pc = self.pc
+        indices = None
+        if colonne_filtre and texte:
+            indices = pc.indices_nonzero(self._masque(colonne_filtre, texte))
+        if tri:
+            valeurs = self._valeurs_tri(self.table.column(tri))
+            if indices is not None:
+                valeurs = pc.take(valeurs, indices)
+            ordre = pc.array_sort_indices(valeurs, order='ascending' if croissant else 'descending')
+            indices = ordre if indices is None else pc.take(indices, ordre)
+
+        with self.lock:
+            self.ordres[cle] = indices
+            while len(self.ordres) > ORDRES_CONSERVES:
+                self.ordres.popitem(last=False)
+        return indices
+
+    def compter(self, colonne_filtre=None, texte=None):
+        """Nombre de lignes retenues par le filtre."""
+        indices = self._ordre(None, True, colonne_filtre, texte)
+        return len(self) if indices is None else len(indices)
+
+    def page(self, numero, taille=TAILLE_PAGE, tri=None, croissant=False, colonne_filtre=None, texte=None):
+        """
+        Renvoie la page `numero` (à partir de 0) sous forme de DataFrame,
+        triée selon la colonne `tri` et filtrée sur les lignes dont
+        `colonne_filtre` contient `texte`.
+        """
+        indices = self._ordre(tri, croissant, colonne_filtre, texte)
+        debut = numero * taille
+        if indices is None:
+            morceau = self.table.slice(debut, taille)
+        else:
+            morceau = self.table.take(indices.slice(debut, taille))
+        # Les colonnes encodées par dictionnaire sont décodées sur les seules lignes de la page
+        colonnes = [
+            colonne.cast(colonne.type.value_type) if self.pa.types.is_dictionary(colonne.type) else colonne
+            for colonne in morceau.columns
+        ]
+        return self.pa.table(colonnes, names=morceau.column_names).to_pandas()
@@ -0,0 +1,115 @@
+import itertools
+import threading
+from contextlib import contextmanager
+
+from .auth import construire_service, lister_proprietes
+from .limiteur import limiteur_utilisateur
+
+PLACES_PAR_IDENTIFIANT = 10  # Tranches extraites en même temps avec un même identifiant (20 requêtes/s au plus)
+
+
+# Pool d'identifiants (jetons OAuth ou comptes de service) se partageant les tranches de plusieurs propriétés
+class PoolIdentifiants:
+    """
+    Chaque identifiant a son propre quota par utilisateur (voir
+    `limiteurs_pour`) : les tranches sont attribuées, au moment de leur
+    exécution, à l'identifiant qui a le plus de marge (débit non réduit par
+    l'API, places libres). Le quota par propriété reste unique : le pool
+    accélère les lots de propriétés, pas l'extraction d'une seule.
+
+    Quand toutes les places sont occupées, une place libérée revient à la
+    propriété en attente qui en occupe le moins (à égalité, la plus
+    ancienne demande) : une propriété volumineuse ne peut pas accaparer le
+    pool au détriment des autres.
+    """
+
+    def __init__(self, services, places=PLACES_PAR_IDENTIFIANT):
+        self.services = list(services)
+        if not self.services:
+            raise ValueError("Le pool doit contenir au moins un identifiant.")
+        self.places = places
+        self.condition = threading.Condition()
+        self.occupees = [0] * len(self.services)
+        self.tranches = [0] * len(self.services)
+        self.par_propriete = {}
+        self.demandes = []
+        self.tickets = itertools.count()
+        self.acces = {}
+
+    def __len__(self):
+        return len(self.services)
+
+    def proprietes(self):
+        """
+        Liste les propriétés accessibles avec chaque identifiant et retient
+        ces accès : une propriété n'est ensuite attribuée qu'aux identifiants
+        qui y ont accès. Renvoie l'union des propriétés, sans doublon.
+        """
+        acces = {}
+        for i, service in enumerate(self.services):
+            for site_url in lister_proprietes(service):
+                acces.setdefault(site_url, set()).add(i)
+        with self.condition:
+            self.acces = acces
+        return list(acces)
+
+    # Fonction pour lister les identifiants libres ayant accès à une propriété (appelée sous le verrou)
+    def _libres(self, site_url):
+        return [i for i in self.acces.get(site_url, range(len(self.services))) if self.occupees[i] < self.places]
+
+    # Fonction pour désigner la demande servie en priorité parmi celles qui peuvent l'être (appelée sous le verrou)
+    def _prioritaire(self):
+        servables = [demande for demande in self.demandes if self._libres(demande[1])]
+        if not servables:
+            return None
+        return min(servables, key=lambda demande: (self.par_propriete.get(demande[1], 0), demande[0]))
+
+    @contextmanager
+    def emprunter(self, site_url):
+        """Attend une place et fournit le service de l'identifiant attribué, le temps d'une tranche."""
+        with self.condition:
+            demande = (next(self.tickets), site_url)
+            self.demandes.append(demande)
+            while self._prioritaire() != demande:
+                self.condition.wait()
+            # L'identifiant qui a le plus de marge : débit non réduit par l'API, puis places libres
+            i = max(self._libres(site_url), key=lambda i: (limiteur_utilisateur(self.services[i]).marge(),
+                                                          self.places - self.occupees[i]))
+            self.demandes.remove(demande)
+            self.occupees[i] += 1
+            self.par_propriete[site_url] = self.par_propriete.get(site_url, 0) + 1
+            # La demande suivante peut peut-être être servie elle aussi
+            self.condition.notify_all()
+        try:
+            yield self.services[i]
+        finally:
+            with self.condition:
+                self.occupees[i] -= 1
+                self.tranches[i] += 1
+                self.par_propriete[site_url] -= 1
+                if not self.par_propriete[site_url]:
+                    del self.par_propriete[site_url]
+                self.condition.notify_all()
+
+    def etat(self):
+        """Renvoie, pour chaque identifiant, les places occupées, les tranches traitées et l'état de son quota."""
+        with self.condition:
+            occupees, tranches = list(self.occupees), list(self.tranches)
+        etats = []
+        for i, service in enumerate(self.services):
+            credentials = service._http.credentials
+            etat = limiteur_utilisateur(service).etat()
+            etats.append({
+                'identifiant': getattr(credentials, 'service_account_email', None) or f"identifiant {i + 1}",
+                'places_occupees': occupees[i],
+                'tranches': tranches[i],
+                'requetes': etat['requetes'],
+                'debit_par_minute': etat['debit_par_minute'],
+                'limite': etat['limite'],
+            })
+        return etats
+
+
+# Fonction pour construire un pool à partir d'une liste d'identifiants
+def construire_pool(liste_identifiants, places=PLACES_PAR_IDENTIFIANT):
+    return PoolIdentifiants([construire_service(creds) for creds in liste_identifiants], places)
@@ -0,0 +1,209 @@
+import random
+import threading
+import time
+
+import httplib2
+from googleapiclient.errors import HttpError
+
+from .telemetrie import obtenir_telemetrie
+
+# Quotas de l'API Search Console pour searchanalytics.query
+QUOTA_SITE_PAR_MINUTE = 1200
+QUOTA_UTILISATEUR_PAR_MINUTE = 1200
+QUOTA_PAR_SECONDE = 20  # Lissage des rafales, les quotas étant comptés par minute
+
+MAX_TENTATIVES = 6
+DELAI_BASE = 1.0  # Secondes, doublé à chaque nouvelle tentative
+DELAI_MAX = 64.0
+
+CODES_A_REESSAYER = {429, 500, 502, 503, 504}
+RAISONS_QUOTA = (b'quotaExceeded', b'rateLimitExceeded', b'userRateLimitExceeded')
+
+_registre = {}
+_registre_lock = threading.Lock()
+
+
+# Seau à jetons thread-safe
+class SeauJetons:
+    """Délivre au plus `debit` jetons par seconde, avec une réserve de `capacite` jetons."""
+
+    def __init__(self, debit, capacite):
+        self.debit = debit
+        self.capacite = capacite
+        self.jetons = capacite
+        self.dernier = time.monotonic()
+
+    def _remplir(self, maintenant, facteur):
+        self.jetons = min(self.capacite, self.jetons + (maintenant - self.dernier) * self.debit * facteur)
+        self.dernier = maintenant
+
+    def attente(self, maintenant, facteur):
+        """Renvoie 0 et consomme un jeton s'il y en a un, sinon le délai avant le prochain."""
+        self._remplir(maintenant, facteur)
+        if self.jetons >= 1:
+            self.jetons -= 1
+            return 0.0
+        return (1 - self.jetons) / (self.debit * facteur)
+
+
+# Limiteur adaptatif combinant un quota par seconde et un quota par minute
+class LimiteurDebit:
+    """
+    Limite le débit des requêtes à `par_minute` et `par_seconde`.
+    Le débit effectif est divisé par deux à chaque limitation signalée par l'API
+    puis remonte progressivement après chaque succès.
+    """
+
+    FACTEUR_MIN = 1 / 16
+
+    def __init__(self, par_minute, par_seconde=QUOTA_PAR_SECONDE):
+        self.par_minute = par_minute
+        self.par_seconde = par_seconde
+        self.seaux = [
+            SeauJetons(par_seconde, par_seconde),
+            SeauJetons(par_minute / 60, par_minute),
+        ]
+        self.facteur = 1.0
+        self.pause_jusqua = 0.0
+        self.requetes = 0
+        self.limitations = 0
+        self.attente_cumulee = 0.0
+        self.lock = threading.Lock()
+
+    def acquerir(self):
+        """Bloque jusqu'à ce qu'une requête puisse être envoyée."""
+        while True:
+            with self.lock:
+                maintenant = time.monotonic()
+                attente = self.pause_jusqua - maintenant
+                if attente <= 0:
+                    attentes = [seau.attente(maintenant, self.facteur) for seau in self.seaux]
+                    attente = max(attentes)
+                    if attente <= 0:
+                        self.requetes += 1
+                        return
+                    # Rendre les jetons déjà consommés par les seaux qui en avaient
+                    for seau, a in zip(self.seaux, attentes):
+                        if a <= 0:
+                            seau.jetons += 1
+                self.attente_cumulee += attente
+            time.sleep(attente)
+
+    def signaler_limitation(self, delai):
+        """L'API a refusé une requête : suspendre tous les appels et réduire le débit."""
+        with self.lock:
+            maintenant = time.monotonic()
+            self.limitations += 1
+            # Les refus simultanés de plusieurs workers ne réduisent le débit qu'une fois
+            if maintenant >= self.pause_jusqua:
+                self.facteur = max(self.FACTEUR_MIN, self.facteur / 2)
+            self.pause_jusqua = max(self.pause_jusqua, maintenant + delai)
+
+    def signaler_succes(self):
+        with self.lock:
+            if self.facteur < 1.0:
+                self.facteur = min(1.0, self.facteur * 1.05)
+
+    def marge(self):
+        """Part du débit nominal disponible : 0 pendant une pause imposée par l'API, sinon le facteur courant."""
+        with self.lock:
+            return 0.0 if self.pause_jusqua > time.monotonic() else self.facteur
+
+    def etat(self):
+        """Renvoie l'état de limitation courant (débit effectif, compteurs)."""
+        with self.lock:
+            return {
+                'debit_par_minute': round(self.par_minute * self.facteur),
+                'facteur': self.facteur,
+                'limite': self.facteur < 1.0 or self.pause_jusqua > time.monotonic(),
+                'requetes': self.requetes,
+                'limitations': self.limitations,
+                'attente_cumulee': self.attente_cumulee,
+            }
+
+
+# Fonction pour obtenir le limiteur partagé associé à une clé
+def obtenir_limiteur(cle, par_minute):
+    """Les limiteurs sont partagés entre toutes les extractions du processus."""
+    with _registre_lock:
+        if cle not in _registre:
+            _registre[cle] = LimiteurDebit(par_minute)
+        return _registre[cle]
+
+
+# Fonction pour remplacer le limiteur associé à une clé (quotas relevés, banc d'essai)
+def definir_limiteur(cle, par_minute, par_seconde=QUOTA_PAR_SECONDE):
+    with _registre_lock:
+        _registre[cle] = LimiteurDebit(par_minute, par_seconde)
+        return _registre[cle]
+
+
+# Fonction pour obtenir le limiteur du quota par utilisateur des identifiants d'un service
+def limiteur_utilisateur(service):
+    return obtenir_limiteur(('utilisateur', id(service._http.credentials)), QUOTA_UTILISATEUR_PAR_MINUTE)
+
+
+# Fonction pour obtenir les limiteurs à respecter pour une propriété
+def limiteurs_pour(service, site_url):
+    return [
+        limiteur_utilisateur(service),
+        obtenir_limiteur(('site', site_url), QUOTA_SITE_PAR_MINUTE),
+    ]
+
+
+# Fonction pour résumer l'état de tous les limiteurs
+def etat_limiteurs():
+    with _registre_lock:
+        limiteurs = dict(_registre)
+    return {cle: limiteur.etat() for cle, limiteur in limiteurs.items()}
+
+
+# Fonction pour savoir si une erreur est une limitation imposée par l'API (429 ou quota dépassé)
+def _est_limitation(e):
+    if not isinstance(e, HttpError):
+        return False
+    if e.resp.status == 429:
+        return True
+    return e.resp.status == 403 and any(raison in (e.content or b'') for raison in RAISONS_QUOTA)
+
+
+# Fonction pour savoir si une erreur mérite une nouvelle tentative
+def _est_reessayable(e):
+    if isinstance(e, HttpError):
+        return e.resp.status in CODES_A_REESSAYER or _est_limitation(e)
+    # Erreurs réseau (coupure, délai dépassé)
+    return isinstance(e, (httplib2.HttpLib2Error, ConnectionError, TimeoutError))
+
+
+# Fonction pour exécuter une requête en respectant les quotas
+def executer_avec_reprise(requete, limiteurs, http=None, max_tentatives=MAX_TENTATIVES):
+    """
+    Exécute une requête de l'API après avoir obtenu un jeton de chaque limiteur.
+    Les erreurs 429, 5xx, de quota et réseau sont réessayées avec un délai
+    exponentiel aléatoire (« full jitter ») ; l'erreur est levée une fois
+    les tentatives épuisées. Seules les limitations de l'API (429 et quota
+    dépassé) réduisent le débit des limiteurs partagés : une erreur serveur
+    ou réseau ne retarde que la requête concernée.
+    """
+    telemetrie = obtenir_telemetrie()
+    for tentative in range(max_tentatives):
+        for limiteur in limiteurs:
+            limiteur.acquerir()
+        debut = time.perf_counter()
+        try:
+            response = requete.execute(http=http)
+        except Exception as e:
+            telemetrie.enregistrer_requete(time.perf_counter() - debut, succes=False)
+            if not _est_reessayable(e) or tentative == max_tentatives - 1:
+                raise
+            delai = random.uniform(0, min(DELAI_MAX, DELAI_BASE * 2 ** tentative))
+            if _est_limitation(e):
+                for limiteur in limiteurs:
+                    limiteur.signaler_limitation(delai)
+            telemetrie.enregistrer_nouvelle_tentative(delai)
+            time.sleep(delai)
+            continue
+        telemetrie.enregistrer_requete(time.perf_counter() - debut)
+        for limiteur in limiteurs:
+            limiteur.signaler_succes()
+        return response
@@ -0,0 +1,161 @@
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from .export import FORMATS_FLUX, ecrire_dataframe, ouvrir_ecrivain
+from .identifiants import PoolIdentifiants
+from .moteur import extraire_donnees, extraire_en_flux
+from .progression import Progression
+from .reprise import extraire_reprenable
+from .synchro import synchroniser
+
+MAX_PROPRIETES = 4  # Nombre de propriétés extraites en parallèle (par identifiant avec un pool)
+
+# Extensions de fichier des formats disponibles pour les lots
+FORMATS_LOT = dict(FORMATS_FLUX, arrow='.arrow', xlsx='.xlsx')
+
+
+# Fonction pour transformer l'URL d'une propriété en nom de dossier
+def nom_dossier_propriete(site_url):
+    return re.sub(r'[^A-Za-z0-9.-]+', '_', site_url).strip('_')
+
+
+# Fonction pour extraire tous les jeux de dimensions d'une propriété
+def extraire_propriete(service, site_url, start_date, end_date, jeux_dimensions, dossier,
+                       format_export='csv', granularite='day', cache=None, flux=False, reprise=False,
+                       partitionner_par_date=False, progression=None):
+    """
+    Extrait chaque jeu de dimensions (ex. ['page'], ['page', 'query']) dans
+    `dossier/<propriété>/<dimensions>.<format>` et renvoie un résumé par fichier.
+    En mode `flux`, les lignes sont journalières et écrites au fil de l'eau
+    (formats csv, csv.gz et parquet uniquement). Avec `reprise`, chaque page
+    est sauvegardée sur disque et une extraction interrompue reprend là où
+    elle s'était arrêtée (voir `extraire_reprenable`). Avec
+    `partitionner_par_date` (format parquet, en mode `flux` ou avec la
+    dimension date), chaque fichier est un dossier `date=AAAA-MM-JJ/...`.
+    """
+    progression = progression or Progression()
+    dossier_propriete = os.path.join(dossier, nom_dossier_propriete(site_url))
+    os.makedirs(dossier_propriete, exist_ok=True)
+    resumes = []
+
+    for dimensions in jeux_dimensions:
+        nom = '_'.join(dimensions)
+        chemin = os.path.join(dossier_propriete, nom + FORMATS_LOT[format_export])
+        erreurs = []
+
+        def on_progress(terminees, total, lignes):
+            progression.avancement(site_url, nom, terminees, total, lignes)
+
+        def on_error(e):
+            erreurs.append(e)
+            progression.erreur(site_url, nom, e)
+
+        progression.debut(site_url, nom)
+        if flux:
+            with ouvrir_ecrivain(chemin, partitionner_par_date) as ecrivain:
+                lignes = extraire_en_flux(service, site_url, start_date, end_date, dimensions, ecrivain,
+                                          granularite=granularite, cache=cache,
+                                          on_progress=on_progress, on_error=on_error)
+        else:
+            if reprise:
+                df, _ = extraire_reprenable(service, site_url, start_date, end_date, dimensions,
+                                            granularite=granularite, cache=cache,
+                                            on_progress=on_progress, on_error=on_error)
+            else:
+                df = extraire_donnees(service, site_url, start_date, end_date, dimensions,
+                                      granularite=granularite, cache=cache,
+                                      on_progress=on_progress, on_error=on_error)
+            ecrire_dataframe(df, chemin, partitionner_par_date)
+            lignes = len(df)
+        progression.fin(site_url, nom, lignes, chemin)
+
+        resumes.append({
+            'site': site_url,
+            'dimensions': dimensions,
+            'lignes': lignes,
+            'chemin': chemin,
+            'erreurs': len(erreurs),
+        })
+    return resumes
+
+
+# Fonction pour calculer le nombre de propriétés traitées en parallèle
+def _proprietes_paralleles(service, max_proprietes):
+    if isinstance(service, PoolIdentifiants):
+        return max_proprietes * len(service)
+    return max_proprietes
+
+
+# Fonction pour extraire un lot de propriétés en parallèle
+def extraire_lot(service, proprietes, start_date, end_date, jeux_dimensions, dossier,
+                 max_proprietes=MAX_PROPRIETES, progression=None, **options):
+    """
+    Extrait plusieurs propriétés en parallèle (voir `extraire_propriete` pour
+    `options`). Les quotas de l'API restent partagés grâce aux limiteurs.
+    Avec un `PoolIdentifiants`, `max_proprietes` propriétés sont traitées en
+    parallèle par identifiant et les tranches réparties entre identifiants.
+    Une propriété en échec n'interrompt pas les autres.
+    Renvoie la liste des résumés de tous les fichiers écrits.
+    """
+    progression = progression or Progression()
+    if options.get('flux') and options.get('format_export') not in FORMATS_FLUX:
+        raise ValueError(f"Le mode flux n'accepte que les formats : {', '.join(FORMATS_FLUX)}")
+    if options.get('partitionner_par_date'):
+        if options.get('format_export') != 'parquet':
+            raise ValueError("Le partitionnement par date n'est disponible qu'au format parquet.")
+        if not options.get('flux') and any('date' not in dimensions for dimensions in jeux_dimensions):
+            raise ValueError("Le partitionnement par date nécessite le mode flux ou la dimension date.")
+
+    resumes = []
+    with ThreadPoolExecutor(max_workers=_proprietes_paralleles(service, max_proprietes)) as executor:
+        futures = {
+            executor.submit(extraire_propriete, service, site_url, start_date, end_date, jeux_dimensions,
+                            dossier, progression=progression, **options): site_url
+            for site_url in proprietes
+        }
+        for future in as_completed(futures):
+            try:
+                resumes.extend(future.result())
+            except Exception as e:
+                progression.erreur(futures[future], None, e)
+                resumes.append({'site': futures[future], 'dimensions': None, 'lignes': 0,
+                                'chemin': None, 'erreurs': 1})
+    return resumes
+
+
+# Fonction pour synchroniser un lot de propriétés en parallèle
+def synchroniser_lot(service, proprietes, jeux_dimensions, entrepot,
+                     max_proprietes=MAX_PROPRIETES, progression=None, **options):
+    """
+    Applique `synchroniser` à chaque propriété et chaque jeu de dimensions,
+    plusieurs propriétés en parallèle (par identifiant avec un `PoolIdentifiants`).
+    Renvoie la liste des résumés.
+    """
+    progression = progression or Progression()
+
+    def synchroniser_propriete(site_url):
+        resumes = []
+        for dimensions in jeux_dimensions:
+            nom = '_'.join(dimensions)
+            progression.debut(site_url, nom)
+            resume = synchroniser(
+                service, site_url, dimensions, entrepot,
+                on_progress=lambda terminees, total, lignes: progression.avancement(
+                    site_url, nom, terminees, total, lignes),
+                on_error=lambda e: progression.erreur(site_url, nom, e),
+                **options)
+            progression.fin(site_url, nom, resume['lignes'], None)
+            resumes.append(dict(resume, dimensions=dimensions))
+        return resumes
+
+    resumes = []
+    with ThreadPoolExecutor(max_workers=_proprietes_paralleles(service, max_proprietes)) as executor:
+        futures = {executor.submit(synchroniser_propriete, site_url): site_url for site_url in proprietes}
+        for future in as_completed(futures):
+            try:
+                resumes.extend(future.result())
+            except Exception as e:
+                progression.erreur(futures[future], None, e)
+                resumes.append({'site': futures[future], 'dimensions': None, 'lignes': 0, 'erreurs': 1})
+    return resumes
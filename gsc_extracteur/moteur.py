@@ -0,0 +1,549 @@
+import copy
+import datetime
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import nullcontext
+from functools import partial
+
+import pandas as pd
+
+from .colonnes import TamponColonnes
+from .identifiants import PoolIdentifiants
+from .limiteur import executer_avec_reprise, limiteurs_pour
+from .telemetrie import obtenir_telemetrie
+from .transport import TAILLE_LOT, precharger, reserve_pour
+
+ROW_LIMIT = 25000  # Valeur maximale autorisée par l'API pour rowLimit
+MAX_WORKERS = 5  # Nombre de tranches extraites en parallèle
+LIGNES_MAX_REQUETE = 50000  # Au-delà, l'API tronque les résultats d'une requête (par jour et par type)
+LIGNES_APERCU = 1000  # Lignes transmises à `on_apercu` dès la première tranche reçue
+
+# Types de recherche acceptés par l'API (paramètre searchType)
+TYPES_RECHERCHE = ['web', 'image', 'video', 'news', 'discover', 'googleNews']
+
+# Axes de découpage d'une requête tronquée, dans l'ordre où ils sont essayés
+DECOUPAGE = ('date', 'device', 'country')
+APPAREILS = ['DESKTOP', 'MOBILE', 'TABLET']
+
+# Noms des colonnes du DataFrame pour chaque dimension de l'API
+NOMS_COLONNES = {
+    'page': 'page',
+    'query': 'mot-clé',
+}
+
+METRIQUES = ['clicks', 'impressions', 'ctr', 'position']
+
+
+# Fonction pour convertir une date en chaîne au format de l'API
+def _format_date(date):
+    if isinstance(date, str):
+        return date
+    return date.strftime("%Y-%m-%d")
+
+
+# Fonction pour découper une plage de dates en tranches
+def generer_shards(start_date, end_date, granularite='day'):
+    """
+    Découpe la plage [start_date, end_date] en tranches de dates.
+    `granularite` vaut 'day' (un jour par tranche), 'week' (sept jours)
+    ou 'range' (une seule tranche couvrant toute la période).
+    Renvoie une liste de couples (date_debut, date_fin) au format YYYY-MM-DD.
+    """
+    if isinstance(start_date, str):
+        start_date = datetime.date.fromisoformat(start_date)
+    if isinstance(end_date, str):
+        end_date = datetime.date.fromisoformat(end_date)
+
+    if granularite == 'range':
+        return [(_format_date(start_date), _format_date(end_date))]
+
+    pas = {'day': 1, 'week': 7}.get(granularite)
+    if pas is None:
+        raise ValueError(f"Granularité inconnue : {granularite}")
+
+    shards = []
+    debut = start_date
+    while debut <= end_date:
+        fin = min(debut + datetime.timedelta(days=pas - 1), end_date)
+        shards.append((_format_date(debut), _format_date(fin)))
+        debut = fin + datetime.timedelta(days=1)
+    return shards
+
+
+# Fonction pour construire un filtre de dimension au format de l'API
+def filtre(dimension, expression, operateur='equals'):
+    """`operateur` : equals, notEquals, contains, notContains, includingRegex ou excludingRegex."""
+    return {'dimension': dimension, 'operator': operateur, 'expression': expression}
+
+
+# Fonction pour construire les paramètres facultatifs d'une requête
+def options_requete(filtres=None, type_recherche=None, etat_donnees=None, type_agregation=None):
+    """
+    - `filtres` : liste de filtres (voir `filtre`), tous appliqués (ET) ;
+    - `type_recherche` : une valeur de `TYPES_RECHERCHE` (web par défaut) ;
+    - `etat_donnees` : 'all' pour inclure les données récentes non finalisées ;
+    - `type_agregation` : 'byPage' ou 'byProperty' (par défaut, choisi par l'API
+      selon les dimensions : par page si la page est une dimension).
+    """
+    options = {}
+    if filtres:
+        options['dimensionFilterGroups'] = [{'groupType': 'and', 'filters': list(filtres)}]
+    if type_recherche:
+        if type_recherche not in TYPES_RECHERCHE:
+            raise ValueError(f"Type de recherche inconnu : {type_recherche}")
+        options['type'] = type_recherche
+    if etat_donnees:
+        options['dataState'] = etat_donnees
+    if type_agregation:
+        options['aggregationType'] = type_agregation
+    return options
+
+
+# Fonction pour ajouter un filtre à des paramètres de requête existants
+def _ajouter_filtre(options, nouveau_filtre):
+    options = copy.deepcopy(options) if options else {}
+    groupes = options.setdefault('dimensionFilterGroups', [{'groupType': 'and', 'filters': []}])
+    groupes[0]['filters'].append(nouveau_filtre)
+    return options
+
+
+# Fonction pour construire le corps d'une requête searchanalytics.query
+def _corps_requete(debut, fin, dimensions, row_limit, start_row, options=None):
+    request = {
+        'startDate': debut,
+        'endDate': fin,
+        'dimensions': dimensions,
+        'rowLimit': row_limit,
+        'startRow': start_row
+    }
+    if options:
+        request.update(options)
+    return request
+
+
+# Fonction pour exécuter une requête, en passant par le cache s'il est fourni
+def _executer_requete(service, site_url, request, limiteurs, http, cache):
+    if cache is not None:
+        response = cache.lire(site_url, request)
+        if response is not None:
+            return response
+
+    response = executer_avec_reprise(
+        service.searchanalytics().query(siteUrl=site_url, body=request), limiteurs, http=http)
+
+    if cache is not None:
+        cache.ecrire(site_url, request, response)
+    return response
+
+
+# Fonction pour paginer une tranche de dates
+def _paginer_shard(service, site_url, debut, fin, dimensions, row_limit, cache, sur_page, start_row=0,
+                   options=None):
+    """
+    Appelle `sur_page(rows)` pour chaque page de la tranche, à partir de la
+    ligne `start_row`, et renvoie le nombre total de lignes de la tranche.
+    """
+    limiteurs = limiteurs_pour(service, site_url)
+    telemetrie = obtenir_telemetrie()
+
+    with reserve_pour(service).emprunter() as http:
+        while True:
+            request = _corps_requete(debut, fin, dimensions, row_limit, start_row, options)
+            response = _executer_requete(service, site_url, request, limiteurs, http, cache)
+
+            batch = response.get('rows', [])
+            telemetrie.enregistrer_page(len(batch))
+            if batch:
+                sur_page(batch)
+            start_row += len(batch)
+
+            # Si nous avons reçu moins de lignes que demandées, la tranche est terminée
+            if len(batch) < row_limit:
+                return start_row
+
+
+# Fonction pour demander seule la première page de la première tranche, affichée sans attendre le reste
+def _premiere_page(service, site_url, debut, fin, dimensions, row_limit, cache, options, on_apercu):
+    """
+    Renvoie (corps, réponse), à ajouter aux réponses préchargées, ou None si
+    la requête échoue (la tranche est alors extraite normalement et l'erreur
+    signalée à ce moment-là). Appelle `on_apercu` si la page contient des lignes.
+    """
+    request = _corps_requete(debut, fin, dimensions, row_limit, 0, options)
+    try:
+        with reserve_pour(service).emprunter() as http:
+            response = _executer_requete(service, site_url, request, limiteurs_pour(service, site_url), http, cache)
+    except Exception:
+        return None
+    rows = response.get('rows', [])
+    if rows:
+        tampon = TamponColonnes(len(dimensions))
+        tampon.ajouter_page(rows)
+        on_apercu(_fusionner(tampon, dimensions).head(LIGNES_APERCU))
+    return request, response
+
+
+# Fonction pour précharger par requêtes groupées la première page de chaque tranche (debut, fin, options)
+def _precharger_shards(service, site_url, shards, dimensions, row_limit, cache, max_workers, taille_lot):
+    bodies = [_corps_requete(debut, fin, dimensions, row_limit, 0, options) for debut, fin, options in shards]
+    return precharger(service, site_url, bodies, cache, max_workers, taille_lot, lignes_par_page=row_limit)
+
+
+# Fonction pour extraire toutes les pages d'une tranche de dates
+def _extraire_shard(service, site_url, debut, fin, dimensions, row_limit, cache, chaines, options=None,
+                    decoupage=()):
+    """
+    Renvoie un `TamponColonnes`, ou un `Decoupage` si la tranche a atteint
+    `LIGNES_MAX_REQUETE` (résultats tronqués par l'API) et peut encore être
+    découpée selon l'un des axes de `decoupage`.
+    """
+    tampon = TamponColonnes(len(dimensions), chaines)
+    _paginer_shard(service, site_url, debut, fin, dimensions, row_limit, cache, tampon.ajouter_page,
+                   options=options)
+    if len(tampon) < LIGNES_MAX_REQUETE:
+        return tampon
+
+    parties = _decouper(service, site_url, debut, fin, row_limit, cache, options, decoupage)
+    if not parties:
+        return tampon
+    return Decoupage(
+        partial(_extraire_shard, service, site_url, d, f, dimensions, row_limit, cache, chaines, o, reste)
+        for d, f, o, reste in parties
+    )
+
+
+# Liste de sous-tâches remplaçant une tâche (voir `_executer_shards`)
+class Decoupage(list):
+    pass
+
+
+# Parties d'une tranche extraite en flux, écrites ensemble quand la dernière se termine
+class _Regroupement:
+    def __init__(self, nb_cles):
+        self.tampon = TamponColonnes(nb_cles)
+        self.restantes = 1
+        self.decoupee = False
+        self.lock = threading.Lock()
+
+
+# Fonction pour extraire une tranche et l'écrire, ou la redécouper avant toute écriture
+def _ecrire_shard(service, site_url, debut, fin, dimensions, row_limit, cache, ecrire, regroupement, options=None,
+                  decoupage=()):
+    """
+    Les pages de la tranche sont gardées en colonnes jusqu'à sa fin : une
+    tranche tronquée (`LIGNES_MAX_REQUETE`) est abandonnée sans rien écrire et
+    renvoie un `Decoupage`, comme dans `_extraire_shard`. Les parties d'une
+    tranche découpée s'ajoutent à son `regroupement`, écrit en une fois,
+    réagrégé par clé, par `ecrire(tampon, agreger)` quand la dernière se
+    termine. Renvoie le nombre de lignes écrites.
+    """
+    tampon = TamponColonnes(len(dimensions))
+    _paginer_shard(service, site_url, debut, fin, dimensions, row_limit, cache, tampon.ajouter_page,
+                   options=options)
+    if len(tampon) >= LIGNES_MAX_REQUETE:
+        parties = _decouper(service, site_url, debut, fin, row_limit, cache, options, decoupage)
+        if parties:
+            with regroupement.lock:
+                regroupement.restantes += len(parties) - 1
+                regroupement.decoupee = True
+            return Decoupage(
+                partial(_ecrire_shard, service, site_url, d, f, dimensions, row_limit, cache, ecrire, regroupement,
+                        o, reste)
+                for d, f, o, reste in parties
+            )
+
+    with regroupement.lock:
+        regroupement.restantes -= 1
+        if regroupement.decoupee:
+            regroupement.tampon.etendre(tampon)
+            if regroupement.restantes:
+                return 0
+    if regroupement.decoupee:
+        return ecrire(regroupement.tampon, True)
+    return ecrire(tampon, False)
+
+
+# Fonction pour lister les valeurs d'une dimension sur une tranche
+def _valeurs_dimension(service, site_url, debut, fin, dimension, row_limit, cache, options):
+    valeurs = []
+    _paginer_shard(service, site_url, debut, fin, [dimension], row_limit, cache,
+                   lambda rows: valeurs.extend(row['keys'][0] for row in rows), options=options)
+    return valeurs
+
+
+# Fonction pour découper une requête tronquée selon le premier axe applicable
+def _decouper(service, site_url, debut, fin, row_limit, cache, options, decoupage):
+    """
+    Renvoie une liste de (debut, fin, options, axes_restants), ou une liste
+    vide si aucun axe ne s'applique. Chaque partie couvre une partie disjointe
+    des données : par jour, par appareil ou par pays (filtres ajoutés).
+    """
+    for i, axe in enumerate(decoupage):
+        reste = decoupage[i + 1:]
+        if axe == 'date' and debut != fin:
+            return [(d, f, options, reste) for d, f in generer_shards(debut, fin, 'day')]
+        if axe == 'device':
+            return [(debut, fin, _ajouter_filtre(options, filtre('device', a)), reste) for a in APPAREILS]
+        if axe == 'country':
+            pays = _valeurs_dimension(service, site_url, debut, fin, 'country', row_limit, cache, options)
+            return [(debut, fin, _ajouter_filtre(options, filtre('country', p)), reste) for p in pays]
+    return []
+
+
+# Fonction pour découper une extraction en tranches (debut, fin, options, axes de découpage)
+def _tranches(service, site_url, start_date, end_date, dimensions, granularite, row_limit, cache, options, decoupage):
+    """
+    Renvoie (tranches, plan). Avec `granularite='auto'`, les tranches sont
+    celles de `planifier` (les tranches par appareil ne sont plus redécoupées
+    par appareil) et `plan` sert à mesurer les lignes reçues ; sinon `plan`
+    vaut None.
+    """
+    if granularite != 'auto':
+        return [(debut, fin, options, decoupage) for debut, fin in generer_shards(start_date, end_date, granularite)], None
+
+    from .planificateur import planifier
+    plan = planifier(service, site_url, start_date, end_date, dimensions, options, cache, row_limit)
+    tranches = []
+    for tranche in plan.tranches:
+        if tranche['appareil'] is None:
+            tranches.append((tranche['debut'], tranche['fin'], options, decoupage))
+        else:
+            tranches.append((tranche['debut'], tranche['fin'],
+                             _ajouter_filtre(options, filtre('device', tranche['appareil'])),
+                             tuple(axe for axe in decoupage if axe != 'device')))
+    return tranches, plan
+
+
+# Fonction pour faire exécuter une tâche avec l'identifiant que le pool lui attribue
+def _repartir(pool, site_url, tache):
+    """
+    `tache` est un `partial` dont le premier argument est un service : il est
+    remplacé, au moment de l'exécution, par celui de l'identifiant attribué
+    (voir `PoolIdentifiants.emprunter`). Les sous-tâches d'un `Decoupage`
+    sont réparties de la même façon.
+    """
+    def executer():
+        with pool.emprunter(site_url) as service:
+            resultat = tache.func(service, *tache.args[1:], **tache.keywords)
+        if isinstance(resultat, Decoupage):
+            return Decoupage(_repartir(pool, site_url, sous_tache) for sous_tache in resultat)
+        return resultat
+    return executer
+
+
+# Fonction pour obtenir le service d'une extraction (emprunté au pool si `service` est un `PoolIdentifiants`)
+def _service_extraction(service, site_url):
+    if isinstance(service, PoolIdentifiants):
+        return service.emprunter(site_url)
+    return nullcontext(service)
+
+
+# Fonction pour exécuter les tranches dans un pool de threads borné
+def _executer_shards(taches, max_workers, sur_resultat, on_progress, on_error):
+    """
+    Exécute les tâches (fonctions sans argument) en parallèle et appelle
+    `sur_resultat(resultat)`, qui renvoie le nombre total de lignes, depuis
+    le thread appelant au fur et à mesure qu'elles se terminent.
+    Une tâche qui renvoie un `Decoupage` est remplacée par ses sous-tâches,
+    exécutées à leur tour dans le même pool.
+    """
+    terminees = 0
+    total = len(taches)
+    lignes = 0
+
+    if on_progress:
+        on_progress(0, total, 0)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        en_cours = {executor.submit(tache) for tache in taches}
+        while en_cours:
+            finies, en_cours = wait(en_cours, return_when=FIRST_COMPLETED)
+            for future in finies:
+                terminees += 1
+                try:
+                    resultat = future.result()
+                    if isinstance(resultat, Decoupage):
+                        total += len(resultat)
+                        en_cours |= {executor.submit(tache) for tache in resultat}
+                    else:
+                        lignes = sur_resultat(resultat)
+                except Exception as e:
+                    if on_error is None:
+                        raise
+                    on_error(e)
+                if on_progress:
+                    on_progress(terminees, total, lignes)
+
+
+# Fonction pour calculer le CTR et la position à partir des sommes
+def _calculer_metriques(df, colonnes_cles):
+    df['clicks'] = df['clicks'].astype('int64')
+    df['impressions'] = df['impressions'].astype('int64')
+    df['ctr'] = (df['clicks'] / df['impressions']).where(df['impressions'] > 0, 0.0)
+    df['position'] = (df['_position_ponderee'] / df['impressions']).where(df['impressions'] > 0, 0.0)
+    return df[colonnes_cles + METRIQUES]
+
+
+# Fonction pour agréger par clé des lignes provenant de plusieurs tranches
+def _agreger(df, colonnes_cles):
+    """
+    Les clics et impressions sont sommés, le CTR est recalculé et la position
+    est la moyenne pondérée par les impressions (colonne `_position_ponderee`).
+    """
+    if df.empty:
+        return pd.DataFrame(columns=colonnes_cles + METRIQUES)
+
+    df = df.groupby(colonnes_cles, sort=False, observed=True, as_index=False).sum()
+    df = df.sort_values(['clicks', 'impressions'], ascending=False, ignore_index=True)
+    return _calculer_metriques(df, colonnes_cles)
+
+
+# Fonction pour fusionner les lignes de toutes les tranches
+def _fusionner(tampon, dimensions):
+    colonnes_cles = [NOMS_COLONNES.get(d, d) for d in dimensions]
+    if not len(tampon):
+        return pd.DataFrame(columns=colonnes_cles + METRIQUES)
+    return _agreger(tampon.vers_dataframe(colonnes_cles), colonnes_cles)
+
+
+# Moteur d'extraction parallèle par tranches de dates
+def extraire_donnees(service, site_url, start_date, end_date, dimensions,
+                     granularite='day', max_workers=MAX_WORKERS, row_limit=ROW_LIMIT,
+                     cache=None, taille_lot=TAILLE_LOT, filtres=None, type_recherche=None, etat_donnees=None,
+                     type_agregation=None, decoupage=DECOUPAGE, on_progress=None, on_error=None, on_apercu=None):
+    """
+    Découpe la période en tranches (voir `generer_shards`, ou `planifier`
+    avec `granularite='auto'` : découpage selon la densité des données,
+    appris d'une extraction à l'autre), pagine chaque
+    tranche indépendamment dans un pool de threads borné et fusionne les
+    résultats en un DataFrame (une ligne par clé, colonnes de métriques).
+    `dimensions` est une liste quelconque de dimensions de l'API (page, query,
+    date, country, device, searchAppearance) ; `filtres`, `type_recherche`,
+    `etat_donnees` et `type_agregation` sont décrits dans `options_requete`.
+    Si `cache` (voir `CacheReponses`) est fourni, les réponses déjà connues
+    ne sont pas redemandées à l'API. Les premières pages des tranches sont
+    demandées par requêtes HTTP groupées de `taille_lot` (0 pour désactiver),
+    en avance sur l'extraction mais dans une fenêtre bornée (voir
+    `CachePrecharge`).
+    Une tranche tronquée par l'API est redécoupée selon les axes de
+    `decoupage` (voir `DECOUPAGE`) et ses parties extraites en parallèle.
+    `service` peut être un `PoolIdentifiants` : chaque tranche est alors
+    extraite avec l'identifiant que le pool lui attribue.
+
+    Les callbacks sont appelés depuis le thread appelant :
+    - on_progress(tranches_terminees, tranches_total, lignes_recuperees)
+    - on_error(exception) pour chaque tranche en échec ; les autres tranches
+      sont conservées. Sans ce callback, la première erreur est levée.
+    - on_apercu(df) une seule fois, avec les `LIGNES_APERCU` premières lignes
+      reçues : la première page de la première tranche est demandée seule,
+      avant les requêtes groupées, pour être affichée après un aller-retour.
+    """
+    options = options_requete(filtres, type_recherche, etat_donnees, type_agregation)
+    pool = service if isinstance(service, PoolIdentifiants) else None
+    premiere = None
+    with _service_extraction(service, site_url) as service:
+        tranches, plan = _tranches(service, site_url, start_date, end_date, dimensions, granularite, row_limit, cache,
+                                   options, tuple(decoupage))
+        shards = [(debut, fin, options_tranche) for debut, fin, options_tranche, _ in tranches]
+        if on_apercu is not None and shards:
+            debut, fin, options_tranche = shards[0]
+            premiere = _premiere_page(service, site_url, debut, fin, dimensions, row_limit, cache, options_tranche,
+                                      on_apercu)
+            if premiere is not None and premiere[1].get('rows'):
+                on_apercu = None
+        cache = _precharger_shards(service, site_url, shards[1:] if premiere else shards, dimensions, row_limit,
+                                   cache, max_workers, taille_lot)
+    if premiere is not None:
+        cache.ajouter(site_url, *premiere)
+    tampon = TamponColonnes(len(dimensions))
+    taches = [
+        partial(_extraire_shard, service, site_url, debut, fin, dimensions, row_limit, cache, tampon.chaines,
+                options_tranche, decoupage_tranche)
+        for debut, fin, options_tranche, decoupage_tranche in tranches
+    ]
+    if pool is not None:
+        taches = [_repartir(pool, site_url, tache) for tache in taches]
+    if plan is not None:
+        taches = [plan.suivre(i, tache) for i, tache in enumerate(taches)]
+
+    def sur_resultat(tampon_shard):
+        nonlocal on_apercu
+        tampon.etendre(tampon_shard)
+        if on_apercu is not None and len(tampon_shard):
+            on_apercu(_fusionner(tampon_shard, dimensions).head(LIGNES_APERCU))
+            on_apercu = None
+        return len(tampon)
+
+    try:
+        _executer_shards(taches, max_workers, sur_resultat, on_progress, on_error)
+    finally:
+        cache.arreter()
+    if plan is not None:
+        plan.enregistrer()
+    return _fusionner(tampon, dimensions)
+
+
+# Extraction en flux vers un fichier, sans garder les lignes en mémoire
+def extraire_en_flux(service, site_url, start_date, end_date, dimensions, ecrivain,
+                     granularite='day', max_workers=MAX_WORKERS, row_limit=ROW_LIMIT,
+                     cache=None, taille_lot=TAILLE_LOT, filtres=None, type_recherche=None, etat_donnees=None,
+                     decoupage=DECOUPAGE, on_progress=None, on_error=None):
+    """
+    Comme `extraire_donnees`, mais chaque tranche est écrite par `ecrivain`
+    (voir `gsc_extracteur.export`) dès qu'elle se termine au lieu d'être
+    accumulée. Les lignes ne pouvant pas être réagrégées d'une tranche à
+    l'autre, la dimension `date` est ajoutée en tête : le fichier contient une
+    ligne par jour et par clé.
+    Une tranche tronquée par l'API est redécoupée selon les axes de
+    `decoupage` avant que ses lignes soient écrites (voir `_ecrire_shard`) :
+    seules les lignes de `max_workers` tranches, et celles des jours
+    redécoupés en cours d'extraction, sont gardées en mémoire.
+    `service` peut être un `PoolIdentifiants`.
+    Renvoie le nombre de lignes écrites.
+    """
+    dimensions_jour = ['date'] + [d for d in dimensions if d != 'date']
+    colonnes_cles = [NOMS_COLONNES.get(d, d) for d in dimensions_jour]
+    total = 0
+
+    def ecrire(tampon, agreger):
+        df = tampon.vers_dataframe(colonnes_cles)
+        df = _agreger(df, colonnes_cles) if agreger else _calculer_metriques(df, colonnes_cles)
+        if len(df):
+            ecrivain.ecrire(df)
+        return len(df)
+
+    options = options_requete(filtres, type_recherche, etat_donnees)
+    pool = service if isinstance(service, PoolIdentifiants) else None
+    with _service_extraction(service, site_url) as service:
+        tranches, plan = _tranches(service, site_url, start_date, end_date, dimensions_jour, granularite, row_limit,
+                                   cache, options, tuple(decoupage))
+        shards = [(debut, fin, options_tranche) for debut, fin, options_tranche, _ in tranches]
+        cache = _precharger_shards(service, site_url, shards, dimensions_jour, row_limit, cache, max_workers,
+                                   taille_lot)
+    regroupements = [_Regroupement(len(dimensions_jour)) for _ in tranches]
+    taches = [
+        partial(_ecrire_shard, service, site_url, debut, fin, dimensions_jour, row_limit, cache, ecrire, regroupement,
+                options_tranche, decoupage_tranche)
+        for (debut, fin, options_tranche, decoupage_tranche), regroupement in zip(tranches, regroupements)
+    ]
+    if pool is not None:
+        taches = [_repartir(pool, site_url, tache) for tache in taches]
+    if plan is not None:
+        taches = [plan.suivre(i, tache, compter=int) for i, tache in enumerate(taches)]
+
+    def sur_resultat(lignes_shard):
+        nonlocal total
+        total += lignes_shard
+        return total
+
+    try:
+        _executer_shards(taches, max_workers, sur_resultat, on_progress, on_error)
+    finally:
+        cache.arreter()
+    # Les parties terminées d'une tranche dont une partie a échoué sont écrites quand même
+    for regroupement in regroupements:
+        if regroupement.restantes and len(regroupement.tampon):
+            total += ecrire(regroupement.tampon, True)
+    if plan is not None:
+        plan.enregistrer()
+    return total
@@ -0,0 +1,288 @@
+import datetime
+import json
+import math
+import os
+import threading
+
+import pandas as pd
+
+from .cache import DOSSIER_CACHE
+from .limiteur import limiteurs_pour
+from .moteur import (APPAREILS, LIGNES_MAX_REQUETE, ROW_LIMIT, Decoupage, _corps_requete, _executer_requete,
+                     _format_date)
+from .transport import reserve_pour
+
+FICHIER_DENSITES = os.path.join(DOSSIER_CACHE, 'densites.json')
+MARGE_TRANCHE = 0.8  # Part de LIGNES_MAX_REQUETE visée par tranche, les estimations restant approximatives
+LISSAGE = 0.5  # Poids d'une nouvelle observation dans la densité retenue pour les extractions suivantes
+
+_densites_lock = threading.Lock()
+
+
+# Fonction pour découper une période en mois ou en semaines calendaires (ou en jours)
+def _periodes(debut, fin, unite):
+    periodes = []
+    while debut <= fin:
+        if unite == 'month':
+            suivant = (debut.replace(day=1) + datetime.timedelta(days=32)).replace(day=1)
+        elif unite == 'week':
+            suivant = debut + datetime.timedelta(days=7 - debut.weekday())
+        else:
+            suivant = debut + datetime.timedelta(days=1)
+        periodes.append((debut, min(suivant - datetime.timedelta(days=1), fin)))
+        debut = suivant
+    return periodes
+
+
+# Fonction pour calculer le nombre de requêtes nécessaires pour paginer un nombre de lignes
+def _pages(lignes, row_limit):
+    return max(1, math.ceil(lignes / row_limit))
+
+
+# Fonction pour obtenir la densité d'une unité (à défaut, celle de la plus fine unité observée)
+def _densite(densites, unite):
+    """Plus l'unité est fine, moins ses lignes sont fusionnées : la densité d'un jour majore celle d'un mois."""
+    if unite in densites:
+        return densites[unite]
+    for autre in ('day', 'week', 'month'):
+        if autre in densites:
+            return densites[autre]
+    return 0.0
+
+
+# Fonction pour identifier les densités d'une propriété, d'un jeu de dimensions et d'un type de recherche
+def _cle_densites(site_url, dimensions, options):
+    return ' '.join([site_url, ','.join(dimensions), (options or {}).get('type', 'web')])
+
+
+# Fonction pour lire les densités observées lors des extractions précédentes
+def lire_densites(site_url, dimensions, options=None, chemin=FICHIER_DENSITES):
+    """Renvoie {unité : lignes par impression} (dictionnaire vide si rien n'a encore été observé)."""
+    with _densites_lock:
+        if not os.path.exists(chemin):
+            return {}
+        with open(chemin, encoding='utf-8') as fichier:
+            return json.load(fichier).get(_cle_densites(site_url, dimensions, options), {})
+
+
+# Fonction pour enregistrer de nouvelles densités observées (moyenne lissée avec les précédentes)
+def _enregistrer_densites(site_url, dimensions, options, observees, chemin=FICHIER_DENSITES):
+    with _densites_lock:
+        densites = {}
+        if os.path.exists(chemin):
+            with open(chemin, encoding='utf-8') as fichier:
+                densites = json.load(fichier)
+        cle = _cle_densites(site_url, dimensions, options)
+        anciennes = densites.get(cle, {})
+        for unite, densite in observees.items():
+            ancienne = anciennes.get(unite)
+            anciennes[unite] = densite if ancienne is None else (1 - LISSAGE) * ancienne + LISSAGE * densite
+        densites[cle] = anciennes
+        os.makedirs(os.path.dirname(chemin) or '.', exist_ok=True)
+        temporaire = chemin + '.tmp'
+        with open(temporaire, 'w', encoding='utf-8') as fichier:
+            json.dump(densites, fichier, indent=2)
+        os.replace(temporaire, chemin)
+
+
+# Plan de découpage d'une extraction, avec son coût estimé
+class Plan:
+    """
+    Liste de tranches (dictionnaires : debut, fin, appareil, unite,
+    impressions, lignes_estimees, requetes_estimees) couvrant la période.
+    Pendant l'extraction, `suivre` compte les lignes réellement reçues par
+    tranche ; `enregistrer` en déduit les densités (lignes par impression)
+    de chaque unité, utilisées par les planifications suivantes.
+    """
+
+    def __init__(self, site_url, dimensions, options, tranches, densites, impressions_par_jour, sondages,
+                 row_limit=ROW_LIMIT):
+        self.site_url = site_url
+        self.dimensions = list(dimensions)
+        self.options = options
+        self.tranches = tranches
+        self.densites = densites
+        self.impressions_par_jour = impressions_par_jour
+        self.sondages = sondages
+        self.row_limit = row_limit
+        self.lock = threading.Lock()
+        self.lignes = {}
+        self.tronquees = set()
+
+    def __len__(self):
+        return len(self.tranches)
+
+    @property
+    def requetes_estimees(self):
+        return sum(tranche['requetes_estimees'] for tranche in self.tranches)
+
+    @property
+    def requetes_par_jour(self):
+        """Coût estimé du découpage fixe par jour, pour comparaison (un jour tronqué est redécoupé par appareil)."""
+        densite = _densite(self.densites, 'day')
+        jours = sum(
+            (datetime.date.fromisoformat(tranche['fin']) - datetime.date.fromisoformat(tranche['debut'])).days + 1
+            for tranche in self.tranches if tranche['appareil'] in (None, APPAREILS[0])
+        )
+        avec_impressions = [impressions for impressions in self.impressions_par_jour.values() if impressions]
+        # Un jour sans impressions coûte une requête (vide)
+        requetes = jours - len(avec_impressions)
+        for impressions in avec_impressions:
+            lignes = densite * impressions
+            requetes += _pages(min(lignes, LIGNES_MAX_REQUETE), self.row_limit)
+            if lignes >= LIGNES_MAX_REQUETE:
+                requetes += len(APPAREILS) * _pages(lignes / len(APPAREILS), self.row_limit)
+        return requetes
+
+    def vers_dataframe(self):
+        """Une ligne par tranche, pour l'affichage du plan."""
+        return pd.DataFrame([
+            {
+                'debut': tranche['debut'],
+                'fin': tranche['fin'],
+                'unite': tranche['unite'],
+                'appareil': tranche['appareil'] or '',
+                'impressions': tranche['impressions'],
+                'lignes_estimees': tranche['lignes_estimees'],
+                'requetes_estimees': tranche['requetes_estimees'],
+            }
+            for tranche in self.tranches
+        ], columns=['debut', 'fin', 'unite', 'appareil', 'impressions', 'lignes_estimees', 'requetes_estimees'])
+
+    def suivre(self, i, tache, compter=len):
+        """
+        Renvoie une tâche qui exécute `tache` (tranche `i`) et ajoute
+        `compter(resultat)` aux lignes de la tranche ; les sous-tâches d'un
+        `Decoupage` (tranche tronquée) sont suivies de la même façon.
+        """
+        def executer():
+            resultat = tache()
+            if isinstance(resultat, Decoupage):
+                with self.lock:
+                    self.tronquees.add(i)
+                return Decoupage(self.suivre(i, sous_tache, compter) for sous_tache in resultat)
+            with self.lock:
+                self.lignes[i] = self.lignes.get(i, 0) + compter(resultat)
+            return resultat
+        return executer
+
+    def enregistrer(self, terminees=None, chemin=FICHIER_DENSITES):
+        """
+        Enregistre la densité observée de chaque unité sur les tranches
+        terminées (`terminees` : indices des tranches, par défaut toutes
+        celles qui ont reçu des lignes). Les tranches par appareil comptent
+        comme des jours.
+        """
+        with self.lock:
+            lignes = dict(self.lignes)
+        terminees = set(lignes) if terminees is None else set(terminees)
+        # Un jour découpé par appareil ne compte que si ses trois tranches sont terminées
+        appareils = {(self.tranches[i]['debut'], self.tranches[i]['appareil']) for i in terminees}
+        sommes = {}
+        for i in terminees:
+            tranche = self.tranches[i]
+            if tranche['appareil'] is not None and any((tranche['debut'], a) not in appareils for a in APPAREILS):
+                continue
+            unite = 'day' if tranche['unite'] == 'appareil' else tranche['unite']
+            total_lignes, total_impressions = sommes.get(unite, (0, 0))
+            sommes[unite] = (total_lignes + lignes.get(i, 0), total_impressions + tranche['impressions'])
+        observees = {
+            unite: total_lignes / total_impressions
+            for unite, (total_lignes, total_impressions) in sommes.items() if total_impressions
+        }
+        if observees:
+            _enregistrer_densites(self.site_url, self.dimensions, self.options, observees, chemin)
+        return observees
+
+
+# Fonction pour exécuter une requête de sondage
+def _sonder(service, site_url, request, cache):
+    with reserve_pour(service).emprunter() as http:
+        response = _executer_requete(service, site_url, request, limiteurs_pour(service, site_url), http, cache)
+    return response.get('rows', [])
+
+
+# Fonction pour planifier le découpage d'une extraction selon la densité des données
+def planifier(service, site_url, start_date, end_date, dimensions, options=None, cache=None, row_limit=ROW_LIMIT,
+              chemin_densites=FICHIER_DENSITES):
+    """
+    Estime le nombre de lignes de chaque jour puis choisit, mois par mois,
+    la plus grande unité (mois, semaine, jour, jour par appareil) dont les
+    tranches restent sous `MARGE_TRANCHE` x `LIGNES_MAX_REQUETE` lignes :
+    une petite propriété est extraite en quelques requêtes, une grande sans
+    résultats tronqués.
+
+    Sondages : une requête ['date'] sur toute la période donne les
+    impressions de chaque jour ; les lignes par impression viennent des
+    extractions précédentes (voir `Plan.enregistrer`) ou, à défaut, de la
+    première page du jour le plus chargé (et d'une ligne à la position
+    `LIGNES_MAX_REQUETE` si cette page est pleine). Une unité jamais
+    observée reprend la densité de la plus fine unité observée.
+    Renvoie un `Plan`.
+    """
+    if isinstance(start_date, str):
+        start_date = datetime.date.fromisoformat(start_date)
+    if isinstance(end_date, str):
+        end_date = datetime.date.fromisoformat(end_date)
+
+    debut, fin = _format_date(start_date), _format_date(end_date)
+    sondages = 1
+    rows = _sonder(service, site_url, _corps_requete(debut, fin, ['date'], ROW_LIMIT, 0, options), cache)
+    impressions_par_jour = {row['keys'][0]: row['impressions'] for row in rows}
+
+    densites = lire_densites(site_url, dimensions, options, chemin_densites)
+    if not densites and impressions_par_jour:
+        jour, impressions = max(impressions_par_jour.items(), key=lambda item: item[1])
+        lignes = len(_sonder(service, site_url, _corps_requete(jour, jour, dimensions, row_limit, 0, options), cache))
+        sondages += 1
+        if lignes >= row_limit:
+            # Page pleine : le jour est-il tronqué par l'API ?
+            tronque = _sonder(service, site_url,
+                              _corps_requete(jour, jour, dimensions, 1, LIGNES_MAX_REQUETE - 1, options), cache)
+            sondages += 1
+            lignes = LIGNES_MAX_REQUETE if tronque else (row_limit + LIGNES_MAX_REQUETE) / 2
+        densites['day'] = lignes / impressions if impressions else 0.0
+
+    seuil = MARGE_TRANCHE * LIGNES_MAX_REQUETE
+    tranches = []
+
+    # Impressions et lignes estimées d'une tranche
+    def estimer(debut_tranche, fin_tranche, unite):
+        impressions = sum(
+            impressions_par_jour.get(_format_date(debut_tranche + datetime.timedelta(days=i)), 0)
+            for i in range((fin_tranche - debut_tranche).days + 1)
+        )
+        return impressions, _densite(densites, unite) * impressions
+
+    def ajouter(debut_tranche, fin_tranche, unite, impressions, lignes, appareil=None):
+        tranches.append({
+            'debut': _format_date(debut_tranche),
+            'fin': _format_date(fin_tranche),
+            'appareil': appareil,
+            'unite': unite,
+            'impressions': impressions,
+            'lignes_estimees': round(lignes),
+            'requetes_estimees': _pages(lignes, row_limit),
+        })
+
+    for debut_mois, fin_mois in _periodes(start_date, end_date, 'month'):
+        impressions, lignes = estimer(debut_mois, fin_mois, 'month')
+        if lignes <= seuil:
+            ajouter(debut_mois, fin_mois, 'month', impressions, lignes)
+            continue
+        for debut_semaine, fin_semaine in _periodes(debut_mois, fin_mois, 'week'):
+            impressions, lignes = estimer(debut_semaine, fin_semaine, 'week')
+            if lignes <= seuil:
+                ajouter(debut_semaine, fin_semaine, 'week', impressions, lignes)
+                continue
+            for jour, _ in _periodes(debut_semaine, fin_semaine, 'day'):
+                impressions, lignes = estimer(jour, jour, 'day')
+                if lignes <= seuil:
+                    ajouter(jour, jour, 'day', impressions, lignes)
+                else:
+                    # Impressions du jour comptées une seule fois, sur la première tranche par appareil
+                    for i, appareil in enumerate(APPAREILS):
+                        ajouter(jour, jour, 'appareil', impressions if i == 0 else 0, lignes / len(APPAREILS),
+                                appareil)
+
+    return Plan(site_url, dimensions, options, tranches, densites, impressions_par_jour, sondages, row_limit)
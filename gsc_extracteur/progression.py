@@ -0,0 +1,45 @@
+import logging
+
+logger = logging.getLogger('gsc_extracteur')
+
+
+# Interface de suivi de la progression d'un lot d'extractions
+class Progression:
+    """
+    Reçoit les événements d'un lot d'extractions. Les méthodes peuvent être
+    appelées depuis plusieurs threads (une extraction par propriété) :
+    les implémentations doivent être thread-safe.
+    Cette classe de base ignore tous les événements.
+    """
+
+    def debut(self, site_url, nom):
+        pass
+
+    def avancement(self, site_url, nom, terminees, total, lignes):
+        pass
+
+    def erreur(self, site_url, nom, exception):
+        pass
+
+    def fin(self, site_url, nom, lignes, chemin):
+        pass
+
+
+# Suivi de la progression dans les journaux (ligne de commande)
+class ProgressionJournal(Progression):
+    """Écrit un message par événement via le module `logging` (thread-safe)."""
+
+    def debut(self, site_url, nom):
+        logger.info("%s [%s] : début de l'extraction", site_url, nom)
+
+    def avancement(self, site_url, nom, terminees, total, lignes):
+        logger.debug("%s [%s] : %d/%d tranches, %d lignes", site_url, nom, terminees, total, lignes)
+
+    def erreur(self, site_url, nom, exception):
+        logger.error("%s [%s] : %s", site_url, nom, exception)
+
+    def fin(self, site_url, nom, lignes, chemin):
+        if chemin:
+            logger.info("%s [%s] : %d lignes écrites dans %s", site_url, nom, lignes, chemin)
+        else:
+            logger.info("%s [%s] : %d lignes", site_url, nom, lignes)
@@ -0,0 +1,211 @@
+import re
+import threading
+from array import array
+
+import numpy as np
+import pandas as pd
+
+PROFONDEUR_MAX = 3  # Niveaux de répertoires cumulés dès l'extraction (/, /blog/, /blog/2024/, /blog/2024/mars/)
+SECTION_AUTRES = 'autres'  # Section des URL qui ne correspondent à aucun motif
+
+
+# Fonction pour séparer une URL en hôte et segments de chemin
+def _segments(url):
+    debut = url.find('://')
+    debut = debut + 3 if debut >= 0 else 0
+    fin_hote = url.find('/', debut)
+    if fin_hote < 0:
+        return url, ['']
+    return url[:fin_hote], url[fin_hote + 1:].split('/')
+
+
+# Dictionnaire d'URL compressé par préfixes (arbre hôte / segments de chemin)
+class DictionnaireUrls:
+    """
+    Chaque URL distincte est un nœud d'un arbre dont les nœuds de premier
+    niveau sont les hôtes et les suivants les segments du chemin : un segment
+    commun à plusieurs URL (hôte, /blog/, /blog/2024/...) n'est stocké qu'une
+    fois, et chaque nœud ne garde que deux entiers (parent, code du segment).
+    Les segments distincts sont concaténés dans un seul bloc d'octets UTF-8
+    (avec le tableau de leurs positions), sans objet Python par segment.
+    Le code d'une URL est sa position dans `urls` (codes d'une colonne
+    catégorielle) ; `noeuds[code]` est le nœud de l'URL.
+
+    Seules les URL y sont stockées. Les mots-clés, sans préfixes communs à
+    partager, sont internés pendant l'extraction (`TamponColonnes`) puis
+    gardés en colonne catégorielle : chaque mot-clé distinct une fois, un
+    code entier par ligne.
+    """
+
+    def __init__(self, urls):
+        segments = []
+        self.parents = array('i')
+        self.codes_segments = array('i')
+        self.profondeurs = array('i')
+        codes_segments, enfants = {}, {}
+        noeuds = array('i')
+
+        for url in urls:
+            hote, chemin = _segments(url)
+            noeud = -1
+            for profondeur, segment in enumerate([hote] + chemin):
+                cle = (noeud, segment)
+                suivant = enfants.get(cle)
+                if suivant is None:
+                    code = codes_segments.get(segment)
+                    if code is None:
+                        code = codes_segments[segment] = len(segments)
+                        segments.append(segment)
+                    suivant = enfants[cle] = len(self.parents)
+                    self.parents.append(noeud)
+                    self.codes_segments.append(code)
+                    self.profondeurs.append(profondeur)
+                noeud = suivant
+            noeuds.append(noeud)
+
+        self.noeuds = np.frombuffer(noeuds, dtype=np.int32) if len(noeuds) else np.zeros(0, dtype=np.int32)
+        encodes = [segment.encode('utf-8') for segment in segments]
+        self.octets = b''.join(encodes)
+        self.positions = np.zeros(len(encodes) + 1, dtype=np.int64)
+        np.cumsum([len(encode) for encode in encodes], out=self.positions[1:])
+
+    def __len__(self):
+        return len(self.noeuds)
+
+    def segment(self, code):
+        return self.octets[self.positions[code]:self.positions[code + 1]].decode('utf-8')
+
+    def url(self, code):
+        """Reconstruit l'URL d'un code."""
+        return self.chemin(int(self.noeuds[code]), repertoire=False)
+
+    def urls(self):
+        """Reconstruit les URL dans l'ordre des codes (chaque répertoire n'est reconstruit qu'une fois)."""
+        repertoires = {}
+        for noeud in self.noeuds:
+            parent = self.parents[noeud]
+            repertoire = repertoires.get(parent)
+            if repertoire is None:
+                repertoire = repertoires[parent] = self.chemin(parent)
+            yield repertoire + self.segment(self.codes_segments[noeud])
+
+    def chemin(self, noeud, repertoire=True):
+        """Chaîne d'un nœud ; un répertoire se termine par '/'."""
+        segments = []
+        while noeud >= 0:
+            segments.append(self.segment(self.codes_segments[noeud]))
+            noeud = self.parents[noeud]
+        segments.reverse()
+        if len(segments) == 1:
+            return segments[0] + '/'
+        return '/'.join(segments) + ('/' if repertoire else '')
+
+    def repertoires(self, profondeur):
+        """
+        Nœud du répertoire de chaque URL (par code), tronqué à `profondeur`
+        segments : 0 pour la racine de l'hôte, 1 pour /blog/, etc. Une URL
+        moins profonde est rattachée à son propre répertoire.
+        """
+        parents = np.frombuffer(self.parents, dtype=np.int32)
+        profondeurs = np.frombuffer(self.profondeurs, dtype=np.int32)
+        # Le répertoire d'une page est le parent de son dernier segment
+        noeuds = parents[self.noeuds]
+        while True:
+            trop_profonds = profondeurs[noeuds] > profondeur
+            if not trop_profonds.any():
+                return noeuds
+            noeuds = np.where(trop_profonds, parents[noeuds], noeuds)
+
+    def taille_octets(self):
+        """Mémoire occupée par le dictionnaire (segments et tableaux de l'arbre)."""
+        return (len(self.octets) + self.positions.nbytes + self.noeuds.nbytes
+                + sum(tableau.itemsize * len(tableau) for tableau in (self.parents, self.codes_segments,
+                                                                        self.profondeurs)))
+
+
+# Cumuls par répertoire et par motif d'URL, précalculés à partir d'un résultat d'extraction
+class CumulsRepertoires:
+    """
+    Les métriques sont d'abord sommées par URL distincte en un seul passage
+    vectorisé sur les lignes (`np.bincount` sur les codes de la colonne
+    catégorielle), puis par répertoire jusqu'à `profondeur_max` : les
+    cumuls par répertoire sont prêts dès l'extraction et les cumuls par
+    motif ne relisent que les URL distinctes, jamais les lignes.
+    Les lignes d'un résultat pages et mots-clés comptent pour leur page.
+    Seuls le dictionnaire d'URL et les sommes par code sont conservés : les
+    URL recherchées par les motifs de section sont reconstruites à la volée.
+    """
+
+    def __init__(self, df, colonne='page', profondeur_max=PROFONDEUR_MAX):
+        pages = df[colonne]
+        if not isinstance(pages.dtype, pd.CategoricalDtype):
+            pages = pages.astype('category')
+        codes = pages.cat.codes.to_numpy()
+        retenues = codes >= 0
+        codes = codes[retenues]
+        self.dictionnaire = DictionnaireUrls(pages.cat.categories)
+        impressions = df['impressions'].to_numpy(dtype=np.float64)[retenues]
+        n = len(self.dictionnaire)
+        self.par_url = {
+            'lignes': np.bincount(codes, minlength=n),
+            'clicks': np.bincount(codes, weights=df['clicks'].to_numpy(dtype=np.float64)[retenues], minlength=n),
+            'impressions': np.bincount(codes, weights=impressions, minlength=n),
+            '_position_ponderee': np.bincount(
+                codes, weights=df['position'].to_numpy(dtype=np.float64)[retenues] * impressions, minlength=n),
+        }
+        self.profondeur_max = profondeur_max
+        self.lock = threading.Lock()
+        self.motifs = {}
+        self.cumuls = {
+            profondeur: self._cumuler(self.dictionnaire.repertoires(profondeur), self.dictionnaire.chemin, 'repertoire')
+            for profondeur in range(profondeur_max + 1)
+        }
+
+    # Fonction pour cumuler les sommes par URL selon un groupe par URL
+    def _cumuler(self, groupes, libelle, nom):
+        valeurs, inverse = np.unique(groupes, return_inverse=True)
+        df = pd.DataFrame({nom: [libelle(valeur) for valeur in valeurs]})
+        # Seules les URL présentes dans les lignes comptent (une catégorie peut être inutilisée)
+        df['pages'] = np.bincount(inverse, weights=self.par_url['lignes'] > 0, minlength=len(valeurs)).astype('int64')
+        for cle, sommes in self.par_url.items():
+            df[cle] = np.bincount(inverse, weights=sommes, minlength=len(valeurs))
+        df['lignes'] = df['lignes'].astype('int64')
+        df['clicks'] = df['clicks'].astype('int64')
+        df['impressions'] = df['impressions'].astype('int64')
+        df['ctr'] = (df['clicks'] / df['impressions']).where(df['impressions'] > 0, 0.0)
+        df['position'] = (df['_position_ponderee'] / df['impressions']).where(df['impressions'] > 0, 0.0)
+        df = df.sort_values(['clicks', 'impressions'], ascending=False, ignore_index=True)
+        return df[[nom, 'pages', 'lignes', 'clicks', 'impressions', 'ctr', 'position']]
+
+    def repertoires(self, profondeur=1):
+        """Métriques par répertoire à `profondeur` (voir `DictionnaireUrls.repertoires`), déjà calculées."""
+        if profondeur not in self.cumuls:
+            raise ValueError(f"Profondeur non précalculée (0 à {self.profondeur_max}) : {profondeur}")
+        return self.cumuls[profondeur]
+
+    def sections(self, motifs):
+        """
+        Métriques par section : `motifs` associe un nom de section à une
+        expression régulière recherchée dans l'URL (ex. {'blog': '/blog/',
+        'produits': '/produits/'}). Chaque URL compte pour la première
+        section qui lui correspond, ou pour `SECTION_AUTRES`. Lève `re.error`
+        si une expression est invalide.
+        """
+        cle = tuple(motifs.items())
+        with self.lock:
+            if cle in self.motifs:
+                return self.motifs[cle]
+
+        noms = list(motifs) + [SECTION_AUTRES]
+        expressions = [re.compile(motif) for motif in motifs.values()]
+        groupes = np.full(len(self.dictionnaire), len(motifs), dtype=np.int32)
+        for code, url in enumerate(self.dictionnaire.urls()):
+            for i, expression in enumerate(expressions):
+                if expression.search(url):
+                    groupes[code] = i
+                    break
+        df = self._cumuler(groupes, noms.__getitem__, 'section')
+
+        with self.lock:
+            self.motifs[cle] = df
+        return df
@@ -0,0 +1,306 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+from functools import partial
+
+import pandas as pd
+
+from .cache import DOSSIER_CACHE
+from .colonnes import TamponColonnes
+from .identifiants import PoolIdentifiants
+from .moteur import (DECOUPAGE, LIGNES_APERCU, LIGNES_MAX_REQUETE, MAX_WORKERS, NOMS_COLONNES, ROW_LIMIT, Decoupage,
+                     _agreger, _decouper, _executer_shards, _format_date, _paginer_shard, _precharger_shards,
+                     _premiere_page, _repartir, _service_extraction, filtre, generer_shards, options_requete)
+from .planificateur import planifier
+from .transport import TAILLE_LOT
+
+DOSSIER_TRAVAUX = os.path.join(DOSSIER_CACHE, 'travaux')
+
+
+# Fonction pour calculer l'identifiant d'un travail à partir de ses paramètres
+def identifiant_travail(site_url, start_date, end_date, dimensions, granularite):
+    """Relancer la même extraction donne le même identifiant, et donc la reprend."""
+    parametres = json.dumps([site_url, _format_date(start_date), _format_date(end_date), dimensions, granularite])
+    return hashlib.sha1(parametres.encode('utf-8')).hexdigest()[:12]
+
+
+# Fonction pour nommer une tranche dans le manifeste et les fichiers de pages
+def _cle_tranche(debut, fin, filtres=()):
+    """`filtres` : liste de [dimension, valeur] (tranches par appareil ou par pays)."""
+    return '_'.join([debut, fin] + [str(valeur).lower() for _, valeur in filtres])
+
+
+# Fonction pour décrire une tranche du manifeste
+def _nouvelle_tranche(debut, fin, filtres, decoupage):
+    return {'debut': debut, 'fin': fin, 'filtres': filtres, 'decoupage': list(decoupage), 'start_row': 0,
+            'terminee': False}
+
+
+# Travail d'extraction avec points de reprise sur disque
+class Travail:
+    """
+    Un travail est un dossier `<DOSSIER_TRAVAUX>/<identifiant>` contenant :
+    - `manifeste.json` : paramètres de l'extraction et, pour chaque tranche,
+      ses filtres, la prochaine valeur de startRow et si la tranche est
+      terminée ;
+    - `parties/` : un fichier Parquet par page de résultats déjà reçue.
+    Le manifeste est réécrit de façon atomique après chaque page. Une tranche
+    tronquée par l'API est remplacée dans le manifeste par ses sous-tranches
+    (voir `decouper_tranche`), que la reprise retrouve.
+    Avec `granularite='auto'`, les tranches sont celles du plan calculé à la
+    création du travail (voir `planifier`), conservé dans `plan`.
+    """
+
+    def __init__(self, identifiant, dossier=DOSSIER_TRAVAUX):
+        self.identifiant = identifiant
+        self.dossier = os.path.join(dossier, identifiant)
+        self.dossier_parties = os.path.join(self.dossier, 'parties')
+        self.chemin_manifeste = os.path.join(self.dossier, 'manifeste.json')
+        self.lock = threading.Lock()
+        self.manifeste = None
+        self.plan = None
+
+    @classmethod
+    def creer_ou_reprendre(cls, site_url, start_date, end_date, dimensions, granularite='day',
+                           identifiant=None, dossier=DOSSIER_TRAVAUX, planifier=None):
+        """`planifier` : fonction sans argument renvoyant le `Plan` du travail, appelée seulement à sa création."""
+        identifiant = identifiant or identifiant_travail(site_url, start_date, end_date, dimensions, granularite)
+        travail = cls(identifiant, dossier)
+        if os.path.exists(travail.chemin_manifeste):
+            with open(travail.chemin_manifeste, encoding='utf-8') as fichier:
+                travail.manifeste = json.load(fichier)
+        else:
+            if granularite == 'auto':
+                travail.plan = planifier()
+                tranches = [
+                    _nouvelle_tranche(t['debut'], t['fin'], [['device', t['appareil']]],
+                                      [axe for axe in DECOUPAGE if axe != 'device'])
+                    if t['appareil'] else _nouvelle_tranche(t['debut'], t['fin'], [], DECOUPAGE)
+                    for t in travail.plan.tranches
+                ]
+            else:
+                tranches = [_nouvelle_tranche(debut, fin, [], DECOUPAGE)
+                            for debut, fin in generer_shards(start_date, end_date, granularite)]
+            os.makedirs(travail.dossier_parties, exist_ok=True)
+            travail.manifeste = {
+                'site': site_url,
+                'debut': _format_date(start_date),
+                'fin': _format_date(end_date),
+                'dimensions': dimensions,
+                'granularite': granularite,
+                'tranches': {_cle_tranche(t['debut'], t['fin'], t['filtres']): t for t in tranches},
+            }
+            travail._sauvegarder()
+        return travail
+
+    @property
+    def tranches_restantes(self):
+        return [t for t in self.manifeste['tranches'].values() if not t['terminee']]
+
+    @property
+    def lignes(self):
+        """Lignes déjà écrites, hors tranches remplacées par leurs sous-tranches."""
+        return sum(t['start_row'] for t in self.manifeste['tranches'].values() if not t.get('decoupee'))
+
+    @property
+    def est_repris(self):
+        """Vrai si une partie des données a déjà été récupérée lors d'une exécution précédente."""
+        return any(t['terminee'] or t['start_row'] for t in self.manifeste['tranches'].values())
+
+    def _sauvegarder(self):
+        temporaire = self.chemin_manifeste + '.tmp'
+        with open(temporaire, 'w', encoding='utf-8') as fichier:
+            json.dump(self.manifeste, fichier)
+        os.replace(temporaire, self.chemin_manifeste)
+
+    def enregistrer_page(self, tranche, start_row, df):
+        """Écrit une page sur disque puis avance le point de reprise de la tranche."""
+        nom = f"{_cle_tranche(tranche['debut'], tranche['fin'], tranche.get('filtres', []))}_{start_row:09d}.parquet"
+        temporaire = os.path.join(self.dossier_parties, nom + '.tmp')
+        df.to_parquet(temporaire, index=False)
+        os.replace(temporaire, os.path.join(self.dossier_parties, nom))
+        with self.lock:
+            tranche['start_row'] = start_row + len(df)
+            self._sauvegarder()
+
+    def terminer_tranche(self, tranche):
+        with self.lock:
+            tranche['terminee'] = True
+            self._sauvegarder()
+
+    def decouper_tranche(self, tranche, parties):
+        """
+        Remplace une tranche tronquée par ses sous-tranches (parties de
+        `_decouper`) et renvoie celles-ci. Les pages déjà écrites de la
+        tranche ne sont plus lues ; elles sont supprimées une fois le
+        manifeste enregistré.
+        """
+        cle = _cle_tranche(tranche['debut'], tranche['fin'], tranche.get('filtres', []))
+        sous_tranches = []
+        for debut, fin, options, reste in parties:
+            filtres = (options or {}).get('dimensionFilterGroups', [{}])[0].get('filters', [])
+            sous_tranches.append(_nouvelle_tranche(debut, fin, [[f['dimension'], f['expression']] for f in filtres],
+                                                   reste))
+        with self.lock:
+            tranche['terminee'] = tranche['decoupee'] = True
+            for sous_tranche in sous_tranches:
+                self.manifeste['tranches'][_cle_tranche(sous_tranche['debut'], sous_tranche['fin'],
+                                                        sous_tranche['filtres'])] = sous_tranche
+            self._sauvegarder()
+        for nom in os.listdir(self.dossier_parties):
+            if nom.rsplit('_', 1)[0] == cle:
+                os.remove(os.path.join(self.dossier_parties, nom))
+        return sous_tranches
+
+    def lire_parties(self):
+        """Renvoie toutes les lignes déjà écrites (colonnes de clés et sommes)."""
+        # Les pages d'une tranche découpée (interruption avant leur suppression) sont ignorées
+        decoupees = {_cle_tranche(t['debut'], t['fin'], t.get('filtres', []))
+                     for t in self.manifeste['tranches'].values() if t.get('decoupee')}
+        fichiers = sorted(f for f in os.listdir(self.dossier_parties)
+                          if f.endswith('.parquet') and f.rsplit('_', 1)[0] not in decoupees)
+        if not fichiers:
+            return pd.DataFrame()
+        return pd.concat([pd.read_parquet(os.path.join(self.dossier_parties, f)) for f in fichiers],
+                         ignore_index=True)
+
+    def supprimer(self):
+        shutil.rmtree(self.dossier, ignore_errors=True)
+
+
+# Fonction pour lister les travaux interrompus
+def lister_travaux(dossier=DOSSIER_TRAVAUX):
+    travaux = []
+    if not os.path.isdir(dossier):
+        return travaux
+    for identifiant in sorted(os.listdir(dossier)):
+        chemin = os.path.join(dossier, identifiant, 'manifeste.json')
+        if os.path.exists(chemin):
+            with open(chemin, encoding='utf-8') as fichier:
+                manifeste = json.load(fichier)
+            tranches = manifeste['tranches'].values()
+            travaux.append({
+                'identifiant': identifiant,
+                'site': manifeste['site'],
+                'debut': manifeste['debut'],
+                'fin': manifeste['fin'],
+                'dimensions': manifeste['dimensions'],
+                'tranches_terminees': sum(t['terminee'] for t in tranches),
+                'tranches': len(tranches),
+            })
+    return travaux
+
+
+# Fonction pour obtenir les paramètres de requête d'une tranche (filtres par appareil ou par pays)
+def _options_tranche(tranche):
+    if tranche.get('filtres'):
+        return options_requete([filtre(dimension, valeur) for dimension, valeur in tranche['filtres']])
+    return None
+
+
+# Extraction avec points de reprise
+def extraire_reprenable(service, site_url, start_date, end_date, dimensions, granularite='day',
+                        identifiant=None, max_workers=MAX_WORKERS, row_limit=ROW_LIMIT, cache=None,
+                        taille_lot=TAILLE_LOT, conserver=False, on_progress=None, on_error=None, on_apercu=None):
+    """
+    Comme `extraire_donnees`, mais chaque page est écrite sur disque et un
+    point de reprise est enregistré. Si l'extraction est interrompue, la
+    relancer avec les mêmes paramètres (ou le même `identifiant`) ne
+    redemande que les pages manquantes. Une tranche tronquée par l'API est
+    redécoupée par jour, appareil puis pays, et ses sous-tranches sont
+    enregistrées dans le manifeste.
+
+    Renvoie (DataFrame, travail). Le dossier du travail est supprimé si toutes
+    les tranches ont abouti, sauf si `conserver` est vrai. `on_apercu` reçoit
+    les premières lignes reçues, comme pour `extraire_donnees`. `service` peut
+    être un `PoolIdentifiants`. Avec `granularite='auto'`, le découpage est
+    planifié à la création du travail et conservé en cas de reprise.
+    """
+    colonnes_cles = [NOMS_COLONNES.get(d, d) for d in dimensions]
+    pool = service if isinstance(service, PoolIdentifiants) else None
+    premiere = None
+    with _service_extraction(service, site_url) as service:
+        travail = Travail.creer_ou_reprendre(
+            site_url, start_date, end_date, dimensions, granularite, identifiant,
+            planifier=partial(planifier, service, site_url, start_date, end_date, dimensions, None, cache, row_limit))
+        tranches = travail.tranches_restantes
+        # Seules les tranches jamais commencées ont leur première page à précharger
+        nouvelles = [(t['debut'], t['fin'], _options_tranche(t)) for t in tranches if t['start_row'] == 0]
+        if on_apercu is not None and nouvelles:
+            debut, fin, options_tranche = nouvelles[0]
+            premiere = _premiere_page(service, site_url, debut, fin, dimensions, row_limit, cache, options_tranche,
+                                      on_apercu)
+            if premiere is not None and premiere[1].get('rows'):
+                on_apercu = None
+        cache = _precharger_shards(service, site_url, nouvelles[1:] if premiere else nouvelles, dimensions,
+                                   row_limit, cache, max_workers, taille_lot)
+    if premiere is not None:
+        cache.ajouter(site_url, *premiere)
+
+    premieres_pages = []
+
+    def enregistrer_page(tranche, rows):
+        tampon = TamponColonnes(len(dimensions))
+        tampon.ajouter_page(rows)
+        df_page = tampon.vers_dataframe(colonnes_cles)
+        if not premieres_pages:
+            premieres_pages.append(df_page)
+        travail.enregistrer_page(tranche, tranche['start_row'], df_page)
+
+    def extraire_tranche(service, tranche):
+        options_tranche = _options_tranche(tranche)
+        _paginer_shard(service, site_url, tranche['debut'], tranche['fin'], dimensions, row_limit, cache,
+                       partial(enregistrer_page, tranche), start_row=tranche['start_row'], options=options_tranche)
+        if tranche['start_row'] < LIGNES_MAX_REQUETE:
+            return tranche
+        # Tranche tronquée par l'API : redécoupée comme dans `extraire_donnees`
+        parties = _decouper(service, site_url, tranche['debut'], tranche['fin'], row_limit, cache, options_tranche,
+                            tuple(tranche.get('decoupage', DECOUPAGE)))
+        if not parties:
+            return tranche
+        return Decoupage(partial(extraire_tranche, service, sous_tranche)
+                         for sous_tranche in travail.decouper_tranche(tranche, parties))
+
+    lignes = travail.lignes
+
+    def sur_resultat(tranche):
+        nonlocal on_apercu
+        travail.terminer_tranche(tranche)
+        if on_apercu is not None and premieres_pages:
+            on_apercu(_agreger(premieres_pages[0], colonnes_cles).head(LIGNES_APERCU))
+            on_apercu = None
+        return travail.lignes
+
+    erreurs = []
+
+    def _on_error(e):
+        erreurs.append(e)
+        if on_error is None:
+            raise e
+        on_error(e)
+
+    nb_terminees = len(travail.manifeste['tranches']) - len(tranches)
+    progression = None
+    if on_progress:
+        def progression(terminees, total, lignes_courantes):
+            on_progress(nb_terminees + terminees, nb_terminees + total, lignes_courantes or lignes)
+
+    taches = [partial(extraire_tranche, service, tranche) for tranche in tranches]
+    if pool is not None:
+        taches = [_repartir(pool, site_url, tache) for tache in taches]
+    if travail.plan is not None:
+        # Travail créé à l'instant : ses tranches sont celles du plan, dans le même ordre
+        taches = [travail.plan.suivre(i, tache, compter=lambda t: t['start_row']) for i, tache in enumerate(taches)]
+    try:
+        _executer_shards(taches, max_workers, sur_resultat, progression, _on_error)
+    finally:
+        cache.arreter()
+    if travail.plan is not None:
+        travail.plan.enregistrer()
+
+    df = _agreger(travail.lire_parties(), colonnes_cles)
+    if not erreurs and not conserver:
+        travail.supprimer()
+    return df, travail
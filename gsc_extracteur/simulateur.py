@@ -0,0 +1,258 @@
+"""
+Serveur local imitant l'API Search Console, pour tester et mesurer
+l'extraction sans quota ni réseau :
+
+    with SimulateurSearchConsole(lignes_par_jour=20000, latence=0.05) as simulateur:
+        service = service_simule(simulateur.url)
+        df = extraire_donnees(service, simulateur.proprietes[0], '2024-01-01', '2024-01-31', ['page'])
+
+Seuls `sites.list`, `searchanalytics.query` et les requêtes groupées (batch)
+sont servis. Les lignes sont synthétiques mais déterministes : la même
+requête renvoie toujours les mêmes lignes.
+"""
+
+import datetime
+import email.parser
+import json
+import random
+import threading
+import time
+import urllib.parse
+import uuid
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+LIGNES_MAX = 50000  # Nombre maximal de lignes servies par requête, comme l'API
+PREFIXE = '/webmasters/v3/sites'
+
+# Valeurs des dimensions synthétiques (cardinalité de chaque dimension)
+PAYS = ['fra', 'bel', 'che', 'can', 'usa', 'gbr', 'deu', 'esp', 'ita', 'mar']
+APPAREILS = ['DESKTOP', 'MOBILE', 'TABLET']
+APPARENCES = ['AMP_BLUE_LINK', 'REVIEW_SNIPPET', 'VIDEO', 'FAQ_RICH_RESULT', 'PRODUCT_SNIPPETS']
+NB_PAGES = 20000
+NB_REQUETES = 200000
+
+_MULTIPLICATEUR = 2654435761  # Nombre premier : i -> (i * M + d) % n est une permutation de [0, n)
+
+
+# Serveur HTTP imitant l'API Search Console
+class SimulateurSearchConsole:
+    """
+    - `lignes_par_jour` : nombre de lignes disponibles par jour de la période ;
+    - `latence` : délai (secondes) ajouté à chaque requête HTTP, groupée ou non ;
+    - `taux_429` : proportion de requêtes refusées pour dépassement de quota ;
+    - `lignes_max` : troncature des résultats d'une requête, comme l'API ;
+    - `graine` : rend l'injection des erreurs 429 reproductible.
+    Les filtres sont simulés approximativement : chaque filtre divise le
+    nombre de lignes (par la cardinalité de la dimension pour `equals`).
+    """
+
+    def __init__(self, lignes_par_jour=10000, latence=0.0, taux_429=0.0, lignes_max=LIGNES_MAX,
+                 proprietes=('https://www.exemple.fr/',), graine=0, port=0):
+        self.lignes_par_jour = lignes_par_jour
+        self.latence = latence
+        self.taux_429 = taux_429
+        self.lignes_max = lignes_max
+        self.proprietes = list(proprietes)
+        self.hasard = random.Random(graine)
+        self.lock = threading.Lock()
+        self.statistiques = {'requetes_http': 0, 'requetes': 0, 'refus_429': 0, 'lignes': 0}
+        self.serveur = ThreadingHTTPServer(('127.0.0.1', port), _gestionnaire(self))
+        self.serveur.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.serveur.server_address[1]}/"
+
+    def demarrer(self):
+        self.thread = threading.Thread(target=self.serveur.serve_forever, name='simulateur-gsc', daemon=True)
+        self.thread.start()
+        return self
+
+    def arreter(self):
+        self.serveur.shutdown()
+        self.serveur.server_close()
+
+    def __enter__(self):
+        return self.demarrer()
+
+    def __exit__(self, *exc):
+        self.arreter()
+
+    def _compter(self, cle, n=1):
+        with self.lock:
+            self.statistiques[cle] += n
+
+    # Réponse à une requête de l'API (hors requête groupée) : (code HTTP, corps JSON)
+    def repondre(self, methode, chemin, corps):
+        self._compter('requetes')
+        chemin = urllib.parse.urlsplit(chemin).path
+        if self.taux_429:
+            with self.lock:
+                refus = self.hasard.random() < self.taux_429
+            if refus:
+                self._compter('refus_429')
+                return 429, _erreur(429, 'Quota exceeded for quota metric', 'RESOURCE_EXHAUSTED', 'rateLimitExceeded')
+
+        if methode == 'GET' and chemin.rstrip('/') == PREFIXE:
+            return 200, {'siteEntry': [{'siteUrl': p, 'permissionLevel': 'siteOwner'} for p in self.proprietes]}
+
+        if methode == 'POST' and chemin.startswith(PREFIXE + '/') and chemin.endswith('/searchAnalytics/query'):
+            site_url = urllib.parse.unquote(chemin[len(PREFIXE) + 1:-len('/searchAnalytics/query')])
+            if site_url not in self.proprietes:
+                return 403, _erreur(403, f"User does not have sufficient permission for site '{site_url}'.",
+                                    'PERMISSION_DENIED', 'forbidden')
+            rows = self.lignes(site_url, json.loads(corps or b'{}'))
+            self._compter('lignes', len(rows))
+            return 200, ({'rows': rows, 'responseAggregationType': 'byPage'} if rows else
+                         {'responseAggregationType': 'byPage'})
+
+        return 404, _erreur(404, f"Not found: {chemin}", 'NOT_FOUND', 'notFound')
+
+    # Fonction pour générer les lignes d'une requête searchanalytics.query
+    def lignes(self, site_url, body):
+        debut = datetime.date.fromisoformat(body['startDate'])
+        fin = datetime.date.fromisoformat(body['endDate'])
+        jours = (fin - debut).days + 1
+        dimensions = body.get('dimensions', [])
+        cardinalites = [_cardinalite(d, jours) for d in dimensions]
+
+        combinaisons = 1
+        for cardinalite in cardinalites:
+            combinaisons *= cardinalite
+        disponibles = self.lignes_par_jour * jours
+        for groupe in body.get('dimensionFilterGroups', []):
+            for f in groupe.get('filters', []):
+                disponibles //= _cardinalite(f['dimension'], jours) if f.get('operator', 'equals') == 'equals' else 2
+        total = min(disponibles, combinaisons, self.lignes_max)
+
+        start_row = body.get('startRow', 0)
+        fin_page = min(total, start_row + body.get('rowLimit', 1000))
+        decalage = zlib.crc32(json.dumps([site_url, body['startDate'], body.get('type', 'web')]).encode())
+        rows = []
+        for i in range(start_row, fin_page):
+            j = (i * _MULTIPLICATEUR + decalage) % combinaisons
+            keys = []
+            # Décomposition de j en une valeur par dimension (bijection : clés toutes distinctes)
+            for dimension, cardinalite in zip(dimensions, cardinalites):
+                j, indice = divmod(j, cardinalite)
+                keys.append(_valeur(dimension, indice, debut, site_url))
+            impressions = 1 + (i * 7919 + decalage) % 1000
+            clicks = impressions * ((i + decalage) % 13) // 100
+            rows.append({
+                'keys': keys,
+                'clicks': clicks,
+                'impressions': impressions,
+                'ctr': clicks / impressions,
+                'position': 1 + (i * 31 + decalage) % 997 / 10,
+            })
+        return rows
+
+    # Réponse à une requête groupée (multipart/mixed)
+    def repondre_lot(self, type_contenu, corps):
+        message = email.parser.BytesParser().parsebytes(
+            b'Content-Type: ' + type_contenu.encode() + b'\r\n\r\n' + corps)
+        frontiere = uuid.uuid4().hex
+        parties = []
+        for partie in message.get_payload():
+            requete = partie.get_payload()
+            if isinstance(requete, list):
+                requete = requete[0].as_string()
+            entete, _, corps_requete = requete.replace('\r\n', '\n').partition('\n\n')
+            methode, chemin = entete.split('\n', 1)[0].split(' ')[:2]
+            code, reponse = self.repondre(methode, chemin, corps_requete.encode())
+            identifiant = partie['Content-ID'].strip('<>')
+            contenu = json.dumps(reponse)
+            parties.append(
+                f"--{frontiere}\r\nContent-Type: application/http\r\nContent-ID: <response-{identifiant}>\r\n\r\n"
+                f"HTTP/1.1 {code} {_RAISONS.get(code, 'Error')}\r\nContent-Type: application/json; charset=UTF-8\r\n"
+                f"Content-Length: {len(contenu.encode())}\r\n\r\n{contenu}\r\n"
+            )
+        return f"multipart/mixed; boundary={frontiere}", (''.join(parties) + f"--{frontiere}--\r\n").encode()
+
+
+_RAISONS = {200: 'OK', 403: 'Forbidden', 404: 'Not Found', 429: 'Too Many Requests'}
+
+
+# Fonction pour construire un corps d'erreur au format de l'API Google
+def _erreur(code, message, statut, raison):
+    return {'error': {'code': code, 'message': message, 'status': statut,
+                      'errors': [{'message': message, 'domain': 'usageLimits', 'reason': raison}]}}
+
+
+def _cardinalite(dimension, jours):
+    return {
+        'page': NB_PAGES,
+        'query': NB_REQUETES,
+        'date': jours,
+        'country': len(PAYS),
+        'device': len(APPAREILS),
+        'searchAppearance': len(APPARENCES),
+    }.get(dimension, 10)
+
+
+def _valeur(dimension, indice, debut, site_url):
+    if dimension == 'page':
+        return f"{site_url}rubrique-{indice % 40}/page-{indice}"
+    if dimension == 'query':
+        return f"mot clé {indice}"
+    if dimension == 'date':
+        return (debut + datetime.timedelta(days=indice)).isoformat()
+    if dimension == 'country':
+        return PAYS[indice]
+    if dimension == 'device':
+        return APPAREILS[indice]
+    if dimension == 'searchAppearance':
+        return APPARENCES[indice]
+    return f"{dimension}-{indice}"
+
+
+# Fonction pour créer le gestionnaire de requêtes HTTP lié à un simulateur
+def _gestionnaire(simulateur):
+    class Gestionnaire(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # Connexions persistantes, comme l'API
+
+        def _traiter(self, methode):
+            simulateur._compter('requetes_http')
+            corps = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+            if simulateur.latence:
+                time.sleep(simulateur.latence)
+            if methode == 'POST' and urllib.parse.urlsplit(self.path).path == '/batch':
+                type_contenu, contenu = simulateur.repondre_lot(self.headers['Content-Type'], corps)
+                code = 200
+            else:
+                code, reponse = simulateur.repondre(methode, self.path, corps)
+                type_contenu, contenu = 'application/json; charset=UTF-8', json.dumps(reponse).encode()
+            self.send_response(code)
+            self.send_header('Content-Type', type_contenu)
+            self.send_header('Content-Length', str(len(contenu)))
+            self.end_headers()
+            self.wfile.write(contenu)
+
+        def do_GET(self):
+            self._traiter('GET')
+
+        def do_POST(self):
+            self._traiter('POST')
+
+        def log_message(self, format, *args):
+            pass
+
+    return Gestionnaire
+
+
+# Fonction pour construire un client de l'API pointant vers le simulateur
+def service_simule(url):
+    """
+    Utilise le document de découverte fourni avec google-api-python-client,
+    avec `rootUrl` remplacé par l'adresse du simulateur (requêtes groupées comprises).
+    """
+    from google.oauth2.credentials import Credentials
+    from googleapiclient.discovery import build_from_document
+    from googleapiclient.discovery_cache import get_static_doc
+
+    document = json.loads(get_static_doc('searchconsole', 'v1'))
+    document['rootUrl'] = url
+    document['baseUrl'] = url
+    return build_from_document(document, credentials=Credentials(token='simulation'))
@@ -0,0 +1,133 @@
+import datetime
+import os
+import sqlite3
+import threading
+
+import pandas as pd
+
+from .cache import DELAI_FINALISATION, DOSSIER_CACHE
+from .moteur import extraire_donnees
+
+JOURS_INITIAUX = 30  # Période extraite lors de la première synchronisation d'une propriété
+
+
+# Entrepôt local des données synchronisées
+class Entrepot:
+    """
+    Base SQLite contenant une table de lignes journalières par jeu de dimensions
+    (ex. `donnees_page_query`) et, pour chaque propriété, la dernière date
+    complète (finalisée) déjà enregistrée.
+    """
+
+    def __init__(self, chemin=None):
+        if chemin is None:
+            os.makedirs(DOSSIER_CACHE, exist_ok=True)
+            chemin = os.path.join(DOSSIER_CACHE, 'entrepot.sqlite')
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(chemin, check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS synchronisation (
+                site TEXT,
+                dimensions TEXT,
+                derniere_date_complete TEXT,
+                mise_a_jour TEXT,
+                PRIMARY KEY (site, dimensions)
+            )
+        """)
+        self.conn.commit()
+
+    @staticmethod
+    def table(dimensions):
+        return 'donnees_' + '_'.join(dimensions)
+
+    def derniere_date_complete(self, site_url, dimensions):
+        with self.lock:
+            ligne = self.conn.execute(
+                "SELECT derniere_date_complete FROM synchronisation WHERE site = ? AND dimensions = ?",
+                (site_url, ','.join(dimensions))).fetchone()
+        return datetime.date.fromisoformat(ligne[0]) if ligne and ligne[0] else None
+
+    def remplacer(self, site_url, dimensions, df, debut, derniere_date_complete):
+        """Remplace les lignes de la propriété à partir de `debut` et met à jour la date complète."""
+        table = self.table(dimensions)
+        with self.lock:
+            if self._table_existe(table):
+                self.conn.execute(f'DELETE FROM "{table}" WHERE site = ? AND date >= ?',
+                                  (site_url, debut.isoformat()))
+            if not df.empty:
+                df.assign(site=site_url).to_sql(table, self.conn, if_exists='append', index=False)
+            self.conn.execute(
+                "INSERT OR REPLACE INTO synchronisation VALUES (?, ?, ?, ?)",
+                (site_url, ','.join(dimensions),
+                 derniere_date_complete.isoformat() if derniere_date_complete else None,
+                 datetime.datetime.now().isoformat(timespec='seconds')))
+            self.conn.commit()
+
+    def lire(self, site_url, dimensions, debut=None, fin=None):
+        """Renvoie les lignes journalières enregistrées pour une propriété."""
+        table = self.table(dimensions)
+        with self.lock:
+            if not self._table_existe(table):
+                return pd.DataFrame()
+            requete = f'SELECT * FROM "{table}" WHERE site = ? AND date >= ? AND date <= ? ORDER BY date'
+            df = pd.read_sql_query(requete, self.conn, params=(
+                site_url,
+                debut.isoformat() if debut else '0000-00-00',
+                fin.isoformat() if fin else '9999-99-99'))
+        return df.drop(columns=['site'])
+
+    def _table_existe(self, table):
+        return self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone() is not None
+
+
+# Fonction de synchronisation incrémentale d'une propriété
+def synchroniser(service, site_url, dimensions, entrepot, date_fin=None,
+                 jours_initiaux=JOURS_INITIAUX, cache=None, on_progress=None, on_error=None):
+    """
+    Extrait uniquement les jours absents de l'entrepôt, plus les jours pas
+    encore finalisés (les `DELAI_FINALISATION` derniers jours), et les ajoute
+    à l'entrepôt sous forme de lignes journalières (colonne `date`).
+    Si une tranche échoue, la date complète n'avance pas : la période sera
+    réextraite à la prochaine synchronisation.
+    Renvoie un résumé de la synchronisation.
+    """
+    aujourd_hui = datetime.date.today()
+    if date_fin is None:
+        date_fin = aujourd_hui - datetime.timedelta(days=1)
+
+    derniere = entrepot.derniere_date_complete(site_url, dimensions)
+    if derniere is None:
+        debut = date_fin - datetime.timedelta(days=jours_initiaux - 1)
+    else:
+        debut = derniere + datetime.timedelta(days=1)
+
+    if debut > date_fin:
+        return {'site': site_url, 'debut': None, 'fin': None, 'jours': 0, 'lignes': 0, 'erreurs': 0}
+
+    erreurs = []
+
+    def _on_error(e):
+        erreurs.append(e)
+        if on_error is not None:
+            on_error(e)
+
+    dimensions_jour = ['date'] + [d for d in dimensions if d != 'date']
+    df = extraire_donnees(service, site_url, debut, date_fin, dimensions_jour, granularite='day',
+                          cache=cache, on_progress=on_progress, on_error=_on_error)
+
+    # Seuls les jours finalisés comptent comme complets : les suivants seront réextraits
+    derniere_complete = derniere
+    if not erreurs:
+        derniere_finalisee = aujourd_hui - datetime.timedelta(days=DELAI_FINALISATION)
+        derniere_complete = max(min(date_fin, derniere_finalisee), derniere or debut - datetime.timedelta(days=1))
+
+    entrepot.remplacer(site_url, dimensions, df, debut, derniere_complete)
+    return {
+        'site': site_url,
+        'debut': debut,
+        'fin': date_fin,
+        'jours': (date_fin - debut).days + 1,
+        'lignes': len(df),
+        'erreurs': len(erreurs),
+    }
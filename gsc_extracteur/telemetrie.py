@@ -0,0 +1,231 @@
+import bisect
+import json
+import sys
+import threading
+import time
+
+BORNES_LATENCE = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)  # Secondes
+BORNES_LIGNES = (0, 10, 100, 1000, 5000, 10000, 25000)  # Lignes par page de résultats
+
+
+# Fonction pour lire le pic de mémoire (RSS) du processus courant, en octets
+def pic_memoire():
+    try:
+        import resource
+    except ImportError:
+        # Windows
+        return None
+    pic = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilo-octets sous Linux, octets sous macOS
+    return pic if sys.platform == 'darwin' else pic * 1024
+
+
+# Histogramme à bornes fixes, au format des métriques Prometheus/OpenMetrics
+class Histogramme:
+
+    def __init__(self, bornes):
+        self.bornes = bornes
+        self.comptes = [0] * (len(bornes) + 1)
+        self.somme = 0.0
+        self.nombre = 0
+
+    def observer(self, valeur):
+        self.comptes[bisect.bisect_left(self.bornes, valeur)] += 1
+        self.somme += valeur
+        self.nombre += 1
+
+    def quantile(self, q):
+        """Borne supérieure de l'intervalle contenant le quantile `q` (None si vide ou au-delà des bornes)."""
+        if not self.nombre:
+            return None
+        rang = q * self.nombre
+        cumul = 0
+        for borne, compte in zip(self.bornes, self.comptes):
+            cumul += compte
+            if cumul >= rang:
+                return borne
+        return None
+
+    def vers_dict(self):
+        return {
+            'bornes': list(self.bornes),
+            'comptes': list(self.comptes),
+            'somme': self.somme,
+            'nombre': self.nombre,
+        }
+
+
+# Mesures de toutes les extractions du processus
+class Telemetrie:
+    """
+    Compteurs thread-safe alimentés par le moteur : durée de chaque appel à
+    l'API, lignes par page, nouvelles tentatives et temps d'attente associé,
+    réponses servies par le cache, octets produits par chaque export.
+    `instantane()` en donne un résumé (JSON), `vers_openmetrics()` le format
+    texte lu par Prometheus.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reinitialiser()
+
+    def reinitialiser(self):
+        with self.lock:
+            self.debut = None
+            self.latences = Histogramme(BORNES_LATENCE)
+            self.lignes_par_page = Histogramme(BORNES_LIGNES)
+            self.requetes = {'succes': 0, 'echec': 0}
+            self.nouvelles_tentatives = 0
+            self.attente_reprises = 0.0
+            self.cache = {'trouvees': 0, 'absentes': 0}
+            self.exports = {}
+
+    def _demarrer(self):
+        if self.debut is None:
+            self.debut = time.monotonic()
+
+    def enregistrer_requete(self, duree, succes=True):
+        with self.lock:
+            self._demarrer()
+            self.latences.observer(duree)
+            self.requetes['succes' if succes else 'echec'] += 1
+
+    def enregistrer_page(self, lignes):
+        with self.lock:
+            self._demarrer()
+            self.lignes_par_page.observer(lignes)
+
+    def enregistrer_nouvelle_tentative(self, attente):
+        with self.lock:
+            self.nouvelles_tentatives += 1
+            self.attente_reprises += attente
+
+    def enregistrer_cache(self, trouvee):
+        with self.lock:
+            self.cache['trouvees' if trouvee else 'absentes'] += 1
+
+    def enregistrer_export(self, format_export, octets, duree):
+        with self.lock:
+            export = self.exports.setdefault(format_export, {'nombre': 0, 'octets': 0, 'duree': 0.0})
+            export['nombre'] += 1
+            export['octets'] += octets
+            export['duree'] += duree
+
+    def instantane(self):
+        """Renvoie un résumé sérialisable en JSON de toutes les mesures."""
+        with self.lock:
+            duree = time.monotonic() - self.debut if self.debut is not None else 0.0
+            lignes = self.lignes_par_page.somme
+            return {
+                'duree': round(duree, 3),
+                'requetes': dict(self.requetes),
+                'latence': {
+                    'p50': self.latences.quantile(0.5),
+                    'p95': self.latences.quantile(0.95),
+                    'moyenne': self.latences.somme / self.latences.nombre if self.latences.nombre else None,
+                    'histogramme': self.latences.vers_dict(),
+                },
+                'pages': self.lignes_par_page.nombre,
+                'lignes': int(lignes),
+                'lignes_par_page': self.lignes_par_page.vers_dict(),
+                'lignes_par_seconde': round(lignes / duree, 1) if duree else 0.0,
+                'nouvelles_tentatives': self.nouvelles_tentatives,
+                'attente_reprises': round(self.attente_reprises, 3),
+                'cache': dict(self.cache),
+                'exports': {nom: dict(export) for nom, export in self.exports.items()},
+                'pic_memoire': pic_memoire(),
+            }
+
+    def vers_json(self):
+        return json.dumps(self.instantane(), indent=2)
+
+    def vers_openmetrics(self):
+        """Renvoie les mesures au format texte OpenMetrics (préfixe `gsc_`)."""
+        mesures = self.instantane()
+        lignes = []
+
+        def metrique(nom, type_metrique, aide, echantillons):
+            lignes.append(f"# TYPE {nom} {type_metrique}")
+            lignes.append(f"# HELP {nom} {aide}")
+            for suffixe, etiquettes, valeur in echantillons:
+                etiquettes = ','.join(f'{cle}="{val}"' for cle, val in etiquettes.items())
+                lignes.append(f"{nom}{suffixe}{{{etiquettes}}} {valeur}" if etiquettes else f"{nom}{suffixe} {valeur}")
+
+        def histogramme(nom, aide, donnees):
+            echantillons = []
+            cumul = 0
+            for borne, compte in zip(donnees['bornes'] + ['+Inf'], donnees['comptes']):
+                cumul += compte
+                echantillons.append(('_bucket', {'le': borne}, cumul))
+            echantillons += [('_sum', {}, donnees['somme']), ('_count', {}, donnees['nombre'])]
+            metrique(nom, 'histogram', aide, echantillons)
+
+        metrique('gsc_requetes', 'counter', "Appels à l'API par résultat",
+                 [('_total', {'resultat': cle}, valeur) for cle, valeur in mesures['requetes'].items()])
+        histogramme('gsc_requete_duree_secondes', "Durée des appels à l'API", mesures['latence']['histogramme'])
+        histogramme('gsc_page_lignes', "Lignes par page de résultats", mesures['lignes_par_page'])
+        metrique('gsc_lignes_par_seconde', 'gauge', "Débit cumulé depuis la première requête",
+                 [('', {}, mesures['lignes_par_seconde'])])
+        metrique('gsc_nouvelles_tentatives', 'counter', "Requêtes réessayées (429, 5xx, réseau)",
+                 [('_total', {}, mesures['nouvelles_tentatives'])])
+        metrique('gsc_attente_reprises_secondes', 'counter', "Temps d'attente avant les nouvelles tentatives",
+                 [('_total', {}, mesures['attente_reprises'])])
+        metrique('gsc_cache', 'counter', "Consultations du cache local des réponses",
+                 [('_total', {'resultat': cle}, valeur) for cle, valeur in mesures['cache'].items()])
+        metrique('gsc_export_octets', 'counter', "Octets produits par les exports",
+                 [('_total', {'format': nom}, export['octets']) for nom, export in mesures['exports'].items()])
+        metrique('gsc_export_duree_secondes', 'counter', "Durée cumulée des exports",
+                 [('_total', {'format': nom}, round(export['duree'], 3)) for nom, export in mesures['exports'].items()])
+        if mesures['pic_memoire'] is not None:
+            metrique('gsc_pic_memoire_octets', 'gauge', "Pic de mémoire (RSS) du processus",
+                     [('', {}, mesures['pic_memoire'])])
+        lignes.append('# EOF')
+        return '\n'.join(lignes) + '\n'
+
+    def ecrire(self, chemin):
+        """Écrit les mesures en JSON (extension .json) ou au format OpenMetrics."""
+        contenu = self.vers_json() if chemin.endswith('.json') else self.vers_openmetrics()
+        with open(chemin, 'w', encoding='utf-8') as fichier:
+            fichier.write(contenu)
+
+
+# Suivi d'une extraction : débit et estimation de la durée restante
+class SuiviExtraction:
+    """
+    À alimenter avec les arguments de `on_progress`. L'estimation de la fin
+    repose sur le nombre de tranches terminées et restantes (le total
+    augmente si des tranches tronquées sont redécoupées).
+    """
+
+    def __init__(self):
+        self.debut = time.monotonic()
+        self.terminees = 0
+        self.total = 0
+        self.lignes = 0
+
+    def mettre_a_jour(self, terminees, total, lignes):
+        self.terminees, self.total, self.lignes = terminees, total, lignes
+
+    @property
+    def duree(self):
+        return time.monotonic() - self.debut
+
+    @property
+    def lignes_par_seconde(self):
+        duree = self.duree
+        return self.lignes / duree if duree else 0.0
+
+    @property
+    def restant(self):
+        """Secondes restantes estimées, ou None tant qu'aucune tranche n'est terminée."""
+        if not self.terminees:
+            return None
+        return self.duree * (self.total - self.terminees) / self.terminees
+
+
+_telemetrie = Telemetrie()
+
+
+# Fonction pour obtenir la télémétrie partagée par toutes les extractions du processus
+def obtenir_telemetrie():
+    return _telemetrie
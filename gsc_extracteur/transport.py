@@ -0,0 +1,249 @@
+import queue
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import httplib2
+from google_auth_httplib2 import AuthorizedHttp
+
+from .cache import CacheReponses
+from .limiteur import DELAI_BASE, _est_limitation, limiteurs_pour
+from .telemetrie import obtenir_telemetrie
+
+TAILLE_RESERVE = 16  # Nombre maximal de connexions inactives conservées par identifiants
+DELAI_CONNEXION = 60  # Secondes
+TAILLE_LOT = 20  # Nombre maximal de requêtes regroupées dans une requête HTTP groupée (batch)
+FENETRE_PRECHARGE = 2  # Pages pleines préchargées d'avance au plus, par tranche extraite en parallèle
+LIGNES_MAX_PRECHARGE = 5000  # Au-delà (lignes par page), le transfert d'une réponse coûte plus que l'aller-retour
+
+_reserves = {}
+_reserves_lock = threading.Lock()
+
+
+# Réserve de connexions HTTP persistantes (keep-alive)
+class ReserveConnexions:
+    """
+    httplib2.Http n'est pas thread-safe, mais garde ses connexions ouvertes
+    entre deux requêtes. Chaque thread emprunte une connexion authentifiée le
+    temps d'une série de requêtes puis la rend : les connexions sont
+    réutilisées d'une tranche et d'une extraction à l'autre.
+    """
+
+    def __init__(self, credentials, taille_max=TAILLE_RESERVE):
+        self.credentials = credentials
+        self.inactives = queue.LifoQueue(maxsize=taille_max)
+        self.creees = 0
+
+    def _nouvelle_connexion(self):
+        self.creees += 1
+        return AuthorizedHttp(self.credentials, http=httplib2.Http(timeout=DELAI_CONNEXION))
+
+    @contextmanager
+    def emprunter(self):
+        try:
+            http = self.inactives.get_nowait()
+        except queue.Empty:
+            http = self._nouvelle_connexion()
+        try:
+            yield http
+        finally:
+            try:
+                self.inactives.put_nowait(http)
+            except queue.Full:
+                http.close()
+
+
+# Fonction pour obtenir la réserve de connexions associée aux identifiants d'un service
+def reserve_pour(service):
+    credentials = service._http.credentials
+    with _reserves_lock:
+        reserve = _reserves.get(id(credentials))
+        if reserve is None or reserve.credentials is not credentials:
+            reserve = _reserves[id(credentials)] = ReserveConnexions(credentials)
+        return reserve
+
+
+# Cache en mémoire des premières pages préchargées, devant le cache disque éventuel
+class CachePrecharge:
+    """
+    Sert chaque réponse préchargée une seule fois, puis délègue au cache
+    disque (`CacheReponses`) s'il y en a un.
+
+    Les premières pages sont demandées par quelques threads de
+    préchargement, dans l'ordre des tranches et au fil de leur
+    consommation : les lignes des réponses non encore lues et celles
+    attendues des lots en cours ne dépassent jamais `lignes_max`, et chaque
+    réponse est libérée dès que sa tranche l'a lue. Les lignes attendues
+    d'une page sont estimées par la plus grande page reçue jusque-là
+    (`row_limit` au départ) : de petites pages sont préchargées loin en
+    avance, et le préchargement s'arrête dès qu'une page dépasse
+    `LIGNES_MAX_PRECHARGE` lignes. Une tranche dont la page est en cours de
+    téléchargement l'attend ; une tranche dont la page n'est pas encore
+    partie fait sa requête elle-même.
+    """
+
+    def __init__(self, reponses, cache=None):
+        self.reponses = reponses
+        self.cache = cache
+        self.condition = threading.Condition()
+        self.en_attente = OrderedDict()
+        self.en_cours = set()
+        self.lignes = 0
+        self.lignes_reservees = 0
+        self.lignes_par_page = 1
+        self.page_max = None
+        self.arrete = False
+        self.threads = []
+
+    def demarrer(self, service, site_url, bodies, max_workers, taille_lot, lignes_max, lignes_par_page):
+        """Lance le préchargement des premières pages `bodies` (dans l'ordre d'exécution des tranches)."""
+        for body in bodies:
+            self.en_attente[CacheReponses.cle(site_url, body)] = body
+        self.lignes_par_page = lignes_par_page
+        for _ in range(min(max_workers, len(bodies))):
+            thread = threading.Thread(target=self._precharger,
+                                      args=(service, site_url, max_workers, taille_lot, lignes_max),
+                                      name='gsc-precharge', daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        return self
+
+    def _precharger(self, service, site_url, max_workers, taille_lot, lignes_max):
+        while True:
+            with self.condition:
+                while True:
+                    # Grandes pages : un lot ne ferait que sérialiser des réponses téléchargées en parallèle sinon
+                    if self.arrete or not self.en_attente or (self.page_max or 0) > LIGNES_MAX_PRECHARGE:
+                        return
+                    # Taille des pages inconnue : un seul lot à la fois, le temps de la connaître
+                    if self.page_max is None and self.en_cours:
+                        self.condition.wait()
+                        continue
+                    places = (lignes_max - self.lignes - self.lignes_reservees) // self.lignes_par_page
+                    # Pages pleines : la fenêtre est partagée entre les threads (lots plus petits, plus rapides)
+                    n = min(taille_lot, places, len(self.en_attente),
+                            max(1, lignes_max // self.lignes_par_page // max_workers))
+                    if n >= 1:
+                        break
+                    self.condition.wait()
+                lot = [self.en_attente.popitem(last=False) for _ in range(n)]
+                self.en_cours.update(cle for cle, _ in lot)
+                reservees = n * self.lignes_par_page
+                self.lignes_reservees += reservees
+            try:
+                resultats = _executer_lot(service, site_url, [body for _, body in lot])
+            except Exception:
+                # Échec du lot entier : ses requêtes seront refaites une par une
+                resultats = []
+            recus = {CacheReponses.cle(site_url, body): response for body, response in resultats}
+            with self.condition:
+                self.lignes_reservees -= reservees
+                for cle, _ in lot:
+                    self.en_cours.discard(cle)
+                    response = recus.get(cle)
+                    if response is not None and not self.arrete:
+                        self.reponses[cle] = response
+                        lignes = len(response.get('rows', []))
+                        self.lignes += lignes
+                        self.page_max = max(self.page_max or 1, lignes)
+                if self.page_max is not None:
+                    self.lignes_par_page = self.page_max
+                self.condition.notify_all()
+            if self.cache is not None:
+                for body, response in resultats:
+                    self.cache.ecrire(site_url, body, response)
+
+    def lire(self, site_url, body):
+        cle = CacheReponses.cle(site_url, body)
+        with self.condition:
+            while cle in self.en_cours:
+                self.condition.wait()
+            response = self.reponses.pop(cle, None)
+            if response is None:
+                # Pas encore partie : la tranche la demande elle-même
+                self.en_attente.pop(cle, None)
+            else:
+                self.lignes -= len(response.get('rows', []))
+                self.condition.notify_all()
+        if response is None and self.cache is not None:
+            response = self.cache.lire(site_url, body)
+        return response
+
+    def ajouter(self, site_url, body, response):
+        """Ajoute une réponse obtenue en dehors du préchargement (voir `_premiere_page`)."""
+        with self.condition:
+            self.reponses[CacheReponses.cle(site_url, body)] = response
+            self.lignes += len(response.get('rows', []))
+
+    def ecrire(self, site_url, body, response):
+        if self.cache is not None:
+            self.cache.ecrire(site_url, body, response)
+
+    def arreter(self):
+        """Arrête le préchargement et libère les réponses qui n'ont pas été lues."""
+        with self.condition:
+            self.arrete = True
+            self.en_attente.clear()
+            self.reponses.clear()
+            self.lignes = 0
+            self.condition.notify_all()
+        for thread in self.threads:
+            thread.join()
+
+
+# Fonction pour exécuter un groupe de requêtes en une seule requête HTTP
+def _executer_lot(service, site_url, bodies):
+    """
+    Renvoie la liste des couples (body, réponse) qui ont abouti. Les
+    requêtes en échec sont simplement omises : elles seront refaites
+    individuellement, avec les nouvelles tentatives habituelles.
+    """
+    limiteurs = limiteurs_pour(service, site_url)
+    reponses = {}
+
+    def callback(request_id, response, exception):
+        if exception is None:
+            reponses[request_id] = response
+        elif _est_limitation(exception):
+            for limiteur in limiteurs:
+                limiteur.signaler_limitation(DELAI_BASE)
+
+    batch = service.new_batch_http_request(callback=callback)
+    for i, body in enumerate(bodies):
+        batch.add(service.searchanalytics().query(siteUrl=site_url, body=body), request_id=str(i))
+
+    # Chaque requête du lot compte dans les quotas
+    for _ in bodies:
+        for limiteur in limiteurs:
+            limiteur.acquerir()
+    debut = time.perf_counter()
+    with reserve_pour(service).emprunter() as http:
+        try:
+            batch.execute(http=http)
+        finally:
+            obtenir_telemetrie().enregistrer_requete(time.perf_counter() - debut, succes=bool(reponses))
+    return [(body, reponses[str(i)]) for i, body in enumerate(bodies) if str(i) in reponses]
+
+
+# Fonction pour précharger les premières pages de plusieurs tranches par requêtes groupées
+def precharger(service, site_url, bodies, cache=None, max_workers=4, taille_lot=TAILLE_LOT, lignes_max=None,
+               lignes_par_page=25000):
+    """
+    Les premières pages des tranches sont indépendantes : elles sont
+    envoyées par lots de `taille_lot` au plus dans des requêtes HTTP
+    groupées (jusqu'à `max_workers` lots en parallèle) au lieu d'un
+    aller-retour chacune, en avance sur l'extraction mais sans garder plus
+    de `lignes_max` lignes en mémoire (voir `CachePrecharge`) ; par défaut,
+    `FENETRE_PRECHARGE` pages pleines par lot en parallèle.
+    Renvoie un `CachePrecharge` à utiliser comme cache de l'extraction, à
+    arrêter (`arreter`) une fois l'extraction terminée.
+    """
+    if cache is not None:
+        bodies = [body for body in bodies if not cache.contient(site_url, body)]
+    precharge = CachePrecharge({}, cache)
+    if len(bodies) < 2 or not taille_lot:
+        return precharge
+    if lignes_max is None:
+        lignes_max = FENETRE_PRECHARGE * max_workers * lignes_par_page
+    return precharge.demarrer(service, site_url, bodies, max_workers, taille_lot, lignes_max, lignes_par_page)
@@ -0,0 +1,43 @@
+import sys
+
+from gsc_extracteur.colonnes import TamponColonnes
+from gsc_extracteur.moteur import _fusionner
+
+REQUETES = [f"mot-clé numéro {i} pour la recherche" for i in range(2000)]
+
+
+# Tampons de plusieurs tranches pages et mots-clés partageant le même dictionnaire d'internement
+def _tampons(nb_tranches, lignes_par_tranche):
+    chaines = {}
+    tampons = []
+    for tranche in range(nb_tranches):
+        tampon = TamponColonnes(2, chaines)
+        debut = tranche * lignes_par_tranche
+        # Chaque ligne reçoit sa propre copie de la chaîne, comme dans une réponse JSON décodée
+        tampon.ajouter_page([
+            {'keys': [f"https://www.exemple.fr/p/{i % 5000}", ''.join(list(REQUETES[i % len(REQUETES)]))],
+             'clicks': 1, 'impressions': 2, 'position': 3.0}
+            for i in range(debut, debut + lignes_par_tranche)
+        ])
+        tampons.append(tampon)
+    return tampons
+
+
+def test_mots_cles_internes_entre_tranches():
+    total = TamponColonnes(2)
+    for tampon in _tampons(4, 5000):
+        total.etendre(tampon)
+
+    # Un seul objet par mot-clé distinct, quel que soit le nombre de lignes et de tranches
+    assert len({id(requete) for requete in total.cles[1]}) == len(REQUETES)
+
+
+def test_memoire_des_mots_cles_bornee_par_les_mots_cles_distincts():
+    total = TamponColonnes(2)
+    for tampon in _tampons(4, 50000):
+        total.etendre(tampon)
+    df = _fusionner(total, ['page', 'query'])
+
+    # Les mots-clés distincts une fois, plus un code entier (au plus 4 octets) par ligne
+    borne = sum(sys.getsizeof(requete) for requete in REQUETES) + 4 * len(df)
+    assert df['mot-clé'].memory_usage(deep=True, index=False) <= borne
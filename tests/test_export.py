@@ -0,0 +1,49 @@
+import pandas as pd
+import pytest
+
+from gsc_extracteur.export import EcrivainParquet
+
+pq = pytest.importorskip('pyarrow.parquet')
+
+
+# Lots de lignes journalières, comme ceux d'une extraction en flux
+def _lots():
+    return [
+        pd.DataFrame({
+            'date': [f'2024-01-0{jour}'] * lignes,
+            'page': pd.Categorical([f'https://www.exemple.fr/{jour}/{i}' for i in range(lignes)]),
+            'clicks': range(lignes),
+            'impressions': [10] * lignes,
+        })
+        for jour, lignes in ((1, 2), (2, 3), (3, 1))
+    ]
+
+
+def test_ecrivain_parquet_conserve_tous_les_lots(tmp_path):
+    chemin = str(tmp_path / 'donnees.parquet')
+    with EcrivainParquet(chemin) as ecrivain:
+        for lot in _lots():
+            ecrivain.ecrire(lot)
+
+    assert ecrivain.lignes == 6
+    assert pq.read_table(chemin).num_rows == 6
+
+
+def test_ecrivain_parquet_un_seul_lot(tmp_path):
+    chemin = str(tmp_path / 'donnees.parquet')
+    with EcrivainParquet(chemin) as ecrivain:
+        ecrivain.ecrire(_lots()[0])
+
+    assert pq.read_table(chemin).num_rows == 2
+
+
+def test_ecrivain_parquet_partitionne_par_date(tmp_path):
+    chemin = str(tmp_path / 'donnees.parquet')
+    with EcrivainParquet(chemin, partitionner_par_date=True) as ecrivain:
+        for lot in _lots():
+            ecrivain.ecrire(lot)
+
+    df = pd.read_parquet(chemin)
+    assert len(df) == 6
+    assert sorted(p.name for p in tmp_path.joinpath('donnees.parquet').iterdir()) == [
+        'date=2024-01-01', 'date=2024-01-02', 'date=2024-01-03']
@@ -0,0 +1,50 @@
+import httplib2
+import pytest
+from googleapiclient.errors import HttpError
+
+from gsc_extracteur import limiteur
+from gsc_extracteur.limiteur import LimiteurDebit, executer_avec_reprise
+
+
+# Requête qui échoue avec chaque erreur de `erreurs`, puis réussit
+class RequeteEchouant:
+    def __init__(self, *erreurs):
+        self.erreurs = list(erreurs)
+
+    def execute(self, http=None):
+        if self.erreurs:
+            raise self.erreurs.pop(0)
+        return {'rows': []}
+
+
+def _erreur_http(statut, contenu=b''):
+    return HttpError(httplib2.Response({'status': statut}), contenu)
+
+
+@pytest.fixture(autouse=True)
+def sans_attente(monkeypatch):
+    monkeypatch.setattr(limiteur, 'DELAI_BASE', 0.001)
+
+
+@pytest.mark.parametrize('erreur', [
+    _erreur_http(500),
+    _erreur_http(503),
+    ConnectionError("connexion interrompue"),
+    TimeoutError("délai dépassé"),
+])
+def test_erreur_serveur_ou_reseau_ne_reduit_pas_le_debit(erreur):
+    limiteurs = [LimiteurDebit(60000, 1000)]
+    assert executer_avec_reprise(RequeteEchouant(erreur), limiteurs) == {'rows': []}
+    assert limiteurs[0].etat()['facteur'] == 1.0
+    assert limiteurs[0].etat()['limitations'] == 0
+
+
+@pytest.mark.parametrize('erreur', [
+    _erreur_http(429),
+    _erreur_http(403, b'{"error": {"errors": [{"reason": "quotaExceeded"}]}}'),
+])
+def test_limitation_de_l_api_reduit_le_debit(erreur):
+    limiteurs = [LimiteurDebit(60000, 1000)]
+    assert executer_avec_reprise(RequeteEchouant(erreur), limiteurs) == {'rows': []}
+    assert limiteurs[0].etat()['facteur'] < 1.0
+    assert limiteurs[0].etat()['limitations'] == 1